@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Benchmark the production journal server under load.
+Builds a throwaway album with a synthetic docs/journal tree, a large
+songs.json and a local bare git remote, starts journal-server.py on a free
+port and drives concurrent clients against its routes. Reports throughput
+and p50/p99 latency per route, for each server mode asked for.
+
+    python3 src/scripts/benchmark-server.py --entries 10000 --modes pooled threaded
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+SERVER_DIR = os.path.join(REPO_ROOT, 'src', 'server')
+sys.path.insert(0, SERVER_DIR)
+
+from journal_markdown import render_entry
+
+TRACKS = [f'Track {i:02d}: Song {i}' for i in range(1, 13)] + ['General', 'Sound Design', 'Mixing', 'Mastering']
+KEYS = ['C', 'Am', 'G', 'Em', 'D', 'Bm', 'F', 'Dm', 'Bb', 'Gm']
+WORDS = ('kick snare bass synth pad vocal chorus verse bridge reverb delay compressor sidechain '
+         'arrangement melody harmony groove swing texture automation bounce stems master').split()
+STATUSES = ['draft', 'production', 'mixing', 'mastering', 'done']
+
+# Relative weights of each kind of request in the mix
+ROUTE_WEIGHTS = {
+    'list': 20,
+    'list_filtered': 8,
+    'file': 20,
+    'file_html': 10,
+    'search': 8,
+    'entries': 5,
+    'songs': 10,
+    'songs_delta': 5,
+    'stats': 3,
+    'page': 4,
+    'save_entry': 4,
+    'song_create': 1,
+    'song_update': 2,
+    'song_delete': 1
+}
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def git(*args, cwd):
+    subprocess.run(['git', *args], cwd=cwd, check=True, capture_output=True)
+
+
+def build_album(workdir, entries, songs, rng):
+    """Synthetic album repo with journal entries and songs, pushed to a local bare remote"""
+    remote = os.path.join(workdir, 'remote.git')
+    album = os.path.join(workdir, 'album')
+    git('init', '--bare', '-q', remote, cwd=workdir)
+    os.makedirs(album)
+    git('init', '-q', cwd=album)
+    git('config', 'user.name', 'Benchmark', cwd=album)
+    git('config', 'user.email', 'benchmark@localhost', cwd=album)
+    git('remote', 'add', 'origin', remote, cwd=album)
+
+    # The pages the server serves
+    shutil.copy(os.path.join(REPO_ROOT, 'index.html'), album)
+    shutil.copytree(os.path.join(REPO_ROOT, 'src', 'ui'), os.path.join(album, 'src', 'ui'))
+
+    print(f"🏗️  Writing {entries:,} journal entries and {songs:,} songs...")
+    start = datetime.now() - timedelta(days=365 * 3)
+    step = timedelta(days=365 * 3) / max(entries, 1)
+    filenames = []
+    for i in range(entries):
+        moment = start + step * i
+        track = rng.choice(TRACKS)
+        data = {
+            'date': moment.strftime('%Y-%m-%d'),
+            'track': track,
+            'notes': '\n'.join(sentence(rng) for _ in range(rng.randint(1, 4))),
+            'followup': '\n'.join(f'- {sentence(rng, 5)}' for _ in range(rng.randint(0, 3))),
+            'bpm': str(rng.randint(70, 160)) if rng.random() < 0.6 else '',
+            'key': rng.choice(KEYS) if rng.random() < 0.6 else '',
+            'mood': sentence(rng, 4) if rng.random() < 0.5 else ''
+        }
+        slug = track.lower().replace(' ', '-').replace(':', '').replace('_', '-')
+        directory = os.path.join(album, 'docs', 'journal', moment.strftime('%Y'), moment.strftime('%m'))
+        filename = f"{moment.strftime('%Y-%m-%d-%H%M')}-{slug}.md"
+        if filenames and filenames[-1] == filename:
+            filename = filename[:-3] + f'-{i}.md'
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, filename), 'w') as f:
+            f.write(render_entry(data, moment))
+        filenames.append(filename)
+
+    song_list = [{
+        'id': str(1700000000000 + i),
+        'title': f'Song {i}',
+        'key': rng.choice(KEYS),
+        'bpm': rng.randint(70, 160),
+        'status': rng.choice(STATUSES),
+        'notes': sentence(rng, 20),
+        'progress': rng.randint(0, 100),
+        'createdAt': start.isoformat(),
+        'updatedAt': start.isoformat()
+    } for i in range(songs)]
+    with open(os.path.join(album, 'docs', 'songs.json'), 'w') as f:
+        json.dump(song_list, f, indent=2)
+
+    git('add', '-A', cwd=album)
+    git('commit', '-q', '-m', 'Synthetic album', cwd=album)
+    git('push', '-q', '-u', 'origin', 'HEAD', cwd=album)
+    return album, remote, filenames, [song['id'] for song in song_list]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(album, mode, workers, log_path):
+    """Launch journal-server.py and wait until it answers"""
+    port = free_port()
+    log = open(log_path, 'w')
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(SERVER_DIR, 'journal-server.py'),
+         '--port', str(port), '--mode', mode, '--workers', str(workers), '--queue-size', str(workers * 8)],
+        cwd=album, stdout=log, stderr=subprocess.STDOUT
+    )
+    started = time.perf_counter()
+    while True:
+        if process.poll() is not None:
+            raise RuntimeError(f'Server exited during startup, see {log_path}')
+        try:
+            status, _, _ = request(port, 'GET', '/api/songs?since=0')
+            if status == 200:
+                break
+        except OSError:
+            pass
+        if time.perf_counter() - started > 600:
+            process.kill()
+            raise RuntimeError('Server did not start within 10 minutes')
+        time.sleep(0.2)
+    print(f"🚀 {mode} server ready on port {port} after {time.perf_counter() - started:.1f}s")
+    return process, port, log
+
+
+def request(port, method, path, body=None, headers=None):
+    """One request on a fresh connection (the server speaks HTTP/1.0); returns (status, body, headers)"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        payload = json.dumps(body).encode() if body is not None else None
+        request_headers = dict(headers or {})
+        if payload is not None:
+            request_headers['Content-Type'] = 'application/json'
+        connection.request(method, path, body=payload, headers=request_headers)
+        response = connection.getresponse()
+        data = response.read()
+        return response.status, data, response
+    finally:
+        connection.close()
+
+
+class Client(threading.Thread):
+    """Picks weighted routes at random until the deadline, recording each latency"""
+
+    def __init__(self, port, filenames, song_ids, deadline, seed):
+        super().__init__(daemon=True)
+        self.port = port
+        self.filenames = filenames
+        self.song_ids = song_ids
+        self.deadline = deadline
+        self.rng = random.Random(seed)
+        self.created = []
+        self.samples = {}
+        self.errors = {}
+        self.song_revision = 0
+
+    def run(self):
+        routes = list(ROUTE_WEIGHTS)
+        weights = [ROUTE_WEIGHTS[route] for route in routes]
+        while time.perf_counter() < self.deadline:
+            route = self.rng.choices(routes, weights)[0]
+            method, path, body = self.build(route)
+            started = time.perf_counter()
+            try:
+                status, data, response = request(self.port, method, path, body)
+                ok = status < 400 or (route == 'song_update' and status == 404)
+            except OSError:
+                status, ok, response = None, False, None
+            self.samples.setdefault(route, []).append(time.perf_counter() - started)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+            elif route == 'song_create':
+                self.created.append(json.loads(data)['song']['id'])
+            elif route == 'songs_delta':
+                self.song_revision = int(response.getheader('X-Song-Revision') or 0)
+
+    def build(self, route):
+        rng = self.rng
+        if route == 'list':
+            return 'GET', '/api/journal-files?limit=50', None
+        if route == 'list_filtered':
+            track = quote(rng.choice(TRACKS))
+            return 'GET', f'/api/journal-files?limit=50&track={track}', None
+        if route == 'file':
+            return 'GET', f'/api/journal-file/{rng.choice(self.filenames)}', None
+        if route == 'file_html':
+            return 'GET', f'/api/journal-file/{rng.choice(self.filenames[-200:])}?format=html', None
+        if route == 'search':
+            return 'GET', f'/api/search?q={rng.choice(WORDS)}+{rng.choice(WORDS)}&limit=20', None
+        if route == 'entries':
+            return 'GET', '/api/entries?limit=50', None
+        if route == 'songs':
+            return 'GET', '/api/songs', None
+        if route == 'songs_delta':
+            return 'GET', f'/api/songs?since={self.song_revision}', None
+        if route == 'stats':
+            return 'GET', '/api/stats', None
+        if route == 'page':
+            return 'GET', rng.choice(['/', '/read-entries', '/album-overview', '/add-entry']), None
+        if route == 'save_entry':
+            return 'POST', '/save-entry', {
+                'track': rng.choice(TRACKS),
+                'date': datetime.now().strftime('%Y-%m-%d'),
+                'notes': sentence(rng),
+                'followup': f'- {sentence(rng, 5)}',
+                'timestamp': datetime.now().isoformat()
+            }
+        if route == 'song_create':
+            return 'POST', '/api/songs', {'songTitle': f'Bench {rng.randint(0, 10**6)}', 'songStatus': 'draft'}
+        if route == 'song_update':
+            return 'PUT', f'/api/songs/{rng.choice(self.song_ids)}', {'songStatus': rng.choice(STATUSES)}
+        # song_delete: only songs this client created, so updates keep finding theirs
+        if self.created:
+            return 'DELETE', f'/api/songs/{self.created.pop()}', None
+        return 'GET', '/api/songs', None
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_load(port, filenames, song_ids, clients, duration, seed):
+    deadline = time.perf_counter() + duration
+    threads = [Client(port, filenames, song_ids, deadline, seed + i) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    samples, errors = {}, {}
+    for thread in threads:
+        for route, values in thread.samples.items():
+            samples.setdefault(route, []).extend(values)
+        for route, count in thread.errors.items():
+            errors[route] = errors.get(route, 0) + count
+    return samples, errors, elapsed
+
+
+def report(mode, samples, errors, elapsed):
+    total = sum(len(values) for values in samples.values())
+    print(f"\n📊 {mode}: {total:,} requests in {elapsed:.1f}s = {total / elapsed:,.0f} req/s")
+    print(f"{'route':<16}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for route in sorted(samples, key=lambda r: -len(samples[r])):
+        values = sorted(samples[route])
+        print(f"{route:<16}{len(values):>10,}{errors.get(route, 0):>8}{len(values) / elapsed:>10,.1f}"
+              f"{percentile(values, 0.5) * 1000:>10.1f}{percentile(values, 0.99) * 1000:>10.1f}")
+    all_values = sorted(v for values in samples.values() for v in values)
+    print(f"{'all':<16}{total:>10,}{sum(errors.values()):>8}{total / elapsed:>10,.1f}"
+          f"{percentile(all_values, 0.5) * 1000:>10.1f}{percentile(all_values, 0.99) * 1000:>10.1f}")
+
+
+def run_git_sync(port, remote):
+    """Commit and push everything the load wrote, timing the background job"""
+    started = time.perf_counter()
+    status, data, _ = request(port, 'POST', '/api/git-commit')
+    job = json.loads(data)['job']
+    while job['status'] not in ('done', 'failed'):
+        _, data, _ = request(port, 'GET', f"/api/git-commit/{job['id']}?wait=30")
+        job = json.loads(data)['job']
+    head = subprocess.run(['git', '--git-dir', remote, 'log', '-1', '--format=%s'],
+                          capture_output=True, text=True).stdout.strip()
+    print(f"💾 Git sync {job['status']} in {time.perf_counter() - started:.2f}s: {job['message']} (remote HEAD: {head})")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test the production journal server')
+    parser.add_argument('--entries', type=int, default=10000, help='Synthetic journal entries (default: 10000)')
+    parser.add_argument('--songs', type=int, default=2000, help='Songs in songs.json (default: 2000)')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent clients (default: 16)')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds of load per mode (default: 20)')
+    parser.add_argument('--modes', nargs='+', choices=['pooled', 'threaded', 'single', 'async'], default=['pooled'],
+                        help='Server modes to compare (default: pooled)')
+    parser.add_argument('--workers', type=int, default=8, help='Worker threads in pooled mode (default: 8)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for the data and request mix')
+    parser.add_argument('--keep', action='store_true', help='Keep the synthetic album and server logs')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix='journal-bench-')
+    try:
+        album, remote, filenames, song_ids = build_album(workdir, args.entries, args.songs, rng)
+        for mode in args.modes:
+            log_path = os.path.join(workdir, f'server-{mode}.log')
+            process, port, log = start_server(album, mode, args.workers, log_path)
+            try:
+                samples, errors, elapsed = run_load(port, filenames, song_ids, args.clients, args.duration, args.seed)
+                report(mode, samples, errors, elapsed)
+                run_git_sync(port, remote)
+            finally:
+                process.terminate()
+                process.wait()
+                log.close()
+    finally:
+        if args.keep:
+            print(f"📁 Album and logs kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
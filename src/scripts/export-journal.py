@@ -1,69 +1,193 @@
 #!/usr/bin/env python3
 """
-Export production journal entries from the UI to the markdown file.
-Run this script to sync your UI entries back to docs/production-journal.md
+Export production journal entries from docs/journal to the markdown file.
+Run this script to sync your saved entries into docs/production-journal.md
+
+Entries are streamed one file at a time in date order and appended to the
+Session Log. A high-water mark at the end of the Session Log remembers the
+newest exported entry, so reruns only look at newer months and only add
+sessions that aren't in the log yet. The file is rewritten through a temp
+file and an atomic rename.
+
+With --format html/jsonl/csv/zip it writes a standalone export of the
+whole journal instead (see src/server/journal_export.py).
 """
 
-import json
 import os
-from datetime import datetime
-
-def export_journal_entries():
-    """Export journal entries from localStorage format to markdown"""
-    
-    # Path to the production journal markdown file
-    journal_path = "docs/production-journal.md"
-    
-    # Check if localStorage file exists (this would be created by the UI)
-    # For now, we'll create a sample structure
-    sample_entries = [
-        {
-            "track": "Track 01: May",
-            "notes": "Started working on the main chord progression. The Cmaj7 to Am sounds great. Need to work on the bridge section.",
-            "date": "Dec 19, 2024, 02:30 PM"
-        },
-        {
-            "track": "Track 02: Resume", 
-            "notes": "Experimented with some new synth patches. The arp line is coming together nicely.",
-            "date": "Dec 19, 2024, 02:25 PM"
-        }
-    ]
-    
-    # Read existing journal file
-    if os.path.exists(journal_path):
-        with open(journal_path, 'r') as f:
-            content = f.read()
-    else:
-        content = ""
-    
-    # Find the session log section
-    session_start = content.find("## Session Log")
-    if session_start == -1:
-        print("Could not find '## Session Log' section in the markdown file")
+import re
+import sys
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+
+from journal_index import parse_entry_filename
+from journal_markdown import parse_entry, followup_items
+from journal_export import FORMATS, entry_heading, write_export
+
+JOURNAL_DIR = os.path.join('docs', 'journal')
+JOURNAL_PATH = os.path.join('docs', 'production-journal.md')
+
+# "<!-- entry: 2024/01/2024-01-05-1430-track.md -->" under each exported session
+ENTRY_MARKER = re.compile(r'^<!-- entry: (\S+) -->$')
+# "<!-- exported-through: 2024/01/2024-01-05-1430-track.md -->" at the end of the Session Log
+HIGH_WATER_MARK = re.compile(r'^<!-- exported-through: (\S+) -->$')
+
+
+def month_dirs(journal_dir, since=None):
+    """YYYY/MM folders in date order, starting at the month of the high-water mark"""
+    if not os.path.isdir(journal_dir):
         return
-    
-    # Find the end of the session log (before the Notes Template section)
-    template_start = content.find("---", session_start)
-    if template_start == -1:
-        template_start = len(content)
-    
-    # Build new session entries
-    new_entries = ""
-    for entry in sample_entries:
-        new_entries += f"### {entry['date']} - {entry['track']}\n"
-        new_entries += f"- {entry['notes']}\n\n"
-    
-    # Reconstruct the file
-    before_session = content[:session_start]
-    after_template = content[template_start:]
-    
-    new_content = before_session + "## Session Log\n\n" + new_entries + after_template
-    
-    # Write the updated file
-    with open(journal_path, 'w') as f:
-        f.write(new_content)
-    
-    print(f"✅ Exported {len(sample_entries)} entries to {journal_path}")
+    since_month = since.split('/')[:2] if since else None
+    for year in sorted(os.listdir(journal_dir)):
+        year_dir = os.path.join(journal_dir, year)
+        if not (year.isdigit() and os.path.isdir(year_dir)):
+            continue
+        if since_month and year < since_month[0]:
+            continue
+        for month in sorted(os.listdir(year_dir)):
+            month_dir = os.path.join(year_dir, month)
+            if not (month.isdigit() and os.path.isdir(month_dir)):
+                continue
+            if since_month and [year, month] < since_month:
+                continue
+            yield f'{year}/{month}', month_dir
+
+
+def stream_entries(journal_dir, since=None):
+    """Yield (relative path, full path) for each entry file, oldest first"""
+    for relative_dir, month_dir in month_dirs(journal_dir, since):
+        # Filenames start with YYYY-MM-DD-HHMM, so name order is date order
+        for filename in sorted(os.listdir(month_dir)):
+            if parse_entry_filename(filename):
+                yield f'{relative_dir}/{filename}', os.path.join(month_dir, filename)
+
+
+def format_entry(relative_path, content):
+    """One Session Log entry: header, notes as bullets and follow-ups as checkboxes"""
+    parsed_name = parse_entry_filename(os.path.basename(relative_path))
+    entry = parse_entry(content)
+    date = entry['date'] or parsed_name['date']
+    session_time = f"{parsed_name['time'][:2]}:{parsed_name['time'][2:]}"
+    track = entry['track'] or parsed_name['track']
+
+    lines = [f'### {entry_heading(date, session_time, track)}', f'<!-- entry: {relative_path} -->']
+    for line in (entry['sections'].get('notes') or '').splitlines():
+        line = line.strip()
+        if line:
+            lines.append(line if line.startswith(('- ', '* ')) else f'- {line}')
+    for action, done in followup_items(entry['sections'].get('followup')):
+        lines.append(f"- [{'x' if done else ' '}] {action}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def export_journal_entries(journal_dir=JOURNAL_DIR, journal_path=JOURNAL_PATH, full=False):
+    """Append entries that aren't in the Session Log yet; returns how many were added"""
+    if not os.path.exists(journal_path):
+        print(f"Could not find {journal_path}")
+        return 0
+
+    directory = os.path.dirname(journal_path) or '.'
+    fd, temp_path = tempfile.mkstemp(prefix='.production-journal-', suffix='.md', dir=directory)
+    exported = set()
+    mark = None
+    added = 0
+    in_session_log = False
+    inserted = False
+    skip_blank = False
+
+    try:
+        with open(journal_path, 'r', encoding='utf-8') as source, os.fdopen(fd, 'w', encoding='utf-8') as out:
+            for line in source:
+                stripped = line.strip()
+                if skip_blank:
+                    skip_blank = False
+                    if not stripped:
+                        continue
+                if stripped == '## Session Log':
+                    in_session_log = True
+                elif in_session_log and not inserted:
+                    marker = ENTRY_MARKER.match(stripped)
+                    if marker:
+                        exported.add(marker.group(1))
+                    high_water = HIGH_WATER_MARK.match(stripped)
+                    if high_water:
+                        # Rewritten below once the new entries are in
+                        mark = high_water.group(1)
+                        skip_blank = True
+                        continue
+                    if stripped == '---' or stripped.startswith('## '):
+                        added, mark = write_new_entries(out, journal_dir, exported, None if full else mark)
+                        inserted = True
+                out.write(line)
+
+            if not in_session_log:
+                print("Could not find '## Session Log' section in the markdown file")
+                os.unlink(temp_path)
+                return 0
+            if not inserted:
+                # Session Log runs to the end of the file
+                if not line.endswith('\n'):
+                    out.write('\n')
+                added, mark = write_new_entries(out, journal_dir, exported, None if full else mark)
+
+            out.flush()
+            os.fsync(out.fileno())
+
+        if added == 0:
+            os.unlink(temp_path)
+        else:
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, journal_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+    print(f"✅ Exported {added} new entries to {journal_path}" if added else "✅ Journal already up to date")
+    return added
+
+
+def write_new_entries(out, journal_dir, exported, since):
+    """Stream unexported entries into the output, then the new high-water mark"""
+    added = 0
+    mark = since
+    for relative_path, full_path in stream_entries(journal_dir, since):
+        if relative_path in exported:
+            mark = max(mark or relative_path, relative_path)
+            continue
+        try:
+            with open(full_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"⚠️  Skipped {full_path}: {e}")
+            continue
+        out.write(format_entry(relative_path, content))
+        added += 1
+        mark = max(mark or relative_path, relative_path)
+    if mark:
+        out.write(f'<!-- exported-through: {mark} -->\n\n')
+    return added, mark
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Export journal entries to docs/production-journal.md')
+    parser.add_argument('--journal-dir', default=JOURNAL_DIR, help='Journal folder (default: docs/journal)')
+    parser.add_argument('--output', help='File to write (default: docs/production-journal.md, '
+                                         'or production-journal.<format> with --format)')
+    parser.add_argument('--full', action='store_true',
+                        help='Check every month, not just those since the last export (still skips exported entries)')
+    parser.add_argument('--format', choices=sorted(FORMATS),
+                        help='Write a standalone html/jsonl/csv/zip export instead of updating the Session Log')
+    parser.add_argument('--workers', type=int, help='Processes rendering entries (default: one per CPU)')
+    return parser.parse_args(argv)
+
 
 if __name__ == "__main__":
-    export_journal_entries()
+    args = parse_args()
+    if args.format:
+        output = args.output or f'production-journal.{FORMATS[args.format][1]}'
+        written = write_export(args.format, stream_entries(args.journal_dir), output, workers=args.workers)
+        print(f"✅ Wrote {output} ({written:,} bytes)")
+    else:
+        export_journal_entries(args.journal_dir, args.output or JOURNAL_PATH, args.full)
@@ -0,0 +1,167 @@
+"""
+Album Stats
+Running production aggregates over journal entries and songs, updated one
+entry or song at a time so /api/stats never has to re-read the journal
+"""
+
+import threading
+from collections import Counter
+from datetime import date as Date
+
+from journal_index import parse_entry_filename
+
+# How many keys/BPMs the "most used" lists include
+TOP_COUNT = 10
+
+
+def entry_day(record):
+    """"YYYY-MM-DD" a record was written on, from its filename or else saved_at.
+
+    The record's own date is whatever the form displayed ("Oct 24, 2025,
+    03:25 PM"), so it can't be compared or grouped by day.
+    """
+    parsed = parse_entry_filename(record['filename'])
+    if parsed:
+        return parsed['date']
+    try:
+        return Date.fromisoformat((record.get('saved_at') or '')[:10]).isoformat()
+    except ValueError:
+        return None
+
+
+def iso_week(value):
+    """"YYYY-Www" for a YYYY-MM-DD day, or None when it doesn't parse"""
+    try:
+        year, week, _ = Date.fromisoformat(value).isocalendar()
+    except (TypeError, ValueError):
+        return None
+    return f'{year}-W{week:02d}'
+
+
+class AlbumStats:
+    """Aggregates kept current by add_entry and apply_song_changes"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tracks = {}
+        self.weeks = Counter()
+        self.entry_keys = Counter()
+        self.entry_bpms = Counter()
+        self.entries = 0
+        self.counted = set()
+
+        self.songs = {}
+        self.song_revision = None
+        self.statuses = Counter()
+        self.song_keys = Counter()
+        self.song_bpms = Counter()
+        self.progress_total = 0
+        self.snapshot = None
+
+    def add_entry(self, record):
+        """Fold one structured journal record into the totals (each filename once)"""
+        with self.lock:
+            if record['filename'] in self.counted:
+                return
+            self.counted.add(record['filename'])
+            self.entries += 1
+            self.snapshot = None
+
+            entry_date = entry_day(record)
+            track = self.tracks.setdefault(record.get('track') or 'Unknown', {
+                'sessions': 0, 'days': set(), 'first_date': None, 'last_date': None
+            })
+            track['sessions'] += 1
+            if entry_date:
+                track['days'].add(entry_date)
+                track['first_date'] = min(filter(None, (track['first_date'], entry_date)))
+                track['last_date'] = max(filter(None, (track['last_date'], entry_date)))
+                week = iso_week(entry_date)
+                if week:
+                    self.weeks[week] += 1
+
+            if record.get('key'):
+                self.entry_keys[str(record['key']).strip()] += 1
+            if record.get('bpm') is not None:
+                self.entry_bpms[str(record['bpm'])] += 1
+
+    def rebuild(self, records, song_changes):
+        """Recount from scratch; the old totals are served until the new ones replace them"""
+        fresh = AlbumStats()
+        for record in records:
+            fresh.add_entry(record)
+        fresh.apply_song_changes(*song_changes)
+        with self.lock:
+            for name, value in vars(fresh).items():
+                if name != 'lock':
+                    setattr(self, name, value)
+
+    def count_song(self, song, sign):
+        self.statuses[song.get('status') or 'draft'] += sign
+        if song.get('key'):
+            self.song_keys[song['key']] += sign
+        if song.get('bpm') is not None:
+            self.song_bpms[str(song['bpm'])] += sign
+        self.progress_total += sign * (song.get('progress') or 0)
+
+    def apply_song_changes(self, changed, deleted, revision, full):
+        """Apply a SongStore.changes_since() delta, swapping out each song's old contribution"""
+        with self.lock:
+            if self.song_revision is not None and revision <= self.song_revision:
+                # Already applied, or a slower thread arriving with an older delta
+                return
+            if full:
+                self.songs = {}
+                self.statuses.clear()
+                self.song_keys.clear()
+                self.song_bpms.clear()
+                self.progress_total = 0
+            for song_id in deleted:
+                previous = self.songs.pop(song_id, None)
+                if previous is not None:
+                    self.count_song(previous, -1)
+            for song in changed:
+                previous = self.songs.get(song['id'])
+                if previous is not None:
+                    self.count_song(previous, -1)
+                self.songs[song['id']] = song
+                self.count_song(song, 1)
+            self.song_revision = revision
+            self.snapshot = None
+
+    def summary(self):
+        """The aggregates as a JSON-ready dict, rebuilt only after something changed"""
+        with self.lock:
+            if self.snapshot is None:
+                self.snapshot = self.build_summary()
+            return self.snapshot
+
+    def build_summary(self):
+        songs = len(self.songs)
+        tracks = {
+            name: {
+                'sessions': track['sessions'],
+                'active_days': len(track['days']),
+                'first_date': track['first_date'],
+                'last_date': track['last_date']
+            }
+            for name, track in self.tracks.items()
+        }
+        return {
+            'entries': self.entries,
+            'tracks': tracks,
+            'sessions_per_week': dict(sorted(self.weeks.items())),
+            'keys': top_counts(self.entry_keys),
+            'bpms': top_counts(self.entry_bpms),
+            'songs': {
+                'count': songs,
+                'by_status': {status: count for status, count in self.statuses.items() if count},
+                'average_progress': round(self.progress_total / songs, 1) if songs else 0,
+                'keys': top_counts(self.song_keys),
+                'bpms': top_counts(self.song_bpms)
+            }
+        }
+
+
+def top_counts(counter):
+    return [{'value': value, 'count': count} for value, count in counter.most_common(TOP_COUNT) if count > 0]
@@ -0,0 +1,453 @@
+"""
+Albums
+Per-album server state and the registry that hosts many album repos in one
+process: each album is served under /albums/<name>/, loaded on its first
+request and evicted again when it has been idle or memory runs short
+"""
+
+import os
+import time
+import threading
+
+from journal_index import JournalIndex
+from journal_search import SearchIndex
+from journal_markdown import render_entry
+from entry_store import EntryStore
+from song_store import SongStore
+from change_feed import ChangeFeed
+from album_stats import AlbumStats
+from render_cache import RenderCache
+from followup_tracker import FollowupTracker
+from git_sync import GitSyncWorker
+from static_assets import StaticAssets
+from attachment_store import AttachmentStore
+from fs_watcher import create_watcher, PollingWatcher
+from entry_store import STORE_FILENAME
+
+ALBUMS_PREFIX = '/albums/'
+# Newest entries rendered to HTML when an album is loaded
+WARM_ENTRIES = 50
+
+# Loaded albums kept in memory, and how long an album may sit unused
+MAX_LOADED_ALBUMS = 8
+IDLE_SECONDS = 600
+# Rough in-memory size of an album per byte of journal markdown: content,
+# search postings, rendered HTML and structured records together come to
+# about 18x for typical entries when measured with tracemalloc
+FOOTPRINT_FACTOR = 18
+
+
+def make_track_slug(track):
+    """Track name as used in journal filenames"""
+    return track.lower().replace(' ', '-').replace(':', '').replace('_', '-')
+
+
+class Album:
+    """Everything the server keeps for one album repo.
+
+    The change feed, git worker and write lock live as long as the server,
+    so clients keep their change versions and pending commits survive an
+    eviction. The indexes and caches are rebuilt by load() and dropped by
+    unload().
+    """
+
+    def __init__(self, name, root='.', prefix=''):
+        self.name = name
+        self.root = root
+        self.prefix = prefix
+        # Serializes writes to the journal tree across request threads
+        self.journal_lock = threading.RLock()
+        # Song and journal mutations for pages following /api/changes
+        self.change_feed = ChangeFeed()
+        # Background commit-and-push jobs
+        self.git_worker = GitSyncWorker(repo_dir=root)
+        # 'auto' (inotify where available) or 'poll' to follow edits made outside the server
+        self.watch_mode = None
+        self.watcher = None
+        self.load_lock = threading.Lock()
+        self.loaded = False
+        self.users = 0
+        self.last_used = time.monotonic()
+        self.footprint = 0
+        self.reset()
+
+    def path(self, *parts):
+        """Path of a file inside the album repo"""
+        return os.path.normpath(os.path.join(self.root, *parts))
+
+    def reset(self):
+        """Replace the indexes and caches with empty ones"""
+        journal_dir = self.path('docs', 'journal')
+        # Metadata for every file under docs/journal
+        self.journal_index = JournalIndex(journal_dir)
+        # Rendered HTML of recently read entries
+        self.render_cache = RenderCache()
+        # Full-text index over entry sections, updated on every save
+        self.search_index = SearchIndex()
+        # Structured form data per entry (docs/journal/YYYY/MM/entries.jsonl)
+        self.entry_store = EntryStore(journal_dir)
+        # docs/songs.json held in memory, saved with write-temp-and-rename
+        self.song_store = SongStore(self.path('docs', 'songs.json'))
+        # Follow-up actions per track, with done state in docs/followups.json
+        self.followup_tracker = FollowupTracker(self.path('docs', 'followups.json'))
+        # Audio bounces attached to songs and journal files, kept out of git under attachments/
+        self.attachment_store = AttachmentStore(self.path('attachments'))
+        # Running production totals behind /api/stats
+        self.album_stats = AlbumStats()
+        # HTML pages and UI files, with links pointed at this album's prefix
+        self.static_assets = StaticAssets(rewrite=self.rewrite_links if self.prefix else None)
+        self.git_worker.write_locks = (self.journal_lock, self.song_store.lock, self.followup_tracker.lock)
+
+    def label(self):
+        return self.name or 'default album'
+
+    def load(self, verbose=True):
+        """Read songs, index the journal and rebuild stats and follow-ups"""
+        started = time.perf_counter()
+        if self.watch_mode:
+            # Watch first so nothing written during the scan is missed
+            self.start_watcher()
+        self.song_store.load()
+        self.git_worker.start()
+        indexed = self.journal_index.build()
+        entries = self.journal_index.list_entries()
+        warmed = self.render_cache.warm([entry['full_path'] for entry in entries[:WARM_ENTRIES]])
+        self.entry_store.load()
+        self.build_content_indexes()
+        self.followup_tracker.load()
+        for record in list(self.entry_store.records.values()):
+            self.album_stats.add_entry(record)
+            self.followup_tracker.add_entry(record)
+        self.sync_song_stats()
+        attached = self.attachment_store.load()
+        self.footprint = sum(entry['size'] for entry in entries) * FOOTPRINT_FACTOR
+        self.loaded = True
+        if verbose:
+            print(f"📚 Indexed {indexed} journal files")
+            print(f"🖋️  Pre-rendered {warmed} recent entries")
+            print(f"🔎 Search index ready ({len(self.search_index)} entries)")
+            print(f"📋 Tracking {len(self.followup_tracker)} follow-up actions")
+            if attached:
+                print(f"🎙️  {attached} audio attachments")
+        else:
+            print(f"💿 Loaded {self.label()} ({indexed} entries) in {time.perf_counter() - started:.2f}s")
+
+    def unload(self):
+        """Drop the in-memory state; the next request loads it again"""
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        self.reset()
+        self.loaded = False
+        self.footprint = 0
+        print(f"💤 Evicted {self.label()}")
+
+    def start_watcher(self):
+        """Follow docs/ with a filesystem watcher and stop re-checking the files on every read"""
+        docs_dir = self.path('docs')
+        if not os.path.isdir(docs_dir):
+            return
+        self.watcher = create_watcher(docs_dir, self.apply_file_changes, polling=self.watch_mode == 'poll')
+        try:
+            self.watcher.start()
+        except OSError as e:
+            print(f"⚠️  inotify unavailable for {self.label()} ({e}), polling instead")
+            self.watcher = PollingWatcher(docs_dir, self.apply_file_changes)
+            self.watcher.start()
+        self.journal_index.stale_check_interval = None
+        self.song_store.watched = True
+        self.render_cache.watched = True
+
+    def apply_file_changes(self, paths, resync=False):
+        """Bring the in-memory state in line with files changed outside the server (runs on the watcher thread)
+
+        resync means the watcher lost track of some changes: every indexed
+        entry and the song and follow-up files are checked as well, the
+        journal is rescanned and stats and follow-ups are rebuilt.
+        """
+        with self.load_lock:
+            if not self.loaded:
+                return
+            journal_root = self.journal_index.root + os.sep
+            records_changed = resync
+            rescan = resync
+            if resync:
+                with self.journal_index.lock:
+                    # Entries deleted while events were dropped are only found this way
+                    known = [entry['full_path'] for entry in self.journal_index.entries.values()]
+                paths = set(paths) | set(known) | {self.song_store.path, self.followup_tracker.path}
+            for path in sorted(paths):
+                if path == self.song_store.path:
+                    self.apply_song_changes()
+                elif path == self.followup_tracker.path:
+                    records_changed = records_changed or self.followup_tracker.changed_on_disk()
+                elif not path.startswith(journal_root):
+                    continue
+                elif os.path.basename(path) == STORE_FILENAME:
+                    records_changed = bool(self.entry_store.reload_store(path)) or records_changed
+                elif path.endswith('.md'):
+                    records_changed = self.apply_journal_change(path) or records_changed
+                else:
+                    # A directory appeared or went away
+                    rescan = True
+            if rescan:
+                self.journal_index.refresh(force=True)
+            if records_changed:
+                self.rebuild_record_views()
+
+    def apply_song_changes(self):
+        """Reload songs.json and announce the songs that differ"""
+        # Held until the changes are published so request writes can't be announced in between
+        with self.song_store.lock:
+            before = self.song_store.revision
+            if not self.song_store.reload_if_changed(notified=True):
+                return
+            changed, deleted, _, _ = self.song_store.changes_since(before)
+            for song in changed:
+                self.change_feed.publish('song', 'updated', song)
+            for song_id in deleted:
+                self.change_feed.publish('song', 'deleted', {'id': song_id})
+        self.sync_song_stats()
+        print(f"🔄 {self.label()}: songs.json changed on disk ({len(changed)} updated, {len(deleted)} removed)")
+
+    def apply_journal_change(self, path):
+        """Re-index one markdown file that was written or removed; returns whether its record changed"""
+        filename = os.path.basename(path)
+        self.render_cache.invalidate(path)
+        with self.journal_index.lock:
+            known = self.journal_index.entries.get(filename)
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            if known is None or known['full_path'] != path:
+                return False
+            entry = self.journal_index.discard(filename)
+            self.search_index.remove_document(filename)
+            self.change_feed.publish('journal', 'deleted', entry)
+            return self.entry_store.discard(filename) is not None
+
+        if (known is not None and known['full_path'] == path and known['mtime'] == stat_result.st_mtime
+                and known['size'] == stat_result.st_size):
+            # The server's own write
+            return False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"⚠️  Skipped {path} while re-indexing: {e}")
+            return False
+        entry = self.journal_index.add(path)
+        self.change_feed.publish('journal', 'updated' if known else 'created', entry)
+        if not entry['date']:
+            # Not an entry (e.g. docs/journal/README.md), so it isn't searchable either
+            return False
+        self.search_index.add_document(filename, content)
+        # Records parsed from markdown follow the file; form records stay as submitted
+        previous = self.entry_store.discard(filename)
+        record = self.entry_store.backfill(filename, content)
+        return record['source'] == 'markdown' and record != previous
+
+    def rebuild_record_views(self):
+        """Recount stats and follow-ups from the structured records after they changed on disk
+
+        Both are refilled in place while entry saves and follow-up updates
+        wait, so requests holding them never write to a discarded copy.
+        """
+        with self.journal_lock, self.followup_tracker.lock:
+            records = list(self.entry_store.records.values())
+            self.album_stats.rebuild(records, self.song_store.changes_since(0))
+            self.followup_tracker.rebuild(records)
+        # Song edits made while the stats were recounted
+        self.sync_song_stats()
+        self.change_feed.publish('followup', 'reloaded', {})
+
+    def rewrite_links(self, body, extension):
+        """Point the UI's http://localhost:8082/ links and API calls at this album"""
+        if extension != '.html':
+            return body
+        return body.replace(b'http://localhost:8082/', f'{self.prefix}/'.encode())
+
+    def build_content_indexes(self):
+        """Read every journal entry once to fill the search index and backfill structured records"""
+        for entry in self.journal_index.list_entries():
+            if not entry['date']:
+                # Other markdown under docs/journal (README.md) isn't an entry
+                continue
+            try:
+                with open(entry['full_path'], 'r', encoding='utf-8') as f:
+                    content = f.read()
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"⚠️  Skipped {entry['full_path']} while indexing: {e}")
+                continue
+            self.search_index.add_document(entry['filename'], content)
+            self.entry_store.backfill(entry['filename'], content)
+
+    def sync_song_stats(self):
+        """Feed song changes since the last sync into the album stats"""
+        self.album_stats.apply_song_changes(*self.song_store.changes_since(self.album_stats.song_revision or 0))
+
+    def write_journal_entry(self, data, now):
+        """Save one entry under docs/journal/YYYY/MM and update the in-memory indexes
+
+        Entries carrying a clientId that was already saved are not written again.
+        Returns a dict with filename, file_path and duplicate.
+        """
+        for field in ('track', 'date', 'notes'):
+            if not data.get(field):
+                raise ValueError(f"Missing required field: {field}")
+
+        # Create organized folder structure
+        year = now.strftime('%Y')
+        month = now.strftime('%m')
+        day = now.strftime('%d')
+        time_str = now.strftime('%H%M')
+        journal_dir = self.path('docs', 'journal', year, month)
+        track_slug = make_track_slug(data['track'])
+        markdown_content = render_entry(data, now)
+
+        with self.journal_lock:
+            existing = self.entry_store.find_client_id(data.get('clientId'))
+            if existing is not None:
+                return {
+                    'filename': existing['filename'],
+                    'file_path': self.path('docs', 'journal', existing['path']),
+                    'duplicate': True
+                }
+
+            # Create filename, never overwriting an entry saved in the same minute: later ones get
+            # a sequence number right after the time, so the track slug stays intact and name order
+            # stays save order
+            filename = f"{year}-{month}-{day}-{time_str}-{track_slug}.md"
+            sequence = 2
+            while os.path.exists(os.path.join(journal_dir, filename)):
+                if sequence > 99:
+                    raise ValueError("Too many entries saved in the same minute")
+                filename = f"{year}-{month}-{day}-{time_str}{sequence:02d}-{track_slug}.md"
+                sequence += 1
+
+            # Create folder structure and save the file
+            file_path = os.path.join(journal_dir, filename)
+            os.makedirs(journal_dir, exist_ok=True)
+            with open(file_path, 'w') as f:
+                f.write(markdown_content)
+            entry = self.journal_index.add(file_path)
+            self.search_index.add_document(filename, markdown_content)
+            record = self.entry_store.append(filename, data, now.isoformat(timespec='seconds'))
+            self.album_stats.add_entry(record)
+            self.followup_tracker.add_entry(record)
+            self.change_feed.publish('journal', 'created', entry)
+        self.git_worker.record_write(file_path, self.entry_store.month_store(year, month))
+        return {'filename': filename, 'file_path': file_path, 'duplicate': False}
+
+
+class AlbumRegistry:
+    """The albums this server hosts, loaded on demand and evicted least recently used first"""
+
+    def __init__(self, max_loaded=MAX_LOADED_ALBUMS, idle_seconds=IDLE_SECONDS, memory_budget=None):
+        self.max_loaded = max_loaded
+        self.idle_seconds = idle_seconds
+        # Estimated bytes all loaded albums may use together (None: no limit)
+        self.memory_budget = memory_budget
+        self.lock = threading.Lock()
+        self.albums = {}
+        self.sweeper = None
+
+    def add(self, album):
+        with self.lock:
+            self.albums[album.name] = album
+        return album
+
+    def discover(self, albums_dir):
+        """Add every repo under albums_dir that has a docs/ folder; returns how many"""
+        added = 0
+        for child in sorted(os.scandir(albums_dir), key=lambda e: e.name):
+            if child.is_dir() and not child.name.startswith('.') and os.path.isdir(os.path.join(child.path, 'docs')):
+                self.add(Album(child.name, os.path.abspath(child.path), prefix=ALBUMS_PREFIX + child.name))
+                added += 1
+        return added
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.albums.values()))
+
+    def resolve(self, path):
+        """(album, path without the album prefix) for a request path; album is None if unknown"""
+        if path.startswith(ALBUMS_PREFIX):
+            name, _, rest = path[len(ALBUMS_PREFIX):].partition('/')
+            name = name.split('?', 1)[0]
+            with self.lock:
+                album = self.albums.get(name) if name else None
+            return album, '/' + rest
+        with self.lock:
+            return self.albums.get(''), path
+
+    def acquire(self, album):
+        """Mark an album in use, loading it first if it was evicted"""
+        with self.lock:
+            album.users += 1
+            album.last_used = time.monotonic()
+        try:
+            with album.load_lock:
+                if not album.loaded:
+                    album.load(verbose=False)
+        except BaseException:
+            self.release(album)
+            raise
+        self.evict()
+
+    def release(self, album):
+        with self.lock:
+            album.users -= 1
+            album.last_used = time.monotonic()
+
+    def loaded(self):
+        with self.lock:
+            return [album for album in self.albums.values() if album.loaded]
+
+    def total(self, read_value):
+        """Sum of read_value(album) over the loaded albums, for gauges"""
+        return sum(read_value(album) for album in self.loaded())
+
+    def evict(self, now=None):
+        """Unload idle albums, then the least recently used ones while over budget"""
+        now = now or time.monotonic()
+        with self.lock:
+            candidates = sorted((album for album in self.albums.values() if album.loaded and album.users == 0),
+                                key=lambda album: album.last_used)
+            loaded = [album for album in self.albums.values() if album.loaded]
+            count = len(loaded)
+            footprint = sum(album.footprint for album in loaded)
+        for album in candidates:
+            over_budget = count > self.max_loaded or (
+                self.memory_budget is not None and footprint > self.memory_budget)
+            if not over_budget and now - album.last_used < self.idle_seconds:
+                break
+            with album.load_lock:
+                # Skip it if a request picked it up meanwhile
+                if album.users or not album.loaded:
+                    continue
+                footprint -= album.footprint
+                album.unload()
+                count -= 1
+
+    def start_sweeper(self):
+        """Background thread that evicts albums once they have been idle long enough"""
+        if self.sweeper is None:
+            self.sweeper = threading.Thread(target=self.sweep, name='album-sweeper', daemon=True)
+            self.sweeper.start()
+
+    def sweep(self):
+        while True:
+            time.sleep(max(self.idle_seconds / 4, 1))
+            self.evict()
+
+    def describe(self):
+        """Album list for /api/albums"""
+        return [{
+            'name': album.name,
+            'prefix': album.prefix or '/',
+            'loaded': album.loaded,
+            'in_use': album.users,
+            'idle_seconds': round(time.monotonic() - album.last_used, 1),
+            'estimated_bytes': album.footprint
+        } for album in self]
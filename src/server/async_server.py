@@ -0,0 +1,438 @@
+"""
+Async Server
+asyncio front end for JournalHandler: keep-alive HTTP/1.1 connections on a
+single event loop, route handlers on a thread pool so disk I/O never blocks
+the loop, and change-feed long-polls and SSE streams that wait on the loop
+without holding a thread each
+"""
+
+import io
+import json
+import time
+import asyncio
+import subprocess
+import http.client
+from http import HTTPStatus
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+
+from request_metrics import CountingWriter
+
+MAX_HEADER_BYTES = 64 * 1024
+# Idle keep-alive connections are closed after this many seconds
+KEEP_ALIVE_TIMEOUT = 60
+# Responses up to this size get a Content-Length; bigger ones are streamed as they are written
+BUFFERED_RESPONSE = 64 * 1024
+SENDFILE_CHUNK = 256 * 1024
+# A request body that stalls this long fails the request
+BODY_READ_TIMEOUT = 120
+# Unread request bodies up to this size are skipped to keep the connection; bigger ones close it
+MAX_SKIPPED_BODY = 1024 * 1024
+
+
+class LoopReader(io.RawIOBase):
+    """Request body for a handler thread, read from the connection on the event loop"""
+
+    def __init__(self, reader, loop, length):
+        self.reader = reader
+        self.loop = loop
+        self.remaining = length
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.remaining <= 0:
+            return 0
+        size = min(len(buffer), self.remaining)
+        read = asyncio.wait_for(self.reader.read(size), BODY_READ_TIMEOUT)
+        data = asyncio.run_coroutine_threadsafe(read, self.loop).result()
+        if not data:
+            self.remaining = 0
+            return 0
+        self.remaining -= len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class ResponseWriter:
+    """What a handler writes to wfile, re-framed for the client's connection.
+
+    The handler writes an HTTP/1.0 response without a length. Small bodies
+    are collected and sent with a Content-Length so the connection can be
+    reused; once a body outgrows the buffer it is streamed, chunked for
+    HTTP/1.1 clients.
+    """
+
+    def __init__(self, writer, loop, method, request_version, keep_alive):
+        self.writer = writer
+        self.loop = loop
+        self.method = method
+        self.request_version = request_version
+        self.keep_alive = keep_alive
+        self.pending = b''
+        self.status = None
+        self.headers = None
+        self.body = []
+        self.body_size = 0
+        self.streaming = False
+        self.chunked = False
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        if self.headers is None:
+            self.pending += data
+            head, separator, rest = self.pending.partition(b'\r\n\r\n')
+            if not separator:
+                return len(data)
+            self.parse_head(head)
+            self.pending = b''
+            data = rest
+        if self.streaming:
+            self.send_body(data)
+        else:
+            self.body.append(data)
+            self.body_size += len(data)
+            if self.body_size > BUFFERED_RESPONSE:
+                self.start_streaming()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def parse_head(self, head):
+        lines = head.decode('latin-1').split('\r\n')
+        self.status = int(lines[0].split(' ', 2)[1])
+        self.status_line = lines[0].split(' ', 1)[1]
+        self.headers = [line for line in lines[1:] if line and not line.lower().startswith('connection:')]
+
+    def has_header(self, name):
+        prefix = name.lower() + ':'
+        return any(line.lower().startswith(prefix) for line in self.headers)
+
+    def bodyless(self):
+        return self.method == 'HEAD' or self.status in (204, 304) or self.status < 200
+
+    def head_bytes(self, extra):
+        version = 'HTTP/1.1' if self.request_version == 'HTTP/1.1' else 'HTTP/1.0'
+        connection = 'keep-alive' if self.keep_alive else 'close'
+        lines = [f'{version} {self.status_line}'] + self.headers + extra + [f'Connection: {connection}']
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    def start_streaming(self):
+        extra = []
+        if not self.has_header('Content-Length'):
+            if self.request_version == 'HTTP/1.1':
+                self.chunked = True
+                extra.append('Transfer-Encoding: chunked')
+            else:
+                # The end of the body can only be signalled by closing
+                self.keep_alive = False
+        self.streaming = True
+        body = b''.join(self.body)
+        self.body = []
+        self.send(self.head_bytes(extra))
+        self.send_body(body)
+
+    def send_body(self, data):
+        if not data:
+            return
+        if self.chunked:
+            data = f'{len(data):x}\r\n'.encode() + data + b'\r\n'
+        self.send(data)
+
+    def send(self, data):
+        asyncio.run_coroutine_threadsafe(self.drain_write(data), self.loop).result()
+
+    async def drain_write(self, data):
+        self.writer.write(data)
+        await self.writer.drain()
+
+    def finish(self):
+        """Send whatever is still buffered; called after the handler returns"""
+        if self.headers is None:
+            # The handler never completed a response
+            self.keep_alive = False
+            return
+        if self.streaming:
+            if self.chunked:
+                self.send(b'0\r\n\r\n')
+            return
+        extra = []
+        if not self.bodyless() and not self.has_header('Content-Length'):
+            extra.append(f'Content-Length: {self.body_size}')
+        # Small enough to queue without waiting; the loop drains it once the handler returns
+        self.loop.call_soon_threadsafe(self.writer.write, self.head_bytes(extra) + b''.join(self.body))
+
+
+class ConnectionAdapter:
+    """Stands in for the socket when a handler calls connection.sendfile()"""
+
+    def __init__(self, response):
+        self.response = response
+
+    def sendfile(self, file, offset=0, count=None):
+        file.seek(offset)
+        sent = 0
+        while count is None or sent < count:
+            size = SENDFILE_CHUNK if count is None else min(SENDFILE_CHUNK, count - sent)
+            chunk = file.read(size)
+            if not chunk:
+                break
+            self.response.write(chunk)
+            sent += len(chunk)
+        return sent
+
+
+class AsyncJournalServer:
+    """Runs JournalHandler's routes behind an asyncio HTTP/1.1 server"""
+
+    def __init__(self, handler_class, albums, metrics, threads=16, max_change_wait=30, stream_seconds=300):
+        self.handler_class = handler_class
+        self.albums = albums
+        self.metrics = metrics
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='journal-async')
+        self.max_change_wait = max_change_wait
+        self.stream_seconds = stream_seconds
+        self.loop = None
+        self.change_event = None
+        self.connections = 0
+        self.streams = 0
+
+    async def serve(self, port):
+        self.loop = asyncio.get_running_loop()
+        self.change_event = asyncio.Event()
+        for album in self.albums:
+            album.change_feed.listeners.append(lambda: self.loop.call_soon_threadsafe(self.notify_change))
+            album.git_worker.runner = self.run_git
+        server = await asyncio.start_server(self.handle_connection, port=port, limit=MAX_HEADER_BYTES)
+        async with server:
+            await server.serve_forever()
+
+    def notify_change(self):
+        """Wake every waiting long-poll and stream, then arm a fresh event for the next change"""
+        self.change_event.set()
+        self.change_event = asyncio.Event()
+
+    async def handle_connection(self, reader, writer):
+        self.connections += 1
+        client_address = writer.get_extra_info('peername') or ('', 0)
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                keep_alive = await self.handle_request(head, reader, writer, client_address)
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        except asyncio.CancelledError:
+            # Server shutting down; ending quietly keeps Ctrl+C free of tracebacks
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def handle_request(self, head, reader, writer, client_address):
+        """Serve one request; returns whether the connection can be reused"""
+        request_line, _, header_block = head.partition(b'\r\n')
+        parts = request_line.decode('latin-1').split()
+        if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+            await self.send_simple(writer, 'HTTP/1.0', 400, {'success': False, 'message': 'Bad request'}, False)
+            return False
+        method, path, version = parts
+        headers = http.client.parse_headers(io.BytesIO(header_block))
+        connection = headers.get('Connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+        if 'chunked' in headers.get('Transfer-Encoding', '').lower():
+            await self.send_simple(writer, version, 411, {'success': False, 'message': 'Send a Content-Length'}, False)
+            return False
+        try:
+            length = int(headers.get('Content-Length') or 0)
+        except ValueError:
+            await self.send_simple(writer, version, 400, {'success': False, 'message': 'Bad Content-Length'}, False)
+            return False
+        if length and headers.get('Expect', '').lower() == '100-continue' and version == 'HTTP/1.1':
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+
+        album, album_path = self.albums.resolve(path)
+        route = urlparse(album_path).path
+        if album is not None and method == 'GET' and route == '/api/changes':
+            return await self.get_changes(album.change_feed, writer, version, album_path, headers, keep_alive)
+        if album is not None and method == 'GET' and route == '/api/changes/stream':
+            await self.stream_changes(album.change_feed, writer, version, album_path, headers)
+            return False
+
+        response = ResponseWriter(writer, self.loop, method, version, keep_alive)
+        body = LoopReader(reader, self.loop, length)
+        await self.loop.run_in_executor(self.executor, self.run_handler, method, path, version,
+                                        request_line, headers, body, response, client_address)
+        await writer.drain()
+        if response.keep_alive and body.remaining > MAX_SKIPPED_BODY:
+            response.keep_alive = False
+        elif response.keep_alive and body.remaining:
+            # Skip whatever part of the body the handler didn't read
+            await reader.readexactly(body.remaining)
+        return response.keep_alive
+
+    def run_handler(self, method, path, version, request_line, headers, body, response, client_address):
+        """Call the JournalHandler do_* method on a pool thread, as the threaded servers would"""
+        handler = self.handler_class.__new__(self.handler_class)
+        handler.client_address = client_address
+        handler.server = self
+        handler.request = None
+        handler.connection = ConnectionAdapter(response)
+        handler.rfile = io.BufferedReader(body)
+        handler.wfile = CountingWriter(response)
+        handler.raw_requestline = request_line + b'\r\n'
+        handler.requestline = request_line.decode('latin-1')
+        handler.command, handler.path, handler.request_version = method, path, version
+        handler.headers = headers
+        handler.close_connection = True
+        handler.status_code = None
+
+        started = time.perf_counter()
+        profiler = self.metrics.start_request()
+        try:
+            opened = handler.open_album()
+            self.metrics.set_route(handler.path)
+            if opened:
+                do_method = getattr(handler, 'do_' + method, None)
+                if do_method is None:
+                    handler.send_error(HTTPStatus.NOT_IMPLEMENTED, f"Unsupported method ({method})")
+                else:
+                    do_method()
+            response.finish()
+        except (ConnectionResetError, BrokenPipeError):
+            response.keep_alive = False
+        except Exception as e:
+            print(f"❌ Unhandled error in {method} {path}: {e}")
+            if response.headers is None:
+                handler.send_error(HTTPStatus.INTERNAL_SERVER_ERROR)
+                response.finish()
+            response.keep_alive = False
+        finally:
+            handler.close_album()
+            self.metrics.finish_request(method, handler.path, handler.status_code, handler.wfile.sent, started, profiler)
+
+    async def send_simple(self, writer, version, status, data, keep_alive, extra_headers=()):
+        """JSON response written straight from the loop"""
+        body = json.dumps(data).encode()
+        lines = [
+            f"{'HTTP/1.1' if version == 'HTTP/1.1' else 'HTTP/1.0'} {status} {HTTPStatus(status).phrase}",
+            'Content-type: application/json',
+            'Access-Control-Allow-Origin: *',
+            f'Content-Length: {len(body)}',
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+            *extra_headers
+        ]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+        return len(body)
+
+    async def wait_for_change(self, change_feed, version, timeout):
+        """Like ChangeFeed.wait, but parks a coroutine instead of a thread"""
+        deadline = self.loop.time() + timeout
+        while True:
+            # One event wakes waiters on every album, so check this feed again after each wake
+            event = self.change_event
+            events, reset = change_feed.since(version)
+            remaining = deadline - self.loop.time()
+            if events or reset or remaining <= 0:
+                return events, reset
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    def since_param(self, path, headers):
+        params = {key: values[0] for key, values in parse_qs(urlparse(path).query).items()}
+        return int(headers.get('Last-Event-ID') or params.get('since', '0')), params
+
+    async def get_changes(self, change_feed, writer, version, path, headers, keep_alive):
+        """Same response as JournalHandler.get_changes"""
+        started = time.perf_counter()
+        self.metrics.start_request(profile=False)
+        try:
+            since, params = self.since_param(path, headers)
+            wait = min(max(float(params.get('wait', 0)), 0), self.max_change_wait)
+        except ValueError:
+            sent = await self.send_simple(writer, version, 400,
+                                          {'success': False, 'message': 'since and wait must be numbers'}, keep_alive)
+            self.metrics.finish_request('GET', path, 400, sent, started)
+            return keep_alive
+
+        events, reset = await self.wait_for_change(change_feed, since, wait)
+        if reset:
+            current = change_feed.current_version()
+        else:
+            current = events[-1]['version'] if events else since
+        # Waiting costs a coroutine, not a worker, so long-polls are never turned away (retryAfter 0)
+        body = {'success': True, 'version': current, 'reset': reset, 'events': events, 'retryAfter': 0}
+        sent = await self.send_simple(writer, version, 200, body, keep_alive)
+        self.metrics.finish_request('GET', path, 200, sent, started)
+        return keep_alive
+
+    async def stream_changes(self, change_feed, writer, version, path, headers):
+        """Same stream as JournalHandler.stream_changes, with no cap on open streams"""
+        started = time.perf_counter()
+        self.metrics.start_request(profile=False)
+        try:
+            current, _ = self.since_param(path, headers)
+        except ValueError:
+            sent = await self.send_simple(writer, version, 400,
+                                          {'success': False, 'message': 'since must be a number'}, False)
+            self.metrics.finish_request('GET', path, 400, sent, started)
+            return
+
+        self.streams += 1
+        sent = 0
+        try:
+            head = (f"{'HTTP/1.1' if version == 'HTTP/1.1' else 'HTTP/1.0'} 200 OK\r\n"
+                    'Content-type: text/event-stream\r\n'
+                    'Cache-Control: no-cache\r\n'
+                    'Access-Control-Allow-Origin: *\r\n'
+                    'Connection: close\r\n\r\n'
+                    'retry: 2000\n\n').encode()
+            writer.write(head)
+            sent += len(head)
+            deadline = time.monotonic() + self.stream_seconds
+            while time.monotonic() < deadline:
+                events, reset = await self.wait_for_change(change_feed, current, 15)
+                if reset:
+                    current = change_feed.current_version()
+                    message = f"id: {current}\nevent: reset\ndata: {json.dumps({'version': current})}\n\n"
+                elif events:
+                    current = events[-1]['version']
+                    message = ''.join(f"id: {e['version']}\nevent: change\ndata: {json.dumps(e)}\n\n" for e in events)
+                else:
+                    message = ': keep-alive\n\n'
+                data = message.encode()
+                writer.write(data)
+                await writer.drain()
+                sent += len(data)
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            self.streams -= 1
+            self.metrics.finish_request('GET', path, 200, sent, started)
+
+    def run_git(self, args, cwd, timeout):
+        """subprocess.run stand-in for the git worker thread, driven by the event loop"""
+        return asyncio.run_coroutine_threadsafe(self.git_subprocess(args, cwd, timeout), self.loop).result()
+
+    async def git_subprocess(self, args, cwd, timeout):
+        process = await asyncio.create_subprocess_exec(
+            *args, cwd=cwd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise subprocess.TimeoutExpired(args, timeout)
+        return subprocess.CompletedProcess(args, process.returncode,
+                                           stdout.decode(errors='replace'), stderr.decode(errors='replace'))
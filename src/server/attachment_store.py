@@ -0,0 +1,347 @@
+"""
+Attachment Store
+Audio bounces attached to songs and journal entries: resumable uploads
+streamed to disk a chunk at a time, stored once per content hash, and
+listed in attachments/attachments.json
+"""
+
+import os
+import re
+import json
+import stat
+import time
+import uuid
+import hashlib
+import tempfile
+import threading
+from datetime import datetime
+
+AUDIO_TYPES = {
+    '.wav': 'audio/wav',
+    '.flac': 'audio/flac',
+    '.aif': 'audio/aiff',
+    '.aiff': 'audio/aiff',
+    '.mp3': 'audio/mpeg',
+    '.m4a': 'audio/mp4',
+    '.ogg': 'audio/ogg'
+}
+
+# Request bodies are copied to disk in pieces this size, so memory stays flat for any upload
+CHUNK_SIZE = 256 * 1024
+MAX_ATTACHMENT_SIZE = 4 * 1024 * 1024 * 1024
+# Unfinished uploads nobody has resumed for this long are removed on load
+UPLOAD_EXPIRY = 7 * 24 * 3600
+
+
+def parse_range(header, size):
+    """(start, end) of a single 'bytes=' range, inclusive, clamped to size.
+
+    Returns None when the header should be ignored (absent, malformed or
+    several ranges, which get the whole file) and raises ValueError when
+    the range can't be satisfied.
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    first, separator, last = header[len('bytes='):].strip().partition('-')
+    if not separator:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise ValueError(f"Range not satisfiable for {size} bytes")
+    return start, min(end, size - 1)
+
+
+class AttachmentStore:
+    """Attachment records keyed by id, plus the uploads still in progress.
+
+    Finished files live in blobs/<first two hex digits>/<sha256>, so the
+    same take attached twice (or uploaded again after a failed attach) is
+    kept once. An upload in progress is a .part file whose size is the
+    offset to resume from, next to a .json file with what was announced.
+    """
+
+    def __init__(self, root='attachments'):
+        self.root = root
+        self.path = os.path.join(root, 'attachments.json')
+        self.blob_dir = os.path.join(root, 'blobs')
+        self.peaks_dir = os.path.join(root, 'peaks')
+        self.upload_dir = os.path.join(root, 'uploads')
+        self.lock = threading.RLock()
+        self.attachments = {}
+        # Running hashes of uploads receiving their chunks in order: upload id -> (offset, hasher)
+        self.hashers = {}
+        # Uploads a request is writing to right now
+        self.writing = set()
+
+    def load(self):
+        """Read the attachment list and clear out abandoned uploads"""
+        with self.lock:
+            try:
+                with open(self.path, 'r') as f:
+                    records = json.load(f)
+            except FileNotFoundError:
+                records = []
+            self.attachments = {record['id']: record for record in records}
+            if os.path.isdir(self.root):
+                self.make_root()
+            self.expire_uploads()
+            return len(self.attachments)
+
+    def expire_uploads(self):
+        if not os.path.isdir(self.upload_dir):
+            return
+        cutoff = time.time() - UPLOAD_EXPIRY
+        for name in os.listdir(self.upload_dir):
+            path = os.path.join(self.upload_dir, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+            except OSError:
+                continue
+
+    def make_root(self):
+        """Create the attachments folder with a .gitignore of '*', so the album's git backups skip the audio"""
+        os.makedirs(self.root, exist_ok=True)
+        ignore_path = os.path.join(self.root, '.gitignore')
+        if not os.path.exists(ignore_path):
+            with open(ignore_path, 'w') as f:
+                f.write('*\n')
+
+    def blob_path(self, sha256):
+        return os.path.join(self.blob_dir, sha256[:2], sha256)
+
+    def peaks_path(self, sha256):
+        """Waveform sidecar of stored content (see waveform_peaks)"""
+        return os.path.join(self.peaks_dir, sha256[:2], sha256 + '.peaks')
+
+    def get(self, attachment_id):
+        with self.lock:
+            return self.attachments.get(attachment_id)
+
+    def list(self, song_id=None, journal_file=None):
+        """Attachments in upload order, optionally only those of one song or journal file"""
+        with self.lock:
+            records = list(self.attachments.values())
+        if song_id is not None:
+            records = [record for record in records if record.get('songId') == song_id]
+        if journal_file is not None:
+            records = [record for record in records if record.get('journalFile') == journal_file]
+        return records
+
+    def start_upload(self, filename, size, song_id=None, journal_file=None, sha256=None):
+        """Announce an upload; returns (upload, attachment).
+
+        When sha256 names content that is already stored, the attachment is
+        made straight away and upload is None.
+        """
+        # Ends up in a Content-Disposition header, so only plain characters are kept
+        filename = re.sub(r'[^\w .()+-]', '_', os.path.basename(filename or '')).strip()
+        extension = os.path.splitext(filename)[1].lower()
+        if extension not in AUDIO_TYPES:
+            raise ValueError(f"Unsupported audio type: {extension or filename}")
+        if not isinstance(size, int) or not 0 < size <= MAX_ATTACHMENT_SIZE:
+            raise ValueError(f"size must be between 1 and {MAX_ATTACHMENT_SIZE} bytes")
+        if sha256 is not None:
+            sha256 = sha256.lower()
+            if len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256):
+                raise ValueError("sha256 must be 64 hex digits")
+            blob_path = self.blob_path(sha256)
+            with self.lock:
+                if os.path.exists(blob_path):
+                    return None, self.attach(sha256, os.path.getsize(blob_path), filename, song_id, journal_file)
+
+        upload = {
+            'id': uuid.uuid4().hex,
+            'filename': filename,
+            'size': size,
+            'sha256': sha256,
+            'songId': song_id,
+            'journalFile': journal_file,
+            'createdAt': datetime.now().isoformat()
+        }
+        self.make_root()
+        os.makedirs(self.upload_dir, exist_ok=True)
+        with open(self.upload_state_path(upload['id']), 'w') as f:
+            json.dump(upload, f)
+        open(self.part_path(upload['id']), 'wb').close()
+        self.hashers[upload['id']] = (0, hashlib.sha256())
+        return dict(upload, offset=0), None
+
+    def upload_state_path(self, upload_id):
+        return os.path.join(self.upload_dir, upload_id + '.json')
+
+    def part_path(self, upload_id):
+        return os.path.join(self.upload_dir, upload_id + '.part')
+
+    def get_upload(self, upload_id):
+        """An upload with the offset it continues from, or None"""
+        if not upload_id.isalnum():
+            return None
+        try:
+            with open(self.upload_state_path(upload_id), 'r') as f:
+                upload = json.load(f)
+            upload['offset'] = os.path.getsize(self.part_path(upload_id))
+        except (OSError, ValueError):
+            return None
+        return upload
+
+    def append(self, upload_id, offset, stream, length):
+        """Copy length bytes of stream to the upload at offset; returns (upload, attachment).
+
+        Whatever arrives before the client goes away is kept, so the next
+        attempt resumes from there. attachment is set once the last byte is in.
+        """
+        with self.lock:
+            if upload_id in self.writing:
+                raise ValueError("Upload is already receiving a chunk")
+            self.writing.add(upload_id)
+        try:
+            upload = self.get_upload(upload_id)
+            if upload is None:
+                return None, None
+            if offset != upload['offset']:
+                raise ValueError(f"Upload continues at byte {upload['offset']}, not {offset}")
+            if offset + length > upload['size']:
+                raise ValueError(f"Chunk runs past the announced size of {upload['size']} bytes")
+
+            hashed, hasher = self.hashers.get(upload_id, (None, None))
+            if hashed != offset:
+                # Resumed after a restart or eviction; the hash is redone when the upload finishes
+                hasher = None
+            received = 0
+            with open(self.part_path(upload_id), 'r+b') as f:
+                f.seek(offset)
+                try:
+                    while received < length:
+                        chunk = stream.read(min(CHUNK_SIZE, length - received))
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        if hasher is not None:
+                            hasher.update(chunk)
+                        received += len(chunk)
+                finally:
+                    f.truncate(offset + received)
+                    if hasher is not None:
+                        self.hashers[upload_id] = (offset + received, hasher)
+            upload['offset'] = offset + received
+            if upload['offset'] < upload['size']:
+                return upload, None
+            return upload, self.finish_upload(upload, hasher)
+        finally:
+            with self.lock:
+                self.writing.discard(upload_id)
+
+    def finish_upload(self, upload, hasher):
+        """Move a complete upload into the blob store and attach it"""
+        part_path = self.part_path(upload['id'])
+        if hasher is None:
+            hasher = hashlib.sha256()
+            with open(part_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    hasher.update(chunk)
+        sha256 = hasher.hexdigest()
+        self.hashers.pop(upload['id'], None)
+        if upload['sha256'] and upload['sha256'] != sha256:
+            # Corrupted on the way: start the upload over
+            open(part_path, 'wb').close()
+            self.hashers[upload['id']] = (0, hashlib.sha256())
+            raise ValueError("Checksum mismatch, upload restarted from byte 0")
+
+        blob_path = self.blob_path(sha256)
+        with self.lock:
+            if os.path.exists(blob_path):
+                os.remove(part_path)
+            else:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.replace(part_path, blob_path)
+            os.remove(self.upload_state_path(upload['id']))
+            return self.attach(sha256, upload['size'], upload['filename'], upload['songId'], upload['journalFile'])
+
+    def cancel_upload(self, upload_id):
+        """Drop an unfinished upload; returns whether it existed"""
+        if self.get_upload(upload_id) is None:
+            return False
+        self.hashers.pop(upload_id, None)
+        for path in (self.part_path(upload_id), self.upload_state_path(upload_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return True
+
+    def attach(self, sha256, size, filename, song_id=None, journal_file=None):
+        """Record stored content as attached; attaching the same file to the same place again returns the first record"""
+        filename = os.path.basename(filename)
+        with self.lock:
+            for record in self.attachments.values():
+                if (record['sha256'] == sha256 and record['filename'] == filename
+                        and record.get('songId') == song_id and record.get('journalFile') == journal_file):
+                    return record
+            record = {
+                'id': uuid.uuid4().hex[:16],
+                'sha256': sha256,
+                'size': size,
+                'filename': filename,
+                'contentType': AUDIO_TYPES[os.path.splitext(filename)[1].lower()],
+                'songId': song_id,
+                'journalFile': journal_file,
+                'createdAt': datetime.now().isoformat()
+            }
+            self.attachments[record['id']] = record
+            self.save()
+            return record
+
+    def delete(self, attachment_id):
+        """Remove an attachment, and its file once nothing else refers to it; returns the record or None"""
+        with self.lock:
+            record = self.attachments.pop(attachment_id, None)
+            if record is None:
+                return None
+            self.save()
+            if not any(other['sha256'] == record['sha256'] for other in self.attachments.values()):
+                for path in (self.blob_path(record['sha256']), self.peaks_path(record['sha256'])):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+            return record
+
+    def delete_for_song(self, song_id):
+        """Remove every attachment of a deleted song; returns the removed records"""
+        with self.lock:
+            return [self.delete(record['id']) for record in self.list(song_id=song_id)]
+
+    def file_mode(self):
+        try:
+            return stat.S_IMODE(os.stat(self.path).st_mode)
+        except OSError:
+            return 0o644
+
+    def save(self):
+        """Write to a temp file and rename it over attachments.json"""
+        self.make_root()
+        fd, temp_path = tempfile.mkstemp(prefix='.attachments-', suffix='.json', dir=self.root)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(list(self.attachments.values()), f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(temp_path, self.file_mode())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def __len__(self):
+        return len(self.attachments)
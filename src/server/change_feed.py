@@ -0,0 +1,81 @@
+"""
+Change Feed
+Versioned log of song and journal mutations that pages can follow with
+long-polling or Server-Sent Events instead of refetching whole lists
+"""
+
+import time
+import threading
+from collections import deque
+from datetime import datetime
+
+# How many recent changes are kept for clients catching up
+MAX_EVENTS = 1000
+
+
+class ChangeFeed:
+    """Monotonically versioned ring buffer of change events.
+
+    Versions come from the clock in milliseconds (like song revisions), so
+    every version a previous server run handed out is older than anything
+    this run knows and a client resuming from one is told to reload.
+    """
+
+    def __init__(self, max_events=MAX_EVENTS):
+        self.condition = threading.Condition()
+        self.events = deque(maxlen=max_events)
+        self.version = int(time.time() * 1000)
+        # Newest version no longer in the buffer; clients at or after it can catch up
+        self.floor = self.version
+        # Called (without arguments) after each publish, e.g. to wake an event loop
+        self.listeners = []
+
+    def publish(self, kind, action, data):
+        """Record a change (kind: song/journal, action: created/updated/deleted) and wake waiters"""
+        with self.condition:
+            self.version = max(self.version + 1, int(time.time() * 1000))
+            if len(self.events) == self.events.maxlen:
+                self.floor = self.events[0]['version']
+            event = {
+                'version': self.version,
+                'kind': kind,
+                'action': action,
+                'data': data,
+                'at': datetime.now().isoformat()
+            }
+            self.events.append(event)
+            self.condition.notify_all()
+            version = self.version
+        for listener in self.listeners:
+            listener()
+        return version
+
+    def current_version(self):
+        with self.condition:
+            return self.version
+
+    def since(self, version):
+        """Events after a version as (events, reset).
+
+        reset is True when the version is older than the buffer (or from a
+        previous server run) and the client has to reload the full lists.
+        """
+        with self.condition:
+            if version > self.version:
+                return [], True
+            if version == self.version:
+                return [], False
+            if version < self.floor:
+                return [], True
+            return [e for e in self.events if e['version'] > version], False
+
+    def wait(self, version, timeout):
+        """Block until there is something newer than version or the timeout passes"""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while self.version == version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+        return self.since(version)
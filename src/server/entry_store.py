@@ -0,0 +1,165 @@
+"""
+Entry Store
+Keeps the structured form data of each journal entry in an append-only
+entries.jsonl per month, next to the markdown files
+"""
+
+import os
+import json
+import threading
+
+from journal_index import parse_entry_filename
+from journal_markdown import parse_entry
+
+STORE_FILENAME = 'entries.jsonl'
+
+# Form fields kept from the save-entry request
+ENTRY_FIELDS = (
+    'date', 'track', 'notes', 'followup',
+    'bpm', 'key', 'effects', 'issues',
+    'mood', 'inspiration', 'challenges', 'breakthroughs'
+)
+
+
+def normalize_bpm(value):
+    """Store BPM as a number when it is one"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return value
+
+
+class EntryStore:
+    """Structured journal records keyed by markdown filename"""
+
+    def __init__(self, root=os.path.join('docs', 'journal')):
+        self.root = root
+        self.lock = threading.RLock()
+        self.records = {}
+        self.client_ids = {}
+
+    def month_store(self, year, month):
+        """Path of the JSONL file for a month folder"""
+        return os.path.join(self.root, year, month, STORE_FILENAME)
+
+    def load(self):
+        """Read every monthly entries.jsonl; later lines win over earlier ones"""
+        records = {}
+        if os.path.isdir(self.root):
+            for year in sorted(os.listdir(self.root)):
+                year_dir = os.path.join(self.root, year)
+                if not (year.isdigit() and os.path.isdir(year_dir)):
+                    continue
+                for month in sorted(os.listdir(year_dir)):
+                    store = self.month_store(year, month)
+                    if os.path.isfile(store):
+                        self.read_store(store, records)
+        with self.lock:
+            self.records = records
+            self.client_ids = {r['client_id']: r for r in records.values() if r.get('client_id')}
+        return len(records)
+
+    def read_store(self, store, records):
+        """Load one JSONL file, skipping lines cut short by a crash"""
+        with open(store, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                records[record['filename']] = record
+
+    def reload_store(self, store):
+        """Re-read one month's JSONL after it changed on disk; returns the filenames whose records changed"""
+        records = {}
+        if os.path.isfile(store):
+            self.read_store(store, records)
+        month_dir = os.path.relpath(os.path.dirname(store), self.root)
+        changed = []
+        with self.lock:
+            for filename, record in records.items():
+                if self.records.get(filename) != record:
+                    self.records[filename] = record
+                    changed.append(filename)
+            for filename, record in list(self.records.items()):
+                if (record['source'] != 'markdown' and filename not in records
+                        and os.path.dirname(record['path']) == month_dir):
+                    del self.records[filename]
+                    changed.append(filename)
+            self.client_ids = {r['client_id']: r for r in self.records.values() if r.get('client_id')}
+        return changed
+
+    def discard(self, filename):
+        """Drop a record parsed from markdown (e.g. when the file was edited or removed)"""
+        with self.lock:
+            record = self.records.get(filename)
+            if record is not None and record['source'] == 'markdown':
+                del self.records[filename]
+                return record
+            return None
+
+    def make_record(self, filename, values, saved_at, source):
+        """Build a record from form values (or values parsed back out of markdown)"""
+        parsed = parse_entry_filename(filename) or {}
+        record = {
+            'filename': filename,
+            'path': os.path.join(parsed.get('year', ''), parsed.get('month', ''), filename),
+            'saved_at': saved_at,
+            'track_slug': parsed.get('track'),
+            'source': source,
+            'client_id': values.get('clientId')
+        }
+        for field in ENTRY_FIELDS:
+            value = values.get(field)
+            record[field] = value if value not in ('', None) else None
+        if record['bpm'] is not None:
+            record['bpm'] = normalize_bpm(record['bpm'])
+        return record
+
+    def append(self, filename, data, saved_at):
+        """Persist the submitted form data for a freshly written entry"""
+        parsed = parse_entry_filename(filename)
+        record = self.make_record(filename, data, saved_at, 'form')
+        store = self.month_store(parsed['year'], parsed['month'])
+        with self.lock:
+            with open(store, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self.records[filename] = record
+            if record['client_id']:
+                self.client_ids[record['client_id']] = record
+        return record
+
+    def backfill(self, filename, content):
+        """Parse an older markdown-only entry once and keep the result in memory"""
+        with self.lock:
+            if filename in self.records:
+                return self.records[filename]
+        parsed = parse_entry(content)
+        values = dict(parsed['fields'])
+        values.update({
+            'date': parsed['date'],
+            'track': parsed['track'],
+            'notes': parsed['sections'].get('notes'),
+            'followup': parsed['sections'].get('followup')
+        })
+        saved_at = parsed['session_time'].replace(' ', 'T') if parsed['session_time'] else None
+        record = self.make_record(filename, values, saved_at, 'markdown')
+        with self.lock:
+            return self.records.setdefault(filename, record)
+
+    def find_client_id(self, client_id):
+        """Record saved earlier under a client-generated id, if any"""
+        if not client_id:
+            return None
+        with self.lock:
+            return self.client_ids.get(client_id)
+
+    def get(self, filename):
+        with self.lock:
+            return self.records.get(filename)
+
+    def __len__(self):
+        return len(self.records)
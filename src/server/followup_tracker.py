@@ -0,0 +1,163 @@
+"""
+Follow-up Tracker
+Indexes the "## Follow-up Actions" of journal entries per track, with
+open/done state kept in docs/followups.json
+"""
+
+import os
+import json
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime
+
+from journal_markdown import followup_items
+
+
+def action_order(action):
+    """Sort key: entry filename, then the action's number within the entry"""
+    return action['filename'], int(action['id'].rsplit('.', 1)[1])
+
+
+class FollowupTracker:
+    """Follow-up actions by id and by track.
+
+    Actions come from the structured entry records (form data, or markdown
+    parsed once at startup), so the journal is never rescanned. Only the
+    ids marked done or reopened through the API are written to disk.
+    """
+
+    def __init__(self, path=os.path.join('docs', 'followups.json')):
+        self.path = path
+        self.lock = threading.RLock()
+        self.actions = {}
+        self.by_track = {}
+        self.open_counts = Counter()
+        self.done_counts = Counter()
+        self.states = {}
+        self.file_state = None
+
+    def load(self):
+        """Read the saved done/open states"""
+        states = {}
+        file_state = self.stat_file()
+        if file_state is not None:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                states = json.load(f)
+        with self.lock:
+            self.states = states
+            self.file_state = file_state
+        return len(states)
+
+    def stat_file(self):
+        try:
+            stat_result = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat_result.st_mtime_ns, stat_result.st_size)
+
+    def changed_on_disk(self):
+        """Whether followups.json was written by something other than this tracker"""
+        return self.stat_file() != self.file_state
+
+    def add_entry(self, record):
+        """Index the follow-up actions of one journal record; returns how many it had"""
+        stem = os.path.splitext(record['filename'])[0]
+        track = record.get('track') or 'Unknown'
+        items = followup_items(record.get('followup'))
+        with self.lock:
+            for number, (text, ticked) in enumerate(items, 1):
+                action_id = f'{stem}.{number}'
+                if action_id in self.actions:
+                    continue
+                state = self.states.get(action_id, {})
+                action = {
+                    'id': action_id,
+                    'track': track,
+                    'date': record.get('date'),
+                    'filename': record['filename'],
+                    'text': text,
+                    'done': state.get('done', ticked),
+                    'done_at': state.get('done_at')
+                }
+                self.actions[action_id] = action
+                self.by_track.setdefault(track, []).append(action_id)
+                self.count(action, 1)
+        return len(items)
+
+    def rebuild(self, records):
+        """Re-read the saved states and re-index every record, replacing what this tracker holds"""
+        fresh = FollowupTracker(self.path)
+        fresh.load()
+        for record in records:
+            fresh.add_entry(record)
+        with self.lock:
+            for name, value in vars(fresh).items():
+                if name != 'lock':
+                    setattr(self, name, value)
+
+    def count(self, action, sign):
+        counts = self.done_counts if action['done'] else self.open_counts
+        counts[action['track']] += sign
+
+    def set_done(self, action_id, done):
+        """Mark an action done or open again; None if there is no such action"""
+        with self.lock:
+            action = self.actions.get(action_id)
+            if action is None:
+                return None
+            if action['done'] != done:
+                self.count(action, -1)
+                action['done'] = done
+                action['done_at'] = datetime.now().isoformat(timespec='seconds') if done else None
+                self.count(action, 1)
+                self.states[action_id] = {'done': done, 'done_at': action['done_at']}
+                self.save()
+            return dict(action)
+
+    def query(self, track=None, status='open'):
+        """Actions for one track (or all), oldest entry first, filtered by open/done/all"""
+        with self.lock:
+            if track is not None:
+                ids = self.by_track.get(track, [])
+            else:
+                ids = [action_id for track_ids in self.by_track.values() for action_id in track_ids]
+            actions = [self.actions[action_id] for action_id in ids]
+            if status != 'all':
+                actions = [a for a in actions if a['done'] == (status == 'done')]
+            # Filenames start with YYYY-MM-DD-HHMM, unlike the displayed date
+            return [dict(a) for a in sorted(actions, key=action_order)]
+
+    def summary(self):
+        """Open and done counts per track"""
+        with self.lock:
+            tracks = set(self.open_counts) | set(self.done_counts)
+            return {
+                'open': sum(self.open_counts.values()),
+                'done': sum(self.done_counts.values()),
+                'by_track': {
+                    track: {'open': self.open_counts[track], 'done': self.done_counts[track]}
+                    for track in sorted(tracks)
+                }
+            }
+
+    def save(self):
+        """Write the states atomically, like songs.json"""
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix='.followups-', suffix='.json', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.states, f, indent=2, sort_keys=True)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, self.path)
+            self.file_state = self.stat_file()
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def __len__(self):
+        return len(self.actions)
@@ -0,0 +1,223 @@
+"""
+Filesystem Watcher
+Reports the files created, changed or removed under a directory tree, from
+inotify on Linux or by polling elsewhere, so in-memory caches can follow
+hand edits and git pulls without rescanning everything
+"""
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import threading
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF)
+EVENT_HEADER = struct.Struct('iIII')
+
+# Changes to the same path within this window are reported once (a git pull touches many files)
+SETTLE_SECONDS = 0.2
+POLL_INTERVAL = 2.0
+
+
+def load_inotify():
+    """libc with the inotify calls, or None where they aren't available"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        try:
+            libc = ctypes.CDLL('libc.so.6', use_errno=True)
+        except OSError:
+            # Not glibc; find_library runs ldconfig, so it is only the fallback
+            from ctypes.util import find_library
+            libc = ctypes.CDLL(find_library('c'), use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+def walk_files(root):
+    """Every file below root"""
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            yield os.path.join(directory, filename)
+
+
+class InotifyWatcher:
+    """Watches every directory below root with inotify and reports settled batches of paths.
+
+    callback(paths) receives a set of file or directory paths that were
+    written, created, moved or deleted; the receiver stats them to see
+    what is there now. After the kernel dropped events it is called as
+    callback(paths, resync=True), since deletions can't be listed any more.
+    """
+
+    method = 'inotify'
+
+    def __init__(self, root, callback, libc):
+        self.root = root
+        self.callback = callback
+        self.libc = libc
+        self.fd = None
+        self.watches = {}   # watch descriptor -> directory
+        self.stopped = threading.Event()
+        self.thread = None
+        # Set when the event queue overflowed since the last batch
+        self.overflowed = False
+
+    def start(self):
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_init1 failed: {os.strerror(error)}")
+        self.watch_tree(self.root)
+        self.thread = threading.Thread(target=self.run, name=f'fs-watcher-{os.path.basename(self.root)}', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Ask the thread to stop; it closes the inotify descriptor on its way out"""
+        self.stopped.set()
+
+    def watch_tree(self, directory):
+        """Watch a directory and everything below it; returns the files already inside"""
+        found = []
+        for current, _, filenames in os.walk(directory):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(current), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    print(f"⚠️  Out of inotify watches at {current}; raise fs.inotify.max_user_watches")
+                continue
+            self.watches[wd] = current
+            found.extend(os.path.join(current, filename) for filename in filenames)
+        return found
+
+    def run(self):
+        pending = set()
+        settle_at = None
+        try:
+            while not self.stopped.is_set():
+                timeout = 0.5 if settle_at is None else max(settle_at - time.monotonic(), 0)
+                readable, _, _ = select.select([self.fd], [], [], timeout)
+                if readable:
+                    if self.read_events(pending) and settle_at is None:
+                        settle_at = time.monotonic() + SETTLE_SECONDS
+                elif settle_at is not None and time.monotonic() >= settle_at:
+                    batch, pending, settle_at = pending, set(), None
+                    resync, self.overflowed = self.overflowed, False
+                    try:
+                        if resync:
+                            self.callback(batch, resync=True)
+                        else:
+                            self.callback(batch)
+                    except Exception as e:
+                        print(f"❌ Error applying file changes under {self.root}: {e}")
+        finally:
+            os.close(self.fd)
+
+    def read_events(self, pending):
+        """Add the paths named by the queued events to pending; returns whether any were added"""
+        data = os.read(self.fd, 64 * 1024)
+        added = False
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped: report every file there is and ask for a full resync,
+                # which also finds the files removed in the meantime
+                print(f"⚠️  inotify queue overflowed for {self.root}, rechecking every file")
+                pending.update(walk_files(self.root))
+                self.overflowed = True
+                added = True
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None:
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                pending.add(directory)
+                added = True
+                continue
+
+            path = os.path.join(directory, name) if name else directory
+            pending.add(path)
+            added = True
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                # Files may have landed in the new directory before its watch existed
+                pending.update(self.watch_tree(path))
+        return added
+
+
+class PollingWatcher:
+    """Fallback that compares the mtime and size of every file below root every few seconds"""
+
+    method = 'polling'
+
+    def __init__(self, root, callback, interval=POLL_INTERVAL):
+        self.root = root
+        self.callback = callback
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.files = {}
+        self.thread = None
+
+    def start(self):
+        self.files = self.scan()
+        self.thread = threading.Thread(target=self.run, name=f'fs-poller-{os.path.basename(self.root)}', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def scan(self):
+        files = {}
+        for path in walk_files(self.root):
+            try:
+                stat_result = os.stat(path)
+            except OSError:
+                continue
+            files[path] = (stat_result.st_mtime_ns, stat_result.st_size)
+        return files
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            files = self.scan()
+            changed = {path for path, state in files.items() if self.files.get(path) != state}
+            changed.update(self.files.keys() - files.keys())
+            self.files = files
+            if changed:
+                try:
+                    self.callback(changed)
+                except Exception as e:
+                    print(f"❌ Error applying file changes under {self.root}: {e}")
+
+
+def create_watcher(root, callback, polling=False):
+    """inotify watcher for root where the platform has it, otherwise a polling one"""
+    libc = None if polling else load_inotify()
+    if libc is not None:
+        return InotifyWatcher(root, callback, libc)
+    return PollingWatcher(root, callback)
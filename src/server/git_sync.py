@@ -0,0 +1,346 @@
+"""
+Git Sync
+Runs commit-and-push in a background worker so HTTP requests only enqueue
+a job and poll its status. Optionally batches journal and song writes into
+debounced commits that stage only the changed paths.
+"""
+
+import time
+import uuid
+import threading
+from contextlib import ExitStack
+from datetime import datetime
+
+# Push can hang on an unreachable remote; give up after this long
+PUSH_TIMEOUT = 120
+GIT_TIMEOUT = 60
+MAX_FINISHED_JOBS = 50
+
+# Auto-commit defaults: commit after this much quiet, but never wait longer
+# than the max latency; push at most once per push interval
+QUIET_PERIOD = 30
+MAX_LATENCY = 300
+PUSH_INTERVAL = 600
+
+
+class GitSyncWorker:
+    """Single background thread that runs queued sync jobs one at a time.
+
+    Requests that arrive while a job is still queued join that job instead
+    of creating another one. With auto-commit enabled the same thread also
+    commits recorded writes once they settle and pushes on its own cadence,
+    so git never runs twice at once.
+    """
+
+    def __init__(self, repo_dir='.', write_locks=()):
+        self.repo_dir = repo_dir
+        # Held while staging so half-written journal/song files aren't committed
+        self.write_locks = write_locks
+        self.condition = threading.Condition()
+        self.jobs = {}
+        self.order = []
+        self.pending = None
+        self.current = None
+        self.thread = None
+        # Optional callback(command, seconds, returncode) after each git subprocess
+        self.on_command = None
+        # Optional replacement for subprocess.run(args, cwd, timeout), e.g. an asyncio runner
+        self.runner = None
+
+        self.auto_commit = False
+        self.quiet_period = QUIET_PERIOD
+        self.max_latency = MAX_LATENCY
+        self.push_interval = PUSH_INTERVAL
+        self.dirty = set()
+        self.first_write = None
+        self.last_write = None
+        self.unpushed = False
+        self.last_push = 0.0
+        self.auto_stats = {'commits': 0, 'pushes': 0, 'last_commit': None, 'last_push': None, 'last_error': None}
+
+    def enable_auto_commit(self, quiet_period=QUIET_PERIOD, max_latency=MAX_LATENCY, push_interval=PUSH_INTERVAL):
+        """Turn on batched commits of recorded writes"""
+        with self.condition:
+            self.auto_commit = True
+            self.quiet_period = quiet_period
+            self.max_latency = max_latency
+            self.push_interval = push_interval
+            self.last_push = time.monotonic()
+            self.condition.notify_all()
+
+    def record_write(self, *paths):
+        """Note files the server just wrote so the next batch commit includes them"""
+        if not self.auto_commit:
+            return
+        now = time.monotonic()
+        with self.condition:
+            self.dirty.update(paths)
+            if self.first_write is None:
+                self.first_write = now
+            self.last_write = now
+            self.condition.notify_all()
+
+    def commit_due_at(self):
+        """Monotonic time the pending batch should be committed, or None"""
+        if not self.dirty:
+            return None
+        return min(self.last_write + self.quiet_period, self.first_write + self.max_latency)
+
+    def push_due_at(self):
+        if not self.unpushed:
+            return None
+        return self.last_push + self.push_interval
+
+    def next_deadline(self):
+        deadlines = [d for d in (self.commit_due_at(), self.push_due_at()) if d is not None]
+        return min(deadlines) if deadlines else None
+
+    def auto_status(self):
+        """Snapshot of the auto-commit scheduler for status endpoints"""
+        with self.condition:
+            now = time.monotonic()
+            commit_due = self.commit_due_at()
+            push_due = self.push_due_at()
+            return dict(
+                self.auto_stats,
+                enabled=self.auto_commit,
+                dirty_paths=len(self.dirty),
+                commit_in=round(max(commit_due - now, 0), 1) if commit_due else None,
+                push_in=round(max(push_due - now, 0), 1) if push_due else None,
+                unpushed=self.unpushed
+            )
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='git-sync', daemon=True)
+            self.thread.start()
+
+    def enqueue(self):
+        """Queue a sync job, or return the one that is already waiting"""
+        with self.condition:
+            if self.pending is not None:
+                self.pending['requests'] += 1
+                return dict(self.pending)
+            job = {
+                'id': uuid.uuid4().hex[:12],
+                'status': 'queued',
+                'requests': 1,
+                'queued_at': datetime.now().isoformat(),
+                'started_at': None,
+                'finished_at': None,
+                'success': None,
+                'message': 'Waiting for git',
+                'output': ''
+            }
+            self.jobs[job['id']] = job
+            self.order.append(job['id'])
+            self.pending = job
+            self.prune()
+            self.condition.notify_all()
+            return dict(job)
+
+    def prune(self):
+        """Forget the oldest finished jobs"""
+        finished = [job_id for job_id in self.order if self.jobs[job_id]['status'] in ('done', 'failed')]
+        for job_id in finished[:-MAX_FINISHED_JOBS]:
+            self.order.remove(job_id)
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        with self.condition:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def latest(self):
+        with self.condition:
+            return dict(self.jobs[self.order[-1]]) if self.order else None
+
+    def wait(self, job_id, timeout):
+        """Block until a job finishes or the timeout passes (long-poll)"""
+        with self.condition:
+            self.condition.wait_for(
+                lambda: job_id not in self.jobs or self.jobs[job_id]['status'] in ('done', 'failed'),
+                timeout=timeout
+            )
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def next_work(self):
+        """Wait for a queued job or a due auto-commit/push; returns (job, batch)"""
+        with self.condition:
+            while True:
+                if self.pending is not None:
+                    job = self.pending
+                    self.pending = None
+                    self.current = job
+                    job['status'] = 'running'
+                    job['started_at'] = datetime.now().isoformat()
+                    job['message'] = 'Committing and pushing'
+                    # A full sync stages everything, including the pending batch
+                    self.dirty.clear()
+                    self.first_write = self.last_write = None
+                    self.condition.notify_all()
+                    return job, None
+
+                now = time.monotonic()
+                deadline = self.next_deadline()
+                if deadline is not None and deadline <= now:
+                    batch = None
+                    commit_due = self.commit_due_at()
+                    if commit_due is not None and commit_due <= now:
+                        batch = sorted(self.dirty)
+                        self.dirty.clear()
+                        self.first_write = self.last_write = None
+                    return None, batch
+                self.condition.wait(None if deadline is None else deadline - now)
+
+    def run(self):
+        """Worker loop: queued jobs first, then batch commits and pushes as they fall due"""
+        while True:
+            job, batch = self.next_work()
+            if job is None:
+                self.run_scheduled(batch)
+                continue
+
+            try:
+                result = self.commit_and_push()
+            except Exception as e:
+                result = {'success': False, 'message': f'Git operation failed: {str(e)}', 'output': ''}
+
+            with self.condition:
+                if result.get('pushed'):
+                    self.unpushed = False
+                    self.last_push = time.monotonic()
+                job.update(result)
+                job['status'] = 'done' if result['success'] else 'failed'
+                job['finished_at'] = datetime.now().isoformat()
+                self.current = None
+                self.condition.notify_all()
+            print(f"Git operation: {result['message']}")
+
+    def run_scheduled(self, batch):
+        """Commit a settled batch of writes and/or push if the push interval has passed"""
+        try:
+            if batch:
+                self.commit_paths(batch)
+            push_due = self.push_due_at()
+            if push_due is not None and push_due <= time.monotonic():
+                self.push_commits()
+        except Exception as e:
+            self.auto_stats['last_error'] = str(e)
+            print(f"Auto-commit error: {e}")
+
+    def commit_paths(self, paths):
+        """Stage and commit only the given paths"""
+        with ExitStack() as stack:
+            for lock in self.write_locks:
+                stack.enter_context(lock)
+            changed = self.git('status', '--porcelain', '--', *paths).stdout.strip()
+            if not changed:
+                return
+            self.git('add', '-A', '--', *paths)
+
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        count = len(changed.splitlines())
+        commit_message = f"Auto-commit: {count} production journal update{'s' if count != 1 else ''} - {timestamp}"
+        commit_result = self.git('commit', '-m', commit_message, '--', *paths)
+        if commit_result.returncode != 0:
+            self.auto_stats['last_error'] = commit_result.stderr.strip()
+            print(f"Auto-commit failed: {commit_result.stderr.strip()}")
+            return
+        with self.condition:
+            self.unpushed = True
+            self.auto_stats['commits'] += 1
+            self.auto_stats['last_commit'] = datetime.now().isoformat()
+        print(f"Git auto-commit: {commit_message}")
+
+    def push_commits(self):
+        """Push batched commits; on failure try again after another push interval"""
+        import subprocess
+        with self.condition:
+            self.last_push = time.monotonic()
+        try:
+            push_result = self.git('push', timeout=PUSH_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self.auto_stats['last_error'] = f'push timed out after {PUSH_TIMEOUT}s'
+            return
+        if push_result.returncode != 0:
+            self.auto_stats['last_error'] = push_result.stderr.strip()
+            print(f"Auto-push failed: {push_result.stderr.strip()}")
+            return
+        with self.condition:
+            self.unpushed = False
+            self.auto_stats['pushes'] += 1
+            self.auto_stats['last_push'] = datetime.now().isoformat()
+        print("Git auto-push: pushed batched commits")
+
+    def git(self, *args, timeout=GIT_TIMEOUT):
+        """Run a git command in the repository"""
+        # Imported on first use; the server starts without it
+        import subprocess
+        started = time.perf_counter()
+        returncode = None
+        try:
+            if self.runner is not None:
+                result = self.runner(['git', *args], self.repo_dir, timeout)
+            else:
+                result = subprocess.run(['git', *args], capture_output=True, text=True,
+                                        cwd=self.repo_dir, timeout=timeout)
+            returncode = result.returncode
+            return result
+        finally:
+            if self.on_command is not None:
+                self.on_command(args[0], time.perf_counter() - started, returncode)
+
+    def commit_and_push(self):
+        """Commit and push all changes, returning success/message/output"""
+        import subprocess
+        # Get current timestamp for commit message
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        # Check if there are changes to commit
+        result = self.git('status', '--porcelain')
+        if not result.stdout.strip():
+            return {
+                'success': True,
+                'message': 'No changes to commit',
+                'output': 'Working directory is clean'
+            }
+
+        # Add all changes, waiting for in-flight journal and song writes
+        with ExitStack() as stack:
+            for lock in self.write_locks:
+                stack.enter_context(lock)
+            self.git('add', '.')
+
+        # Commit with timestamp
+        commit_message = f"Auto-commit: Production journal updates - {timestamp}"
+        commit_result = self.git('commit', '-m', commit_message)
+        if commit_result.returncode != 0:
+            return {
+                'success': False,
+                'message': 'Failed to commit changes',
+                'output': commit_result.stderr
+            }
+
+        # Try to push to remote
+        try:
+            push_result = self.git('push', timeout=PUSH_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            return {
+                'success': True,
+                'message': 'Changes committed but push timed out',
+                'output': f'Commit: {commit_message}\nPush Error: no response from remote after {PUSH_TIMEOUT}s'
+            }
+        if push_result.returncode == 0:
+            return {
+                'success': True,
+                'pushed': True,
+                'message': 'Changes committed and pushed successfully',
+                'output': f'Commit: {commit_message}\nPush: {push_result.stdout}'
+            }
+        return {
+            'success': True,
+            'message': 'Changes committed but push failed',
+            'output': f'Commit: {commit_message}\nPush Error: {push_result.stderr}'
+        }
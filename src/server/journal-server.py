@@ -7,161 +7,284 @@ Handles saving journal entries directly to the docs folder
 import os
 import json
 import time
+import queue
+import argparse
 from datetime import datetime
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import HTTPServer, ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import threading
-import webbrowser
+
+from albums import Album, AlbumRegistry, MAX_LOADED_ALBUMS, IDLE_SECONDS
+from request_metrics import RequestMetrics, CountingWriter
+from git_sync import QUIET_PERIOD, MAX_LATENCY, PUSH_INTERVAL
+from static_assets import is_not_modified, choose_encoding, variant_etag
+from attachment_store import parse_range
+
+# UI pages served at friendly routes
+PAGES = {
+    '/': 'index.html',
+    '/add-entry': os.path.join('src', 'ui', 'add-entry.html'),
+    '/read-entries': os.path.join('src', 'ui', 'read-entries.html'),
+    '/album-overview': os.path.join('src', 'ui', 'album-overview.html'),
+    '/creative-tools': os.path.join('src', 'ui', 'creative-tools.html')
+}
+
+# The album in the server's working directory at /, plus any hosted under
+# /albums/<name>/; each has its own songs, journal index and git worker
+albums = AlbumRegistry()
+albums.add(Album(''))
+MAX_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 500
+MAX_JOB_WAIT = 30
+
+MAX_CHANGE_WAIT = 30
+# SSE streams and waiting long-polls hold a worker thread each, so only some workers may do so at once
+STREAM_SECONDS = 300
+# Seconds a long-poll client is asked to wait before polling again when no slot was free
+LONG_POLL_RETRY = 5
+stream_slots = threading.BoundedSemaphore(4)
+# Routes answered from the change feed alone, without loading the album
+FEED_ROUTES = ('/api/changes', '/api/changes/stream')
+# Routes that never wait for an album to load; the album list and metrics read only server-wide state
+UNLOADED_ROUTES = FEED_ROUTES + ('/healthz', '/metrics', '/api/albums')
+
+# Set once startup warm-up is over; /healthz answers 503 until then
+ready = threading.Event()
+startup = {'started': time.time(), 'warmup_seconds': None, 'error': None}
+
+# Latency, bytes, errors, filesystem and git timings behind /metrics
+metrics = RequestMetrics()
+# Waveform sidecars for WAV attachments, shared by all albums; made by get_peak_worker()
+peak_worker = None
+peak_worker_lock = threading.Lock()
+# Peaks sent per song when ?width= isn't given
+DEFAULT_PEAK_WIDTH = 512
+MAX_PEAK_WIDTH = 20000
+
 
 class JournalHandler(BaseHTTPRequestHandler):
+    # Seconds a socket read or write may stall before the worker gives up on the client
+    timeout = 120
+
+    def setup(self):
+        super().setup()
+        self.wfile = CountingWriter(self.wfile)
+
+    def handle_one_request(self):
+        """Time and count every request around the normal dispatch"""
+        started = time.perf_counter()
+        self.status_code = None
+        profiler = metrics.start_request()
+        try:
+            super().handle_one_request()
+        finally:
+            self.close_album()
+            metrics.finish_request(getattr(self, 'command', None), getattr(self, 'path', ''),
+                                   self.status_code, self.wfile.sent, started, profiler)
+            self.wfile.sent = 0
+
+    def parse_request(self):
+        parsed = super().parse_request()
+        if parsed:
+            parsed = self.open_album()
+            metrics.set_route(self.path)
+        return parsed
+
+    def open_album(self):
+        """Pick the album from the /albums/<name>/ prefix, strip the prefix and load the album if it isn't
+        
+        Sends an error and returns False when the album can't be served.
+        """
+        self.album_in_use = False
+        self.album, self.path = albums.resolve(self.path)
+        if self.album is None:
+            self.send_error(404, "Album not found")
+            return False
+        if urlparse(self.path).path in UNLOADED_ROUTES:
+            # The change feed outlives evictions, so following it (or listing albums) doesn't load the album
+            return True
+        try:
+            albums.acquire(self.album)
+        except Exception as e:
+            self.send_error(500, f"Could not load album: {e}")
+            print(f"❌ Error loading {self.album.label()}: {e}")
+            return False
+        self.album_in_use = True
+        return True
+
+    def close_album(self):
+        if getattr(self, 'album_in_use', False):
+            albums.release(self.album)
+            self.album_in_use = False
+
+    def send_response(self, code, message=None):
+        self.status_code = code
+        super().send_response(code, message)
+
     def do_OPTIONS(self):
         """Handle CORS preflight requests"""
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, If-None-Match, Range, If-Range, Upload-Offset')
         self.end_headers()
 
     def do_POST(self):
         """Handle POST requests for saving journal entries and Git operations"""
         if self.path == '/save-entry':
             self.save_journal_entry()
+        elif self.path == '/api/entries/batch':
+            self.save_journal_entries_batch()
         elif self.path == '/api/songs':
             self.save_song()
         elif self.path == '/api/git-commit':
             self.git_commit_and_push()
+        elif self.path == '/api/attachments/uploads':
+            self.start_attachment_upload()
         else:
             self.send_error(404, "Not Found")
 
     def do_PUT(self):
-        """Handle PUT requests for updating songs"""
+        """Handle PUT requests for updating songs and follow-up actions"""
         if self.path.startswith('/api/songs/'):
             song_id = self.path.split('/')[-1]
             self.update_song(song_id)
+        elif self.path.startswith('/api/followups/'):
+            self.update_followup(self.path[len('/api/followups/'):])
+        elif self.path.startswith('/api/attachments/uploads/'):
+            self.upload_attachment_chunk(self.path[len('/api/attachments/uploads/'):])
         else:
             self.send_error(404, "Not Found")
 
     def do_DELETE(self):
-        """Handle DELETE requests for deleting songs"""
+        """Handle DELETE requests for deleting songs, attachments and unfinished uploads"""
         if self.path.startswith('/api/songs/'):
             song_id = self.path.split('/')[-1]
             self.delete_song(song_id)
+        elif self.path.startswith('/api/attachments/uploads/'):
+            self.cancel_attachment_upload(self.path[len('/api/attachments/uploads/'):])
+        elif self.path.startswith('/api/attachments/'):
+            self.delete_attachment(self.path[len('/api/attachments/'):])
+        else:
+            self.send_error(404, "Not Found")
+
+    def do_HEAD(self):
+        """Handle HEAD requests for pages, UI files, attachments and upload offsets"""
+        route = urlparse(self.path).path
+        if route in PAGES:
+            self.serve_page(route)
+        elif route.startswith('/src/ui/'):
+            self.serve_ui_file(route)
+        elif route.startswith('/api/attachments/uploads/'):
+            self.get_attachment_upload(route[len('/api/attachments/uploads/'):])
+        elif route.startswith('/api/attachments/'):
+            self.serve_attachment(route[len('/api/attachments/'):])
         else:
             self.send_error(404, "Not Found")
 
     def do_GET(self):
         """Handle GET requests"""
-        if self.path == '/':
-            self.serve_ui()
-        elif self.path.startswith('/src/ui/'):
-            self.serve_ui_file()
-        elif self.path == '/add-entry':
-            self.serve_add_entry_page()
-        elif self.path == '/read-entries':
-            self.serve_read_entries_page()
-        elif self.path == '/album-overview':
-            self.serve_album_overview_page()
-        elif self.path == '/creative-tools':
-            self.serve_creative_tools_page()
-        elif self.path == '/api/journal-files':
+        route = urlparse(self.path).path
+        if route in PAGES:
+            self.serve_page(route)
+        elif route.startswith('/src/ui/'):
+            self.serve_ui_file(route)
+        elif route == '/api/journal-files':
             self.list_journal_files()
-        elif self.path.startswith('/api/journal-file/'):
+        elif route.startswith('/api/journal-file/'):
             self.get_journal_file()
-        elif self.path == '/api/songs':
+        elif route == '/api/entries':
+            self.list_entry_data()
+        elif route.startswith('/api/entries/'):
+            self.get_entry_data(route[len('/api/entries/'):])
+        elif route == '/api/changes':
+            self.get_changes()
+        elif route == '/api/changes/stream':
+            self.stream_changes()
+        elif route == '/api/search':
+            self.search_journal()
+        elif route == '/api/export':
+            self.export_journal()
+        elif route == '/metrics':
+            self.send_metrics()
+        elif route == '/healthz':
+            self.send_health()
+        elif route == '/api/albums':
+            self.send_json({'success': True, 'albums': albums.describe()})
+        elif route == '/api/songs':
             self.get_songs()
-        elif self.path == '/api/git-commit':
-            self.git_commit_and_push()
+        elif route.startswith('/api/songs/') and route.endswith('/peaks'):
+            self.get_song_peaks(route[len('/api/songs/'):-len('/peaks')])
+        elif route == '/api/stats':
+            self.get_stats()
+        elif route == '/api/followups':
+            self.list_followups()
+        elif route == '/api/attachments':
+            self.list_attachments()
+        elif route.startswith('/api/attachments/uploads/'):
+            self.get_attachment_upload(route[len('/api/attachments/uploads/'):])
+        elif route.startswith('/api/attachments/'):
+            self.serve_attachment(route[len('/api/attachments/'):])
+        elif route == '/api/git-commit':
+            self.get_git_job()
+        elif route.startswith('/api/git-commit/'):
+            self.get_git_job(route[len('/api/git-commit/'):])
         else:
             self.send_error(404, "Not Found")
 
-    def serve_ui(self):
-        """Serve the main UI page"""
-        try:
-            with open('index.html', 'r') as f:
-                content = f.read()
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(content.encode())
-        except FileNotFoundError:
-            self.send_error(404, "index.html not found")
+    def serve_page(self, route):
+        """Serve one of the named UI pages"""
+        self.serve_static(PAGES[route])
 
-    def serve_ui_file(self):
-        """Serve UI files"""
-        try:
-            file_path = self.path[1:]  # Remove leading slash
-            if file_path.endswith('.html'):
-                content_type = 'text/html'
-            elif file_path.endswith('.css'):
-                content_type = 'text/css'
-            elif file_path.endswith('.js'):
-                content_type = 'application/javascript'
-            else:
-                content_type = 'text/plain'
-            
-            with open(file_path, 'r') as f:
-                content = f.read()
-            
-            self.send_response(200)
-            self.send_header('Content-type', content_type)
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(content.encode())
-        except FileNotFoundError:
+    def serve_ui_file(self, route):
+        """Serve UI files from src/ui"""
+        file_path = os.path.normpath(route.lstrip('/'))
+        if not file_path.startswith(os.path.join('src', 'ui') + os.sep):
             self.send_error(404, f"File {self.path} not found")
+            return
+        self.serve_static(file_path)
 
-    def serve_add_entry_page(self):
-        """Serve the add entry page"""
-        try:
-            with open('src/ui/add-entry.html', 'r') as f:
-                content = f.read()
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(content.encode())
-        except FileNotFoundError:
-            self.send_error(404, "add-entry.html not found")
+    def serve_static(self, file_path):
+        """Serve a file from the static asset cache with validators and compression"""
+        file_path = self.album.path(file_path)
+        asset = self.album.static_assets.lookup(file_path)
+        if asset is None:
+            self.send_error(404, f"{os.path.basename(file_path)} not found")
+            return
 
-    def serve_read_entries_page(self):
-        """Serve the read entries page"""
-        try:
-            with open('src/ui/read-entries.html', 'r') as f:
-                content = f.read()
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.send_header('Access-Control-Allow-Origin', '*')
+        encoding = choose_encoding(asset, self.headers)
+        if is_not_modified(asset, self.headers):
+            self.send_response(304)
+            self.send_static_headers(asset, encoding)
             self.end_headers()
-            self.wfile.write(content.encode())
-        except FileNotFoundError:
-            self.send_error(404, "read-entries.html not found")
+            return
 
-    def serve_album_overview_page(self):
-        """Serve the album overview page"""
-        try:
-            with open('src/ui/album-overview.html', 'r') as f:
-                content = f.read()
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(content.encode())
-        except FileNotFoundError:
-            self.send_error(404, "Album overview page not found")
+        body = asset['variants'][encoding] if encoding else asset['body']
+        self.send_response(200)
+        self.send_header('Content-type', asset['content_type'])
+        self.send_header('Content-Length', str(len(body) if body is not None else asset['size']))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_static_headers(asset, encoding)
+        self.end_headers()
+        if self.command == 'HEAD':
+            return
 
-    def serve_creative_tools_page(self):
-        """Serve the creative tools page"""
-        try:
-            with open('src/ui/creative-tools.html', 'r') as f:
-                content = f.read()
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(content.encode())
-        except FileNotFoundError:
-            self.send_error(404, "Creative tools page not found")
+        if body is not None:
+            self.wfile.write(body)
+        else:
+            # Large file: let the kernel copy it straight to the socket
+            with open(file_path, 'rb') as f:
+                self.wfile.flush()
+                self.wfile.sent += self.connection.sendfile(f, 0, asset['size'])
+
+    def send_static_headers(self, asset, encoding=None):
+        """Validators and caching headers shared by 200 and 304 responses"""
+        self.send_header('ETag', variant_etag(asset, encoding))
+        self.send_header('Last-Modified', asset['last_modified'])
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Access-Control-Allow-Origin', '*')
 
     def save_journal_entry(self):
         """Save a journal entry to the docs folder"""
@@ -170,77 +293,9 @@ class JournalHandler(BaseHTTPRequestHandler):
             post_data = self.rfile.read(content_length)
             data = json.loads(post_data.decode('utf-8'))
             
-            # Create organized folder structure
-            now = datetime.now()
-            year = now.strftime('%Y')
-            month = now.strftime('%m')
-            day = now.strftime('%d')
-            time_str = now.strftime('%H%M')
-            
-            # Create filename
-            track_slug = data['track'].lower().replace(' ', '-').replace(':', '').replace('_', '-')
-            filename = f"{year}-{month}-{day}-{time_str}-{track_slug}.md"
-            
-            # Create folder structure
-            journal_dir = os.path.join('docs', 'journal', year, month)
-            os.makedirs(journal_dir, exist_ok=True)
-            
-            # Create markdown content with all the form fields
-            followup_section = ""
-            if data.get('followup'):
-                followup_section = f"## Follow-up Actions\n{data['followup']}\n\n"
-
-            technical_section = "## Technical Notes\n"
-            if data.get('bpm'):
-                technical_section += f"- **BPM:** {data['bpm']}\n"
-            if data.get('key'):
-                technical_section += f"- **Key:** {data['key']}\n"
-            if data.get('effects'):
-                technical_section += f"- **Effects Used:** {data['effects']}\n"
-            if data.get('issues'):
-                technical_section += f"- **Recording Issues:** {data['issues']}\n"
-            if not any([data.get('bpm'), data.get('key'), data.get('effects'), data.get('issues')]):
-                technical_section += "- **BPM:** [Add BPM if relevant]\n"
-                technical_section += "- **Key:** [Add key if relevant]\n"
-                technical_section += "- **Effects Used:** [List any new effects or plugins]\n"
-                technical_section += "- **Recording Issues:** [Note any technical problems]\n"
-
-            creative_section = "## Creative Notes\n"
-            if data.get('mood'):
-                creative_section += f"- **Mood/Feeling:** {data['mood']}\n"
-            if data.get('inspiration'):
-                creative_section += f"- **Inspiration:** {data['inspiration']}\n"
-            if data.get('challenges'):
-                creative_section += f"- **Challenges:** {data['challenges']}\n"
-            if data.get('breakthroughs'):
-                creative_section += f"- **Breakthroughs:** {data['breakthroughs']}\n"
-            if not any([data.get('mood'), data.get('inspiration'), data.get('challenges'), data.get('breakthroughs')]):
-                creative_section += "- **Mood/Feeling:** [Describe the creative mood]\n"
-                creative_section += "- **Inspiration:** [What inspired this session]\n"
-                creative_section += "- **Challenges:** [What was difficult]\n"
-                creative_section += "- **Breakthroughs:** [What worked well]\n"
-
-            markdown_content = f"""# Production Journal Entry
-
-**Date:** {data['date']}  
-**Track:** {data['track']}  
-**Session Time:** {now.strftime('%Y-%m-%d %H:%M:%S')}
-
-## Session Notes
-{data['notes']}
-
-{followup_section}{technical_section}
-
-{creative_section}
-
----
-*Auto-generated by Production Journal Server*
-"""
-
-            # Save the file
-            file_path = os.path.join(journal_dir, filename)
-            with open(file_path, 'w') as f:
-                f.write(markdown_content)
+            result = self.album.write_journal_entry(data, datetime.now())
+            filename = result['filename']
+            file_path = result['file_path']
             
             # Send success response
             response = {
@@ -272,32 +327,105 @@ class JournalHandler(BaseHTTPRequestHandler):
             
             print(f"❌ Error saving entry: {e}")
 
+    def save_journal_entries_batch(self):
+        """Save many entries (e.g. an offline session) in one request
+        
+        Body: {"entries": [...]} with the same fields as /save-entry plus a
+        clientId each. Entries whose clientId was already saved are reported as
+        duplicates, so the client can safely retry the whole batch.
+        """
+        try:
+            content_length = int(self.headers['Content-Length'])
+            payload = json.loads(self.rfile.read(content_length).decode('utf-8'))
+            entries = payload.get('entries') if isinstance(payload, dict) else payload
+            if not isinstance(entries, list):
+                self.send_json({'success': False, 'message': 'Expected a list of entries'}, 400)
+                return
+            if len(entries) > MAX_BATCH_SIZE:
+                self.send_json({'success': False, 'message': f'At most {MAX_BATCH_SIZE} entries per batch'}, 413)
+                return
+            
+            results = []
+            with self.album.journal_lock:
+                for data in entries:
+                    client_id = data.get('clientId') if isinstance(data, dict) else None
+                    try:
+                        if not isinstance(data, dict):
+                            raise ValueError("Entry must be an object")
+                        result = self.album.write_journal_entry(data, entry_time(data))
+                        results.append({
+                            'clientId': client_id,
+                            'status': 'duplicate' if result['duplicate'] else 'created',
+                            'filename': result['filename']
+                        })
+                    except (ValueError, OSError) as e:
+                        results.append({'clientId': client_id, 'status': 'error', 'message': str(e)})
+            
+            created = sum(1 for r in results if r['status'] == 'created')
+            failed = sum(1 for r in results if r['status'] == 'error')
+            self.send_json({
+                'success': failed == 0,
+                'message': f'Saved {created} of {len(results)} entries',
+                'created': created,
+                'results': results
+            })
+            print(f"✅ Batch sync: {created} saved, {len(results) - created - failed} duplicates, {failed} failed")
+            
+        except Exception as e:
+            self.send_json({'success': False, 'message': f'Error saving entries: {str(e)}'}, 500)
+            print(f"❌ Error saving entry batch: {e}")
+
+    def send_json(self, data, status=200):
+        """Send a JSON response with the usual CORS header"""
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(json.dumps(data).encode())
+
+    def query_params(self):
+        """First value of each query string parameter"""
+        return {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+
+    def query_journal_index(self):
+        """Page through the journal index using the request's limit/cursor/filter parameters
+        
+        Raises ValueError for bad parameters.
+        """
+        params = self.query_params()
+        limit = int(params['limit']) if 'limit' in params else None
+        if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+        # Answered from the in-memory index (newest first)
+        return self.album.journal_index.query(
+            track=params.get('track'),
+            year=params.get('year'),
+            month=params.get('month'),
+            date_from=params.get('from'),
+            date_to=params.get('to'),
+            limit=limit,
+            cursor=params.get('cursor')
+        )
+
     def list_journal_files(self):
-        """List all journal files in the docs/journal directory"""
+        """List journal files in the docs/journal directory, optionally paged and filtered
+        
+        Query parameters: limit, cursor, track, year, month, from, to (YYYY-MM-DD)
+        """
         try:
-            import glob
-            
-            # Find all markdown files in docs/journal
-            journal_pattern = os.path.join('docs', 'journal', '**', '*.md')
-            files = glob.glob(journal_pattern, recursive=True)
-            
-            # Sort by modification time (newest first)
-            files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-            
-            file_list = []
-            for file_path in files:
-                relative_path = os.path.relpath(file_path, 'docs/journal')
-                file_info = {
-                    'filename': os.path.basename(file_path),
-                    'path': relative_path,
-                    'full_path': file_path,
-                    'modified': datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat()
-                }
-                file_list.append(file_info)
+            version = self.album.change_feed.current_version()
+            try:
+                file_list, next_cursor, total = self.query_journal_index()
+            except ValueError as e:
+                self.send_json({'success': False, 'message': str(e)}, 400)
+                return
             
             response = {
                 'success': True,
-                'files': file_list
+                'files': file_list,
+                'total': total,
+                'next_cursor': next_cursor,
+                'version': version
             }
             
             self.send_response(200)
@@ -319,31 +447,30 @@ class JournalHandler(BaseHTTPRequestHandler):
             self.wfile.write(json.dumps(error_response).encode())
 
     def get_journal_file(self):
-        """Get the content of a specific journal file"""
+        """Get the content of a specific journal file (?format=html for sanitized HTML instead)"""
         try:
             # Extract filename from path
-            filename = self.path.replace('/api/journal-file/', '')
+            filename = urlparse(self.path).path.replace('/api/journal-file/', '')
             
-            # Find the file in docs/journal
-            journal_pattern = os.path.join('docs', 'journal', '**', filename)
-            import glob
-            files = glob.glob(journal_pattern, recursive=True)
+            # Resolve the file through the journal index
+            entry = self.album.journal_index.get(filename)
             
-            if not files:
+            if entry is None:
                 self.send_error(404, "File not found")
                 return
             
-            file_path = files[0]
-            
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            file_path = entry['full_path']
+            rendered = self.album.render_cache.get(file_path)
             
             response = {
                 'success': True,
-                'content': content,
                 'filename': filename,
                 'path': file_path
             }
+            if self.query_params().get('format') == 'html':
+                response['html'] = rendered['html']
+            else:
+                response['content'] = rendered['content']
             
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
@@ -363,56 +490,160 @@ class JournalHandler(BaseHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(json.dumps(error_response).encode())
 
-    def git_commit_and_push(self):
-        """Commit and push changes to Git repository"""
+    def list_entry_data(self):
+        """Structured fields of journal entries, without parsing any markdown
+        
+        Takes the same paging and filter parameters as /api/journal-files, plus
+        fields=bpm,key,... to return only some columns.
+        """
         try:
-            import subprocess
-            
-            # Get current timestamp for commit message
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            try:
+                file_list, next_cursor, total = self.query_journal_index()
+            except ValueError as e:
+                self.send_json({'success': False, 'message': str(e)}, 400)
+                return
             
-            # Check if there are changes to commit
-            result = subprocess.run(['git', 'status', '--porcelain'], 
-                                  capture_output=True, text=True, cwd='.')
+            wanted = [f for f in self.query_params().get('fields', '').split(',') if f]
+            entries = []
+            for file_info in file_list:
+                record = self.album.entry_store.get(file_info['filename'])
+                if record is None:
+                    continue
+                if wanted:
+                    record = {key: record.get(key) for key in ['filename', *wanted]}
+                entries.append(record)
+            
+            self.send_json({
+                'success': True,
+                'entries': entries,
+                'total': total,
+                'next_cursor': next_cursor
+            })
             
-            if not result.stdout.strip():
-                response = {
-                    'success': True,
-                    'message': 'No changes to commit',
-                    'output': 'Working directory is clean'
-                }
+        except Exception as e:
+            self.send_json({'success': False, 'message': f'Error reading entries: {str(e)}'}, 500)
+
+    def get_entry_data(self, filename):
+        """Structured fields of a single journal entry"""
+        record = self.album.entry_store.get(filename)
+        if record is None:
+            self.send_error(404, "Entry not found")
+            return
+        self.send_json({'success': True, 'entry': record})
+
+    def change_version_param(self):
+        """Version the client already has, from ?since= or an SSE Last-Event-ID"""
+        value = self.headers.get('Last-Event-ID') or self.query_params().get('since', '0')
+        return int(value)
+
+    def get_changes(self):
+        """Changes after ?since=N; with ?wait=S long-polls up to S seconds for the next one"""
+        try:
+            since = self.change_version_param()
+            wait = min(max(float(self.query_params().get('wait', 0)), 0), MAX_CHANGE_WAIT)
+        except ValueError:
+            self.send_error(400, "since and wait must be numbers")
+            return
+        
+        # A waiting long-poll holds a worker like a stream does, so it needs a stream slot;
+        # without one it answers straight away and tells the client when to ask again
+        waiting = wait > 0 and stream_slots.acquire(blocking=False)
+        try:
+            if waiting:
+                events, reset = self.album.change_feed.wait(since, wait)
             else:
-                # Add all changes
-                subprocess.run(['git', 'add', '.'], cwd='.')
-                
-                # Commit with timestamp
-                commit_message = f"Auto-commit: Production journal updates - {timestamp}"
-                commit_result = subprocess.run(['git', 'commit', '-m', commit_message], 
-                                             capture_output=True, text=True, cwd='.')
-                
-                if commit_result.returncode == 0:
-                    # Try to push to remote
-                    push_result = subprocess.run(['git', 'push'], 
-                                               capture_output=True, text=True, cwd='.')
-                    
-                    if push_result.returncode == 0:
-                        response = {
-                            'success': True,
-                            'message': 'Changes committed and pushed successfully',
-                            'output': f'Commit: {commit_message}\nPush: {push_result.stdout}'
-                        }
-                    else:
-                        response = {
-                            'success': True,
-                            'message': 'Changes committed but push failed',
-                            'output': f'Commit: {commit_message}\nPush Error: {push_result.stderr}'
-                        }
+                events, reset = self.album.change_feed.since(since)
+        finally:
+            if waiting:
+                stream_slots.release()
+        if reset:
+            version = self.album.change_feed.current_version()
+        else:
+            # Never skip past events that arrived after this response was built
+            version = events[-1]['version'] if events else since
+        self.send_json({
+            'success': True,
+            'version': version,
+            'reset': reset,
+            'events': events,
+            'retryAfter': LONG_POLL_RETRY if wait and not waiting else 0
+        })
+
+    def stream_changes(self):
+        """Server-Sent Events stream of changes after ?since=N (or Last-Event-ID)
+        
+        The stream ends after a few minutes; EventSource reconnects on its own
+        and resumes from the last event id.
+        """
+        try:
+            version = self.change_version_param()
+        except ValueError:
+            self.send_error(400, "since must be a number")
+            return
+        if not stream_slots.acquire(blocking=False):
+            self.send_json({'success': False, 'message': 'Too many open streams, use /api/changes?wait='}, 503)
+            return
+        
+        try:
+            self.send_response(200)
+            self.send_header('Content-type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            self.wfile.write(b'retry: 2000\n\n')
+            
+            deadline = time.monotonic() + STREAM_SECONDS
+            while time.monotonic() < deadline:
+                events, reset = self.album.change_feed.wait(version, 15)
+                if reset:
+                    version = self.album.change_feed.current_version()
+                    message = f"id: {version}\nevent: reset\ndata: {json.dumps({'version': version})}\n\n"
+                elif events:
+                    version = events[-1]['version']
+                    message = ''.join(f"id: {e['version']}\nevent: change\ndata: {json.dumps(e)}\n\n" for e in events)
                 else:
-                    response = {
-                        'success': False,
-                        'message': 'Failed to commit changes',
-                        'output': commit_result.stderr
-                    }
+                    message = ': keep-alive\n\n'
+                self.wfile.write(message.encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            stream_slots.release()
+
+    def search_journal(self):
+        """Full-text search over journal entries
+        
+        Query parameters: q, field (notes, followup, technical, creative, track;
+        repeat or comma-separate), track, limit
+        """
+        try:
+            params = parse_qs(urlparse(self.path).query)
+            query = params.get('q', [''])[0]
+            fields = [f for value in params.get('field', []) for f in value.split(',') if f]
+            track = params.get('track', [None])[0]
+            try:
+                limit = int(params.get('limit', ['20'])[0])
+                if not 1 <= limit <= MAX_PAGE_SIZE:
+                    raise ValueError
+            except ValueError:
+                self.send_error(400, f"limit must be between 1 and {MAX_PAGE_SIZE}")
+                return
+            
+            results, total = self.album.search_index.search(query, fields=fields or None, track=track, limit=limit)
+            for result in results:
+                entry = self.album.journal_index.get(result['filename']) or {}
+                result.update({
+                    'path': entry.get('path'),
+                    'date': entry.get('date'),
+                    'track': entry.get('track')
+                })
+            
+            response = {
+                'success': True,
+                'query': query,
+                'total': total,
+                'results': results
+            }
             
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
@@ -420,12 +651,10 @@ class JournalHandler(BaseHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(json.dumps(response).encode())
             
-            print(f"Git operation: {response['message']}")
-            
         except Exception as e:
             error_response = {
                 'success': False,
-                'message': f'Git operation failed: {str(e)}'
+                'message': f'Error searching journal: {str(e)}'
             }
             
             self.send_response(500)
@@ -433,24 +662,133 @@ class JournalHandler(BaseHTTPRequestHandler):
             self.send_header('Access-Control-Allow-Origin', '*')
             self.end_headers()
             self.wfile.write(json.dumps(error_response).encode())
+
+    def send_metrics(self):
+        """Prometheus text format scrape endpoint"""
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header('Content-type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_health(self):
+        """Readiness probe: 200 once startup warm-up is over, 503 while it runs or after it failed"""
+        if not ready.is_set():
+            status = 'warming'
+        else:
+            status = 'error' if startup['error'] else 'ok'
+        self.send_json({
+            'status': status,
+            'ready': status == 'ok',
+            'uptime': round(time.time() - startup['started'], 3),
+            'warmup_seconds': startup['warmup_seconds'],
+            'error': startup['error'],
+            'albums_loaded': len(albums.loaded())
+        }, 200 if status == 'ok' else 503)
+
+    def export_journal(self):
+        """Stream the journal (or a filtered part of it) as html, jsonl, csv or zip"""
+        # Pulls in multiprocessing and zipfile, so it is imported on the first export
+        from journal_export import FORMATS, export_chunks
+        format_name = self.query_params().get('format', 'html')
+        if format_name not in FORMATS:
+            self.send_json({'success': False, 'message': f"format must be one of {', '.join(FORMATS)}"}, 400)
+            return
+        try:
+            entries, _, _ = self.query_journal_index()
+        except ValueError as e:
+            self.send_json({'success': False, 'message': str(e)}, 400)
+            return
+
+        # Filenames start with the date and time, so this is session order; files without a
+        # date in their name (docs/journal/README.md) aren't entries
+        items = [(entry['path'], entry['full_path'])
+                 for entry in sorted(entries, key=lambda e: e['filename']) if entry['date']]
+        content_type, extension = FORMATS[format_name]
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Disposition', f'attachment; filename="production-journal.{extension}"')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        # No Content-Length: the body is streamed and ends when the connection closes
+        try:
+            for chunk in export_chunks(format_name, items):
+                self.wfile.write(chunk)
+            print(f"📦 Exported {len(items)} entries as {format_name}")
+        except (BrokenPipeError, ConnectionResetError):
+            print("⚠️  Export cancelled by client")
+        except Exception as e:
+            print(f"❌ Error exporting journal: {e}")
+
+    def git_commit_and_push(self):
+        """Queue a commit-and-push job; the work happens on the git sync worker"""
+        try:
+            job = self.album.git_worker.enqueue()
+            joined = job['requests'] > 1
+            response = {
+                'success': True,
+                'message': 'Joined the pending backup' if joined else 'Backup queued',
+                'job': job
+            }
+            self.send_json(response, 202)
             
+        except Exception as e:
+            self.send_json({'success': False, 'message': f'Git operation failed: {str(e)}'}, 500)
             print(f"Git operation error: {e}")
 
+    def get_git_job(self, job_id=None):
+        """Status of a sync job (the latest one if no id); ?wait=N long-polls up to N seconds"""
+        params = self.query_params()
+        if job_id is None:
+            job = self.album.git_worker.latest()
+        elif 'wait' in params:
+            try:
+                wait = min(max(float(params['wait']), 0), MAX_JOB_WAIT)
+            except ValueError:
+                self.send_error(400, "wait must be a number of seconds")
+                return
+            job = self.album.git_worker.wait(job_id, wait)
+        else:
+            job = self.album.git_worker.get(job_id)
+        
+        if job is None and job_id is not None:
+            self.send_error(404, "Job not found")
+            return
+        self.send_json({'success': True, 'job': job, 'auto_commit': self.album.git_worker.auto_status()})
+
     def get_songs(self):
-        """Get all songs from the songs.json file"""
+        """Get all songs, or with ?since=<revision> only the ones changed or deleted after it"""
         try:
-            songs_file = 'docs/songs.json'
-            if os.path.exists(songs_file):
-                with open(songs_file, 'r') as f:
-                    songs = json.load(f)
+            self.album.song_store.check()
+            version = self.album.change_feed.current_version()
+            since = self.query_params().get('since')
+            if since is not None:
+                try:
+                    since = int(since)
+                except ValueError:
+                    self.send_json({'error': 'since must be a song revision number'}, 400)
+                    return
+                changed, deleted, revision, full = self.album.song_store.changes_since(since)
+                body = {'revision': revision, 'full': full, 'songs': changed, 'deleted': deleted}
             else:
-                songs = []
-            
-            self.send_response(200)
+                body, revision = self.album.song_store.snapshot()
+
+            etag = f'"songs-{revision}"'
+            if_none_match = self.headers.get('If-None-Match', '')
+            status = 304 if etag in [tag.strip() for tag in if_none_match.split(',')] else 200
+
+            self.send_response(status)
             self.send_header('Content-type', 'application/json')
             self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Access-Control-Expose-Headers', 'X-Change-Version, X-Song-Revision, ETag')
+            self.send_header('X-Change-Version', str(version))
+            self.send_header('X-Song-Revision', str(revision))
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
             self.end_headers()
-            self.wfile.write(json.dumps(songs).encode())
+            if status == 200:
+                self.wfile.write(json.dumps(body).encode())
             
         except Exception as e:
             error_response = {'error': f'Failed to load songs: {str(e)}'}
@@ -460,6 +798,50 @@ class JournalHandler(BaseHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(json.dumps(error_response).encode())
 
+    def get_stats(self):
+        """Album and production totals, kept up to date as entries and songs change"""
+        try:
+            # Pick up hand edits to songs.json; a no-op when nothing changed
+            self.album.sync_song_stats()
+            stats = dict(self.album.album_stats.summary(), followups=self.album.followup_tracker.summary())
+            self.send_json({'success': True, 'stats': stats})
+        except Exception as e:
+            self.send_json({'success': False, 'message': f'Error loading stats: {str(e)}'}, 500)
+
+    def list_followups(self):
+        """Follow-up actions, optionally for one track, with open/done counts per track"""
+        try:
+            params = self.query_params()
+            status = params.get('status', 'open')
+            if status not in ('open', 'done', 'all'):
+                self.send_json({'success': False, 'message': 'status must be open, done or all'}, 400)
+                return
+            self.send_json({
+                'success': True,
+                'actions': self.album.followup_tracker.query(params.get('track'), status),
+                'summary': self.album.followup_tracker.summary()
+            })
+        except Exception as e:
+            self.send_json({'success': False, 'message': f'Error loading follow-ups: {str(e)}'}, 500)
+
+    def update_followup(self, action_id):
+        """Mark a follow-up action done ({"done": true}) or open again"""
+        try:
+            content_length = int(self.headers['Content-Length'])
+            data = json.loads(self.rfile.read(content_length).decode('utf-8'))
+            if not isinstance(data.get('done'), bool):
+                self.send_json({'success': False, 'message': 'done must be true or false'}, 400)
+                return
+            action = self.album.followup_tracker.set_done(action_id, data['done'])
+            if action is None:
+                self.send_json({'success': False, 'message': 'Follow-up action not found'}, 404)
+                return
+            self.album.git_worker.record_write(self.album.followup_tracker.path)
+            self.album.change_feed.publish('followup', 'updated', action)
+            self.send_json({'success': True, 'action': action})
+        except Exception as e:
+            self.send_json({'success': False, 'message': f'Error updating follow-up: {str(e)}'}, 500)
+
     def save_song(self):
         """Save a new song to the songs.json file"""
         try:
@@ -467,34 +849,23 @@ class JournalHandler(BaseHTTPRequestHandler):
             post_data = self.rfile.read(content_length)
             song_data = json.loads(post_data.decode('utf-8'))
             
-            # Create songs directory if it doesn't exist
-            os.makedirs('docs', exist_ok=True)
-            
-            songs_file = 'docs/songs.json'
-            if os.path.exists(songs_file):
-                with open(songs_file, 'r') as f:
-                    songs = json.load(f)
-            else:
-                songs = []
-            
-            # Add new song with ID and timestamps
-            new_song = {
-                'id': str(int(time.time() * 1000)),
-                'title': song_data.get('songTitle', ''),
-                'key': song_data.get('songKey', ''),
-                'bpm': int(song_data.get('songBpm', 0)) if song_data.get('songBpm') else None,
-                'status': song_data.get('songStatus', 'draft'),
-                'notes': song_data.get('songNotes', ''),
-                'progress': self.get_default_progress(song_data.get('songStatus', 'draft')),
-                'createdAt': datetime.now().isoformat(),
-                'updatedAt': datetime.now().isoformat()
-            }
-            
-            songs.append(new_song)
-            
-            # Save updated songs list
-            with open(songs_file, 'w') as f:
-                json.dump(songs, f, indent=2)
+            # Add new song with ID and timestamps; publishing under the store lock keeps
+            # the feed in the same order as the writes
+            with self.album.song_store.lock:
+                new_song = self.album.song_store.create(lambda song_id: {
+                    'id': song_id,
+                    'title': song_data.get('songTitle', ''),
+                    'key': song_data.get('songKey', ''),
+                    'bpm': int(song_data.get('songBpm', 0)) if song_data.get('songBpm') else None,
+                    'status': song_data.get('songStatus', 'draft'),
+                    'notes': song_data.get('songNotes', ''),
+                    'progress': self.get_default_progress(song_data.get('songStatus', 'draft')),
+                    'createdAt': datetime.now().isoformat(),
+                    'updatedAt': datetime.now().isoformat()
+                })
+                self.album.change_feed.publish('song', 'created', new_song)
+            self.album.git_worker.record_write(self.album.song_store.path)
+            self.album.sync_song_stats()
             
             response = {
                 'success': True,
@@ -541,44 +912,34 @@ class JournalHandler(BaseHTTPRequestHandler):
             post_data = self.rfile.read(content_length)
             song_data = json.loads(post_data.decode('utf-8'))
             
-            songs_file = 'docs/songs.json'
-            if not os.path.exists(songs_file):
+            if not self.album.song_store.exists():
                 self.send_error(404, "Songs file not found")
                 return
             
-            with open(songs_file, 'r') as f:
-                songs = json.load(f)
-            
-            # Find the song to update
-            song_index = None
-            for i, song in enumerate(songs):
-                if song['id'] == song_id:
-                    song_index = i
-                    break
-            
-            if song_index is None:
+            # Update the song, merging against the latest stored copy
+            with self.album.song_store.lock:
+                song = self.album.song_store.update(song_id, lambda current: {
+                    'title': song_data.get('songTitle', current['title']),
+                    'key': song_data.get('songKey', current['key']),
+                    'bpm': int(song_data.get('songBpm', 0)) if song_data.get('songBpm') else current['bpm'],
+                    'status': song_data.get('songStatus', current['status']),
+                    'notes': song_data.get('songNotes', current['notes']),
+                    'progress': self.get_default_progress(song_data.get('songStatus', current['status'])),
+                    'updatedAt': datetime.now().isoformat()
+                })
+                if song is not None:
+                    self.album.change_feed.publish('song', 'updated', song)
+            
+            if song is None:
                 self.send_error(404, "Song not found")
                 return
-            
-            # Update the song
-            songs[song_index].update({
-                'title': song_data.get('songTitle', songs[song_index]['title']),
-                'key': song_data.get('songKey', songs[song_index]['key']),
-                'bpm': int(song_data.get('songBpm', 0)) if song_data.get('songBpm') else songs[song_index]['bpm'],
-                'status': song_data.get('songStatus', songs[song_index]['status']),
-                'notes': song_data.get('songNotes', songs[song_index]['notes']),
-                'progress': self.get_default_progress(song_data.get('songStatus', songs[song_index]['status'])),
-                'updatedAt': datetime.now().isoformat()
-            })
-            
-            # Save updated songs list
-            with open(songs_file, 'w') as f:
-                json.dump(songs, f, indent=2)
+            self.album.git_worker.record_write(self.album.song_store.path)
+            self.album.sync_song_stats()
             
             response = {
                 'success': True,
-                'message': f'Song "{songs[song_index]["title"]}" updated successfully',
-                'song': songs[song_index]
+                'message': f'Song "{song["title"]}" updated successfully',
+                'song': song
             }
             
             self.send_response(200)
@@ -587,7 +948,7 @@ class JournalHandler(BaseHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(json.dumps(response).encode())
             
-            print(f"Song updated: {songs[song_index]['title']} ({songs[song_index]['status']})")
+            print(f"Song updated: {song['title']} ({song['status']})")
             
         except Exception as e:
             error_response = {
@@ -605,33 +966,22 @@ class JournalHandler(BaseHTTPRequestHandler):
     def delete_song(self, song_id):
         """Delete a song from the songs.json file"""
         try:
-            songs_file = 'docs/songs.json'
-            if not os.path.exists(songs_file):
+            if not self.album.song_store.exists():
                 self.send_error(404, "Songs file not found")
                 return
             
-            with open(songs_file, 'r') as f:
-                songs = json.load(f)
-            
-            # Find the song to delete
-            song_index = None
-            song_title = ""
-            for i, song in enumerate(songs):
-                if song['id'] == song_id:
-                    song_index = i
-                    song_title = song['title']
-                    break
-            
-            if song_index is None:
+            with self.album.song_store.lock:
+                song = self.album.song_store.delete(song_id)
+                if song is not None:
+                    self.album.change_feed.publish('song', 'deleted', {'id': song_id})
+            if song is None:
                 self.send_error(404, "Song not found")
                 return
-            
-            # Remove the song
-            songs.pop(song_index)
-            
-            # Save updated songs list
-            with open(songs_file, 'w') as f:
-                json.dump(songs, f, indent=2)
+            self.album.git_worker.record_write(self.album.song_store.path)
+            self.album.sync_song_stats()
+            for attachment in self.album.attachment_store.delete_for_song(song_id):
+                self.album.change_feed.publish('attachment', 'deleted', attachment)
+            song_title = song['title']
             
             response = {
                 'success': True,
@@ -659,21 +1009,540 @@ class JournalHandler(BaseHTTPRequestHandler):
             
             print(f"Error deleting song: {e}")
 
-def start_server(port=8082):
-    """Start the journal server"""
+    def start_attachment_upload(self):
+        """Announce an audio upload for a song or journal file
+        
+        Body: {"filename", "size", "songId" or "journalFile", optional "sha256"}.
+        Answers with the upload id to PUT chunks to, or straight away with the
+        attachment when sha256 names a file the server already has.
+        """
+        try:
+            content_length = int(self.headers['Content-Length'])
+            data = json.loads(self.rfile.read(content_length).decode('utf-8'))
+            song_id = data.get('songId')
+            journal_file = data.get('journalFile')
+            if bool(song_id) == bool(journal_file):
+                self.send_json({'success': False, 'message': 'Give either songId or journalFile'}, 400)
+                return
+            if song_id and self.album.song_store.get(song_id) is None:
+                self.send_json({'success': False, 'message': 'Song not found'}, 404)
+                return
+            if journal_file and self.album.journal_index.get(journal_file) is None:
+                self.send_json({'success': False, 'message': 'Journal file not found'}, 404)
+                return
+            
+            try:
+                upload, attachment = self.album.attachment_store.start_upload(
+                    data.get('filename', ''), data.get('size'), song_id, journal_file, data.get('sha256'))
+            except ValueError as e:
+                self.send_json({'success': False, 'message': str(e)}, 400)
+                return
+            if attachment is not None:
+                self.album.change_feed.publish('attachment', 'created', attachment)
+                self.queue_peaks(attachment)
+                self.send_json({'success': True, 'complete': True, 'attachment': attachment})
+                print(f"🎙️  Attached {attachment['filename']} (already stored)")
+                return
+            self.send_json({'success': True, 'complete': False, 'upload': upload}, 201)
+            
+        except Exception as e:
+            self.send_json({'success': False, 'message': f'Error starting upload: {str(e)}'}, 500)
+            print(f"❌ Error starting upload: {e}")
+
+    def get_attachment_upload(self, upload_id):
+        """Where an interrupted upload continues (also sent as Upload-Offset)"""
+        upload = self.album.attachment_store.get_upload(upload_id)
+        if upload is None:
+            self.send_json({'success': False, 'message': 'Upload not found'}, 404)
+            return
+        body = json.dumps({'success': True, 'upload': upload}).encode()
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Upload-Offset', str(upload['offset']))
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Expose-Headers', 'Upload-Offset')
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def upload_attachment_chunk(self, upload_id):
+        """Append the request body to an upload at the Upload-Offset header
+        
+        The body is streamed to disk, never held in memory whole. A chunk cut
+        short keeps the bytes that arrived; 409 answers carry the offset to
+        continue from.
+        """
+        try:
+            try:
+                offset = int(self.headers.get('Upload-Offset', ''))
+                content_length = int(self.headers['Content-Length'])
+            except (TypeError, ValueError):
+                self.send_json({'success': False, 'message': 'Send Upload-Offset and Content-Length headers'}, 400)
+                return
+            
+            store = self.album.attachment_store
+            try:
+                upload, attachment = store.append(upload_id, offset, self.rfile, content_length)
+            except ValueError as e:
+                self.close_connection = True
+                self.send_json({'success': False, 'message': str(e), 'upload': store.get_upload(upload_id)}, 409)
+                return
+            if upload is None:
+                self.close_connection = True
+                self.send_json({'success': False, 'message': 'Upload not found'}, 404)
+                return
+            if upload['offset'] < offset + content_length:
+                # The client went away mid-chunk; what arrived is kept for the retry
+                self.close_connection = True
+                print(f"⚠️  Upload {upload_id} interrupted at byte {upload['offset']} of {upload['size']}")
+                return
+            if attachment is None:
+                self.send_json({'success': True, 'complete': False, 'upload': upload})
+                return
+            self.album.change_feed.publish('attachment', 'created', attachment)
+            self.queue_peaks(attachment)
+            self.send_json({'success': True, 'complete': True, 'attachment': attachment})
+            print(f"🎙️  Attached {attachment['filename']} ({attachment['size'] / 1048576:.1f} MB)")
+            
+        except Exception as e:
+            self.send_json({'success': False, 'message': f'Error receiving upload: {str(e)}'}, 500)
+            print(f"❌ Error receiving upload {upload_id}: {e}")
+
+    def cancel_attachment_upload(self, upload_id):
+        """Throw away an upload that won't be finished"""
+        if not self.album.attachment_store.cancel_upload(upload_id):
+            self.send_json({'success': False, 'message': 'Upload not found'}, 404)
+            return
+        self.send_json({'success': True, 'message': 'Upload cancelled'})
+
+    def list_attachments(self):
+        """Attachments, optionally only those of ?songId= or ?journalFile="""
+        params = self.query_params()
+        attachments = self.album.attachment_store.list(params.get('songId'), params.get('journalFile'))
+        self.send_json({'success': True, 'attachments': attachments})
+
+    def serve_attachment(self, attachment_id):
+        """Send an attachment's audio, or the part named by a Range header"""
+        attachment = self.album.attachment_store.get(attachment_id)
+        if attachment is None:
+            self.send_error(404, "Attachment not found")
+            return
+        size = attachment['size']
+        etag = f'"{attachment["sha256"]}"'
+        if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        
+        byte_range = None
+        # If-Range: only send a part of the file the client already has the rest of
+        if self.headers.get('If-Range', etag) == etag:
+            try:
+                byte_range = parse_range(self.headers.get('Range'), size)
+            except ValueError:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                return
+        start, end = byte_range or (0, size - 1)
+        
+        self.send_response(206 if byte_range else 200)
+        self.send_header('Content-type', attachment['contentType'])
+        self.send_header('Content-Length', str(end - start + 1))
+        if byte_range:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        # Content-addressed, so an id always has the same bytes
+        self.send_header('Cache-Control', 'private, max-age=31536000, immutable')
+        self.send_header('Content-Disposition', f'inline; filename="{attachment["filename"]}"')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Expose-Headers', 'Content-Range, Accept-Ranges, Content-Length')
+        self.end_headers()
+        if self.command == 'HEAD':
+            return
+        with open(self.album.attachment_store.blob_path(attachment['sha256']), 'rb') as f:
+            self.wfile.flush()
+            self.wfile.sent += self.connection.sendfile(f, start, end - start + 1)
+
+    def queue_peaks(self, attachment):
+        """Start computing the waveform of a WAV attachment in the background"""
+        if attachment['contentType'] != 'audio/wav':
+            return
+        store = self.album.attachment_store
+        get_peak_worker().submit(store.blob_path(attachment['sha256']), store.peaks_path(attachment['sha256']),
+                                 attachment['filename'])
+
+    def get_song_peaks(self, song_id):
+        """Waveform peaks and audio metadata of a song's newest WAV (or ?attachment=<id>)
+        
+        ?width=N picks the coarsest precomputed level with at least N peaks;
+        ?format=binary sends the int8 min/max pairs as they are stored. 202
+        means the peaks are still being computed.
+        """
+        params = self.query_params()
+        try:
+            width = int(params.get('width', DEFAULT_PEAK_WIDTH))
+            if not 1 <= width <= MAX_PEAK_WIDTH:
+                raise ValueError
+        except ValueError:
+            self.send_json({'success': False, 'message': f'width must be between 1 and {MAX_PEAK_WIDTH}'}, 400)
+            return
+        if self.album.song_store.get(song_id) is None:
+            self.send_json({'success': False, 'message': 'Song not found'}, 404)
+            return
+        store = self.album.attachment_store
+        candidates = [attachment for attachment in store.list(song_id=song_id)
+                      if attachment['contentType'] == 'audio/wav'
+                      and params.get('attachment', attachment['id']) == attachment['id']]
+        if not candidates:
+            self.send_json({'success': False, 'message': 'No WAV attached to this song'}, 404)
+            return
+        attachment = candidates[-1]
+        sidecar_path = store.peaks_path(attachment['sha256'])
+        
+        # Pulls in multiprocessing, so it is imported on the first waveform request
+        from waveform_peaks import PeakFile
+        peak_worker = get_peak_worker()
+        status, error = peak_worker.status(sidecar_path)
+        if status == 'ready':
+            try:
+                with PeakFile(sidecar_path) as peak_file:
+                    metadata = peak_file.metadata()
+                    samples_per_peak, peaks = peak_file.peaks(width)
+            except (OSError, ValueError) as e:
+                # Half-written or damaged: compute it again
+                print(f"⚠️  {e}, recomputing")
+                os.remove(sidecar_path)
+                peak_worker.forget(sidecar_path)
+                status = 'missing'
+        if status == 'missing':
+            self.queue_peaks(attachment)
+            status = 'pending'
+        if status == 'pending':
+            self.send_response(202)
+            self.send_header('Retry-After', '1')
+            self.send_header('Content-type', 'application/json')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            self.wfile.write(json.dumps({'success': True, 'status': 'pending'}).encode())
+            return
+        if status == 'failed':
+            self.send_json({'success': False, 'status': 'failed', 'message': error}, 422)
+            return
+        
+        etag = f'"peaks-{attachment["sha256"][:16]}-{samples_per_peak}"'
+        binary = params.get('format') == 'binary'
+        if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        if binary:
+            body = peaks
+            content_type = 'application/octet-stream'
+        else:
+            body = json.dumps({
+                'success': True,
+                'status': 'ready',
+                'songId': song_id,
+                'attachment': {'id': attachment['id'], 'filename': attachment['filename']},
+                **metadata,
+                'samplesPerPeak': samples_per_peak,
+                # Interleaved min, max per peak, scaled to -127..127
+                'peaks': memoryview(peaks).cast('b').tolist()
+            }).encode()
+            content_type = 'application/json'
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('X-Samples-Per-Peak', str(samples_per_peak))
+        self.send_header('X-Duration', str(metadata['duration']))
+        self.send_header('X-Sample-Rate', str(metadata['sampleRate']))
+        self.send_header('X-Channels', str(metadata['channels']))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Expose-Headers',
+                         'X-Samples-Per-Peak, X-Duration, X-Sample-Rate, X-Channels')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def delete_attachment(self, attachment_id):
+        """Detach a file; its audio is removed once nothing else refers to it"""
+        try:
+            attachment = self.album.attachment_store.delete(attachment_id)
+            if attachment is None:
+                self.send_json({'success': False, 'message': 'Attachment not found'}, 404)
+                return
+            self.album.change_feed.publish('attachment', 'deleted', attachment)
+            self.send_json({'success': True, 'message': f'Removed {attachment["filename"]}'})
+            print(f"🗑️  Removed attachment {attachment['filename']}")
+        except Exception as e:
+            self.send_json({'success': False, 'message': f'Error removing attachment: {str(e)}'}, 500)
+            print(f"❌ Error removing attachment {attachment_id}: {e}")
+
+def get_peak_worker():
+    """The shared PeakWorker, created (and waveform_peaks imported) on first use"""
+    global peak_worker
+    with peak_worker_lock:
+        if peak_worker is None:
+            from waveform_peaks import PeakWorker
+            peak_worker = PeakWorker()
+        return peak_worker
+
+
+def entry_time(data):
+    """When an entry was written on the client (its ISO timestamp), in server local time"""
+    timestamp = data.get('timestamp')
+    if not timestamp:
+        return datetime.now()
+    try:
+        moment = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    except ValueError:
+        return datetime.now()
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTP server that hands requests to a bounded pool of worker threads"""
+
+    def __init__(self, server_address, handler_class, workers=8, queue_size=32):
+        # Let the kernel hold as many pending connections as our own queue
+        self.request_queue_size = max(queue_size, 5)
+        self.workers = []
+        super().__init__(server_address, handler_class)
+        self.pending = queue.Queue(maxsize=queue_size)
+        for i in range(workers):
+            worker = threading.Thread(target=self.worker_loop, name=f'journal-worker-{i}', daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def process_request(self, request, client_address):
+        """Queue the connection for a worker, or turn it away when the queue is full"""
+        try:
+            self.pending.put_nowait((request, client_address))
+        except queue.Full:
+            self.reject_request(request)
+
+    def reject_request(self, request):
+        """Answer with 503 so clients can retry instead of hanging"""
+        try:
+            body = json.dumps({'success': False, 'message': 'Server busy, try again'}).encode()
+            request.sendall(
+                b'HTTP/1.0 503 Service Unavailable\r\n'
+                b'Content-Type: application/json\r\n'
+                b'Access-Control-Allow-Origin: *\r\n'
+                b'Retry-After: 1\r\n'
+                + f'Content-Length: {len(body)}\r\n\r\n'.encode() + body
+            )
+        except OSError:
+            pass
+        finally:
+            self.shutdown_request(request)
+        print("⚠️  Request queue full, rejected connection")
+
+    def worker_loop(self):
+        """Serve queued connections until a stop marker arrives"""
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        for _ in self.workers:
+            self.pending.put(None)
+
+
+def create_server(port=8082, mode='pooled', workers=8, queue_size=32):
+    """Build the HTTP server for the requested concurrency mode"""
     server_address = ('', port)
-    httpd = HTTPServer(server_address, JournalHandler)
+    if mode == 'single':
+        return HTTPServer(server_address, JournalHandler)
+    if mode == 'threaded':
+        return ThreadingHTTPServer(server_address, JournalHandler)
+    if mode == 'pooled':
+        return PooledHTTPServer(server_address, JournalHandler, workers=workers, queue_size=queue_size)
+    raise ValueError(f"Unknown server mode: {mode}")
+
+
+def register_gauges(httpd):
+    """Cache sizes and queue depth reported on each /metrics scrape, summed over loaded albums"""
+    metrics.add_gauge('journal_albums_loaded', 'Albums held in memory', lambda: len(albums.loaded()))
+    metrics.add_gauge('journal_albums_estimated_bytes', 'Estimated memory used by loaded albums',
+                      lambda: albums.total(lambda album: album.footprint))
+    metrics.add_gauge('journal_index_entries', 'Journal files in the index',
+                      lambda: albums.total(lambda album: len(album.journal_index)))
+    metrics.add_gauge('journal_songs', 'Songs in songs.json', lambda: albums.total(lambda album: len(album.song_store.songs)))
+    metrics.add_gauge('journal_render_cache_entries', 'Entries held in the rendered-HTML cache',
+                      lambda: albums.total(lambda album: len(album.render_cache)))
+    metrics.add_gauge('journal_render_cache_hits', 'Rendered-HTML cache hits since the albums were loaded',
+                      lambda: albums.total(lambda album: album.render_cache.hits))
+    metrics.add_gauge('journal_render_cache_misses', 'Rendered-HTML cache misses since the albums were loaded',
+                      lambda: albums.total(lambda album: album.render_cache.misses))
+    metrics.add_gauge('journal_static_cache_entries', 'UI files held in the static asset cache',
+                      lambda: albums.total(lambda album: len(album.static_assets.cache)))
+    metrics.add_gauge('journal_peak_jobs', 'Waveform sidecars queued or being computed', lambda: len(peak_worker.jobs) if peak_worker else 0)
+    metrics.add_gauge('journal_change_version', 'Latest change feed version of the default album',
+                      albums.resolve('/')[0].change_feed.current_version)
+    if isinstance(httpd, PooledHTTPServer):
+        metrics.add_gauge('journal_pool_queue_depth', 'Connections waiting for a worker', httpd.pending.qsize)
+
+
+def ui_files(album):
+    """The pages and everything under src/ui, as paths the static cache is keyed by"""
+    paths = [album.path(page) for page in PAGES.values()]
+    for directory, _, filenames in os.walk(album.path('src', 'ui')):
+        paths.extend(os.path.normpath(os.path.join(directory, filename)) for filename in filenames)
+    return paths
+
+
+def warm_up(album, prewarm=True):
+    """Load the default album and fill its static cache, then mark the server ready.
+
+    Runs beside the listening socket, so restarts accept connections at
+    once; requests that need the album wait on its load lock meanwhile.
+    """
+    started = time.perf_counter()
+    try:
+        if prewarm:
+            with album.load_lock:
+                if not album.loaded:
+                    album.load()
+            cached = album.static_assets.warm(ui_files(album))
+            print(f"🔥 Warmed {cached} static files")
+        if album.watcher is not None:
+            print(f"👀 Following edits to docs/ with {album.watcher.method}")
+    except Exception as e:
+        startup['error'] = str(e)
+        print(f"❌ Error warming up: {e}")
+    finally:
+        startup['warmup_seconds'] = round(time.perf_counter() - started, 3)
+        ready.set()
+    if prewarm and not startup['error']:
+        print(f"✅ Ready after {time.time() - startup['started']:.2f}s")
+
+
+def start_server(port=8082, mode='pooled', workers=8, queue_size=32, auto_commit=False,
+                 commit_quiet=QUIET_PERIOD, commit_max_latency=MAX_LATENCY, push_interval=PUSH_INTERVAL,
+                 slow_ms=None, profile_dir=None, albums_dir=None, max_albums=MAX_LOADED_ALBUMS,
+                 album_idle=IDLE_SECONDS, album_memory_mb=None, watch='auto', prewarm=True):
+    """Start the journal server"""
+    global stream_slots
+    startup['started'] = time.time()
+    if albums_dir:
+        print(f"💿 Hosting {albums.discover(albums_dir)} albums from {albums_dir} under /albums/<name>/")
+    albums.max_loaded = max_albums
+    albums.idle_seconds = album_idle
+    albums.memory_budget = album_memory_mb * 1024 * 1024 if album_memory_mb else None
+    if mode == 'async':
+        import asyncio
+        from async_server import AsyncJournalServer
+        httpd = None
+        async_server = AsyncJournalServer(JournalHandler, albums, metrics, threads=workers,
+                                          max_change_wait=MAX_CHANGE_WAIT, stream_seconds=STREAM_SECONDS)
+        metrics.add_gauge('journal_open_connections', 'Client connections held open', lambda: async_server.connections)
+        metrics.add_gauge('journal_open_streams', 'Change feed streams held open', lambda: async_server.streams)
+    else:
+        httpd = create_server(port, mode, workers, queue_size)
+    register_gauges(httpd)
+    metrics.install_fs_hook()
+    if slow_ms is not None:
+        metrics.enable_slow_log(slow_ms, profile_dir)
+        print(f"🐢 Logging requests slower than {slow_ms} ms" + (f", profiles in {profile_dir}/" if profile_dir else ''))
+    if mode == 'pooled':
+        # Leave at least half the pool for ordinary requests
+        stream_slots = threading.BoundedSemaphore(max(1, workers // 2))
+    elif mode == 'single':
+        # A stream would block the only thread; clients fall back to long-polling
+        stream_slots = threading.BoundedSemaphore(0)
+    
+    for album in albums:
+        album.git_worker.on_command = metrics.observe_git
+        album.watch_mode = None if watch == 'off' else watch
+        if auto_commit:
+            album.git_worker.enable_auto_commit(commit_quiet, commit_max_latency, push_interval)
+    if auto_commit:
+        print(f"⏱️  Auto-commit after {commit_quiet}s quiet (max {commit_max_latency}s), push every {push_interval}s")
+    # The default album is warmed up in the background (or, without prewarm, loaded
+    # on its first request like the hosted albums) while the socket already accepts
+    default_album = albums.resolve('/')[0]
+    threading.Thread(target=warm_up, args=(default_album, prewarm), name='warm-up', daemon=True).start()
+    albums.start_sweeper()
     
     print(f"🎧 Production Journal Server starting on port {port}")
+    if mode == 'pooled':
+        print(f"🧵 Serving with {workers} workers (queue depth {queue_size})")
+    elif mode == 'async':
+        print(f"🧵 Serving with asyncio ({workers} handler threads)")
+    else:
+        print(f"🧵 Serving in {mode} mode")
     print(f"📝 Open http://localhost:{port} to access the journal")
     print(f"💾 Journal entries will be saved to docs/journal/ folder")
     print("Press Ctrl+C to stop the server")
     
     try:
-        httpd.serve_forever()
+        if httpd is None:
+            asyncio.run(async_server.serve(port))
+        else:
+            httpd.serve_forever()
     except KeyboardInterrupt:
         print("\n🛑 Server stopped")
-        httpd.server_close()
+        if httpd is not None:
+            httpd.server_close()
+
+
+def parse_args(argv=None):
+    """Parse command line options for the server"""
+    parser = argparse.ArgumentParser(description='Production Journal Server')
+    parser.add_argument('--port', type=int, default=8082, help='Port to listen on (default: 8082)')
+    parser.add_argument('--mode', choices=['pooled', 'threaded', 'single', 'async'], default='pooled',
+                        help='Concurrency mode (default: pooled)')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='Worker threads in pooled mode, handler threads in async mode (default: 8)')
+    parser.add_argument('--queue-size', type=int, default=32,
+                        help='Requests waiting for a worker before new ones get 503 (default: 32)')
+    parser.add_argument('--auto-commit', action='store_true',
+                        help='Commit journal and song writes automatically in batches')
+    parser.add_argument('--commit-quiet', type=float, default=QUIET_PERIOD,
+                        help=f'Seconds without writes before a batch is committed (default: {QUIET_PERIOD})')
+    parser.add_argument('--commit-max-latency', type=float, default=MAX_LATENCY,
+                        help=f'Longest a write waits to be committed (default: {MAX_LATENCY})')
+    parser.add_argument('--push-interval', type=float, default=PUSH_INTERVAL,
+                        help=f'Minimum seconds between automatic pushes (default: {PUSH_INTERVAL})')
+    parser.add_argument('--slow-ms', type=float,
+                        help='Log requests that take longer than this many milliseconds')
+    parser.add_argument('--profile-dir',
+                        help='With --slow-ms, profile requests and save cProfile dumps of slow ones here')
+    parser.add_argument('--watch', choices=['auto', 'poll', 'off'], default='auto',
+                        help='Follow edits to docs/ made outside the server with inotify (auto) or polling (default: auto)')
+    parser.add_argument('--albums-dir',
+                        help='Also host every album repo in this directory under /albums/<name>/')
+    parser.add_argument('--max-albums', type=int, default=MAX_LOADED_ALBUMS,
+                        help=f'Albums kept loaded before the least recently used is evicted (default: {MAX_LOADED_ALBUMS})')
+    parser.add_argument('--album-idle', type=float, default=IDLE_SECONDS,
+                        help=f'Seconds an album may sit unused before it is evicted (default: {IDLE_SECONDS})')
+    parser.add_argument('--album-memory-mb', type=float,
+                        help='Evict albums while their estimated memory use is above this many MB')
+    parser.add_argument('--prewarm', action=argparse.BooleanOptionalAction, default=True,
+                        help='Load the journal and cache the UI files right after start-up; /healthz reports '
+                             'ready once done (default: on)')
+    return parser.parse_args(argv)
 
 if __name__ == '__main__':
-    start_server()
+    start_server(**vars(parse_args()))
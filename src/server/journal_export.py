@@ -0,0 +1,236 @@
+"""
+Journal Export
+Bulk export of journal entries as an HTML book, JSONL, CSV of technical
+fields or a ZIP archive. Entries are parsed and rendered in a process pool
+and the output is produced as a stream of byte chunks, so an export can be
+written to an HTTP response or a file without holding it all in memory.
+"""
+
+import os
+import io
+import re
+import csv
+import json
+import zipfile
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from html import escape
+
+from journal_index import parse_entry_filename
+from journal_markdown import parse_entry, render_html
+
+# format -> (content type, file extension)
+FORMATS = {
+    'html': ('text/html; charset=utf-8', 'html'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'zip': ('application/zip', 'zip')
+}
+
+CSV_COLUMNS = ['date', 'time', 'track', 'bpm', 'key', 'effects', 'issues', 'filename']
+
+# Dates written by the form already carry the time ("Oct 22, 2025, 06:32 PM")
+DATE_WITH_TIME = re.compile(r'\d{1,2}:\d{2}')
+
+# Entries handed to a worker process at a time, and batches kept in flight
+BATCH_SIZE = 32
+BATCHES_PER_WORKER = 2
+# Below this many entries a pool costs more than it saves
+MIN_POOL_ENTRIES = 64
+
+HTML_HEAD = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; max-width: 800px; margin: 0 auto; padding: 20px; color: #333; line-height: 1.5; }}
+article {{ border-bottom: 1px solid #eee; padding: 20px 0; }}
+article > h2 {{ color: #667eea; margin-bottom: 0; }}
+.meta {{ color: #666; font-size: 0.9em; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+"""
+
+
+def render_entry_file(relative_path, full_path, with_html):
+    """Read and parse one entry file (runs in a worker process)"""
+    filename = os.path.basename(full_path)
+    parsed_name = parse_entry_filename(filename) or {}
+    try:
+        with open(full_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        return {'path': relative_path, 'filename': filename, 'error': str(e)}
+
+    entry = parse_entry(content)
+    time_str = parsed_name.get('time', '')
+    record = {
+        'path': relative_path,
+        'filename': filename,
+        'date': entry['date'] or parsed_name.get('date'),
+        'time': f'{time_str[:2]}:{time_str[2:]}' if time_str else None,
+        'track': entry['track'] or parsed_name.get('track'),
+        'session_time': entry['session_time'],
+        'sections': entry['sections'],
+        'fields': entry['fields'],
+        'content': content
+    }
+    if with_html:
+        # Drop the "# Production Journal Entry" title; the book gives each entry its own heading
+        body = content.split('\n', 1)[1] if content.startswith('# ') else content
+        record['html'] = render_html(body)
+    return record
+
+
+def entry_heading(date, time_str, track):
+    """"<date> <time> - <track>", leaving out the time when the date already shows one"""
+    if time_str and not DATE_WITH_TIME.search(date or ''):
+        date = f'{date} {time_str}'
+    return f'{date} - {track}'
+
+
+def render_batch(items, with_html):
+    return [render_entry_file(relative_path, full_path, with_html) for relative_path, full_path in items]
+
+
+def batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def render_entries(items, with_html=False, workers=None, use_pool=True):
+    """Yield rendered records for (relative path, full path) pairs, in the order given.
+
+    Batches go to a process pool with only a few in flight per worker, so
+    memory stays bounded however many entries are exported.
+    """
+    workers = workers or os.cpu_count() or 1
+    if not use_pool or workers < 2:
+        for relative_path, full_path in items:
+            yield render_entry_file(relative_path, full_path, with_html)
+        return
+
+    # spawn: forking a process that is running server threads isn't safe
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        in_flight = deque()
+        for batch in batched(items, BATCH_SIZE):
+            in_flight.append(executor.submit(render_batch, batch, with_html))
+            if len(in_flight) >= workers * BATCHES_PER_WORKER:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+
+def export_chunks(format_name, items, title='Production Journal', workers=None):
+    """Yield the export in the given format as byte chunks"""
+    items = list(items) if not isinstance(items, list) else items
+    records = render_entries(items, with_html=format_name in ('html', 'zip'), workers=workers,
+                             use_pool=len(items) >= MIN_POOL_ENTRIES)
+    writers = {'html': html_chunks, 'jsonl': jsonl_chunks, 'csv': csv_chunks, 'zip': zip_chunks}
+    return writers[format_name](records, title)
+
+
+def html_chunks(records, title):
+    yield HTML_HEAD.format(title=escape(title)).encode('utf-8')
+    for record in records:
+        if 'error' in record:
+            continue
+        heading = escape(entry_heading(record['date'], record['time'], record['track']))
+        yield (
+            f'<article id="{escape(record["filename"])}">\n<h2>{heading}</h2>\n'
+            f'<p class="meta">{escape(record["path"])}</p>\n{record["html"]}\n</article>\n'
+        ).encode('utf-8')
+    yield b'</body>\n</html>\n'
+
+
+def jsonl_chunks(records, title):
+    for record in records:
+        if 'error' in record:
+            continue
+        yield (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def csv_chunks(records, title):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for record in records:
+        if 'error' in record:
+            continue
+        fields = record['fields']
+        writer.writerow([record['date'], record['time'], record['track'],
+                         fields.get('bpm', ''), fields.get('key', ''), fields.get('effects', ''),
+                         fields.get('issues', ''), record['filename']])
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only stream that collects what zipfile writes until it is drained.
+
+    It doesn't support seek or tell, so zipfile writes data descriptors
+    after each member instead of going back to patch headers.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def zip_chunks(records, title):
+    """Each entry as its original markdown plus a rendered HTML page"""
+    sink = ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for record in records:
+            if 'error' in record:
+                continue
+            base = os.path.splitext(record['path'])[0]
+            archive.writestr(f'journal/{record["path"]}', record['content'])
+            page = (HTML_HEAD.format(title=escape(f"{record['date']} - {record['track']}"))
+                    + record['html'] + '\n</body>\n</html>\n')
+            archive.writestr(f'html/{base}.html', page)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def write_export(format_name, items, output_path, title='Production Journal', workers=None):
+    """Stream an export to a file through a temp file and rename; returns bytes written"""
+    directory = os.path.dirname(output_path) or '.'
+    temp_path = os.path.join(directory, f'.{os.path.basename(output_path)}.tmp')
+    written = 0
+    try:
+        with open(temp_path, 'wb') as f:
+            for chunk in export_chunks(format_name, items, title, workers):
+                f.write(chunk)
+                written += len(chunk)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return written
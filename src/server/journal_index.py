@@ -0,0 +1,277 @@
+"""
+Journal Index
+Keeps the metadata of every journal file in memory so listing and lookups
+don't have to walk docs/journal on each request
+"""
+
+import os
+import re
+import json
+import time
+import base64
+import bisect
+import threading
+from datetime import datetime
+
+# Filenames written by save_journal_entry: YYYY-MM-DD-HHMM-<track>.md, with a two-digit
+# sequence after HHMM for further entries saved in the same minute
+ENTRY_FILENAME = re.compile(r'^(\d{4})-(\d{2})-(\d{2})-(\d{4})(?:\d{2})?-(.+)\.md$')
+
+
+def parse_entry_filename(filename):
+    """Split a journal filename into date, time and track slug (None if it doesn't match)"""
+    match = ENTRY_FILENAME.match(filename)
+    if not match:
+        return None
+    year, month, day, time_str, track = match.groups()
+    return {
+        'year': year,
+        'month': month,
+        'date': f"{year}-{month}-{day}",
+        'time': time_str,
+        'track': track
+    }
+
+
+def encode_cursor(mtime, filename):
+    """Opaque cursor pointing just past the given listing position"""
+    raw = json.dumps([-mtime, filename]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Turn a cursor back into a (-mtime, filename) sort key"""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        key, filename = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return (float(key), str(filename))
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+class JournalIndex:
+    """In-memory index of journal files keyed by filename, newest first"""
+
+    def __init__(self, root=os.path.join('docs', 'journal'), stale_check_interval=2.0):
+        self.root = root
+        # None once a filesystem watcher reports changes, so listings never rescan
+        self.stale_check_interval = stale_check_interval
+        self.lock = threading.RLock()
+        self.entries = {}        # filename -> entry
+        self.order = []          # sorted (-mtime, filename) pairs
+        self.dirs = {}           # directory -> (mtime, set of filenames)
+        self.months = {}         # 'YYYY-MM' -> set of filenames
+        self.tracks = {}         # track slug -> set of filenames
+        self.last_check = 0.0
+
+    def build(self):
+        """Scan the whole journal tree once"""
+        with self.lock:
+            self.entries = {}
+            self.order = []
+            self.dirs = {}
+            self.months = {}
+            self.tracks = {}
+            self.scan_tree(self.root)
+            self.last_check = time.monotonic()
+        return len(self.entries)
+
+    def scan_tree(self, directory):
+        """Index a directory and everything below it"""
+        for subdir in self.scan_dir(directory):
+            self.scan_tree(subdir)
+
+    def scan_dir(self, directory):
+        """Re-index the markdown files directly in a directory, returning its subdirectories"""
+        try:
+            dir_mtime = os.stat(directory).st_mtime
+            children = list(os.scandir(directory))
+        except OSError:
+            self.forget_dir(directory)
+            return []
+
+        previous = self.dirs.get(directory, (None, set()))[1]
+        seen = set()
+        subdirs = []
+        for child in children:
+            if child.is_dir():
+                subdirs.append(child.path)
+            elif child.name.endswith('.md'):
+                try:
+                    self.put(child.path, child.stat())
+                    seen.add(child.name)
+                except OSError:
+                    continue
+        for filename in previous - seen:
+            self.discard(filename)
+        self.dirs[directory] = (dir_mtime, seen)
+        return subdirs
+
+    def forget_dir(self, directory):
+        """Drop a directory that no longer exists, along with everything below it"""
+        prefix = directory + os.sep
+        for path in [d for d in self.dirs if d == directory or d.startswith(prefix)]:
+            for filename in self.dirs.pop(path)[1]:
+                self.discard(filename)
+
+    def refresh(self, force=False):
+        """Cheap rescan: only directories whose mtime changed are listed again"""
+        with self.lock:
+            now = time.monotonic()
+            if not force and (self.stale_check_interval is None or now - self.last_check < self.stale_check_interval):
+                return
+            self.last_check = now
+            if not self.dirs:
+                self.scan_tree(self.root)
+                return
+            for directory, (known_mtime, _) in list(self.dirs.items()):
+                if directory not in self.dirs:
+                    continue
+                try:
+                    mtime = os.stat(directory).st_mtime
+                except OSError:
+                    self.forget_dir(directory)
+                    continue
+                if mtime != known_mtime:
+                    for subdir in self.scan_dir(directory):
+                        if subdir not in self.dirs:
+                            self.scan_tree(subdir)
+
+    def put(self, file_path, stat_result=None):
+        """Add or update a single file"""
+        stat_result = stat_result or os.stat(file_path)
+        filename = os.path.basename(file_path)
+        parsed = parse_entry_filename(filename) or {}
+        entry = {
+            'filename': filename,
+            'path': os.path.relpath(file_path, self.root),
+            'full_path': file_path,
+            'mtime': stat_result.st_mtime,
+            'modified': datetime.fromtimestamp(stat_result.st_mtime).isoformat(),
+            'size': stat_result.st_size,
+            'date': parsed.get('date'),
+            'track': parsed.get('track')
+        }
+        with self.lock:
+            self.discard(filename)
+            self.entries[filename] = entry
+            bisect.insort(self.order, (-entry['mtime'], filename))
+            if entry['date']:
+                self.months.setdefault(entry['date'][:7], set()).add(filename)
+                self.tracks.setdefault(entry['track'], set()).add(filename)
+            directory = os.path.dirname(file_path)
+            if directory in self.dirs:
+                self.dirs[directory][1].add(filename)
+        return entry
+
+    def add(self, file_path):
+        """Record a file that was just written, keeping directory mtimes in sync"""
+        with self.lock:
+            entry = self.put(file_path)
+            directory = os.path.dirname(file_path)
+            if directory in self.dirs:
+                self.dirs[directory] = (os.stat(directory).st_mtime, self.dirs[directory][1])
+            else:
+                # New year/month folder: index it and link it to its parents
+                while directory not in self.dirs and directory.startswith(self.root):
+                    self.scan_dir(directory)
+                    directory = os.path.dirname(directory)
+            return entry
+
+    def discard(self, filename):
+        """Remove a file from the index if present"""
+        with self.lock:
+            entry = self.entries.pop(filename, None)
+            if entry is None:
+                return None
+            key = (-entry['mtime'], filename)
+            i = bisect.bisect_left(self.order, key)
+            if i < len(self.order) and self.order[i] == key:
+                self.order.pop(i)
+            if entry['date']:
+                for buckets, name in ((self.months, entry['date'][:7]), (self.tracks, entry['track'])):
+                    bucket = buckets.get(name)
+                    if bucket is not None:
+                        bucket.discard(filename)
+                        if not bucket:
+                            del buckets[name]
+            return entry
+
+    def get(self, filename):
+        """Look up a file by name, falling back to its expected YYYY/MM location"""
+        if '/' in filename or os.sep in filename:
+            return None
+        with self.lock:
+            entry = self.entries.get(filename)
+        if entry is not None:
+            if os.path.exists(entry['full_path']):
+                return entry
+            self.discard(filename)
+
+        parsed = parse_entry_filename(filename)
+        if parsed:
+            candidate = os.path.join(self.root, parsed['year'], parsed['month'], filename)
+            if os.path.isfile(candidate):
+                return self.add(candidate)
+        return None
+
+    def list_entries(self):
+        """All entries, newest first"""
+        self.refresh()
+        with self.lock:
+            return [self.entries[filename] for _, filename in self.order]
+
+    def query(self, track=None, year=None, month=None, date_from=None, date_to=None,
+              limit=None, cursor=None):
+        """One page of entries, newest first, plus the cursor for the next page.
+
+        Filters work on the YYYY-MM-DD-HHMM-<track>.md naming, so whole months
+        outside the requested range are skipped without looking at their files.
+        """
+        self.refresh()
+        with self.lock:
+            filtered = any([track, year, month, date_from, date_to])
+            if filtered:
+                candidates = self.filter_candidates(track, year, month, date_from, date_to)
+                keys = sorted((-self.entries[name]['mtime'], name) for name in candidates)
+            else:
+                keys = self.order
+
+            start = 0
+            if cursor:
+                start = bisect.bisect_right(keys, decode_cursor(cursor))
+            end = len(keys) if limit is None else start + limit
+            page = [self.entries[name] for _, name in keys[start:end]]
+            next_cursor = None
+            if end < len(keys) and page:
+                next_cursor = encode_cursor(page[-1]['mtime'], page[-1]['filename'])
+            return page, next_cursor, len(keys)
+
+    def filter_candidates(self, track, year, month, date_from, date_to):
+        """Filenames matching the filters, pruned by month bucket first"""
+        low = date_from or ''
+        high = date_to or '9999-99-99'
+        month = f"{int(month):02d}" if month else None
+
+        def month_wanted(month_key):
+            if year and month_key[:4] != str(year):
+                return False
+            if month and month_key[5:7] != month:
+                return False
+            return low[:7] <= month_key <= high[:7]
+
+        if track:
+            names = {n for n in self.tracks.get(track, ())
+                     if month_wanted(self.entries[n]['date'][:7])}
+        else:
+            names = set()
+            for month_key, bucket in self.months.items():
+                if month_wanted(month_key):
+                    names.update(bucket)
+
+        if date_from or date_to:
+            names = {n for n in names if low <= self.entries[n]['date'] <= high}
+        return names
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,231 @@
+"""
+Journal Markdown
+Renders journal entries as markdown and reads that format back
+"""
+
+import re
+from html import escape
+
+# Section headings written by save_journal_entry, mapped to short field names
+SECTIONS = {
+    'Session Notes': 'notes',
+    'Follow-up Actions': 'followup',
+    'Technical Notes': 'technical',
+    'Creative Notes': 'creative'
+}
+
+# "- **BPM:** 120" style lines inside the technical and creative sections
+LABELS = {
+    'BPM': 'bpm',
+    'Key': 'key',
+    'Effects Used': 'effects',
+    'Recording Issues': 'issues',
+    'Mood/Feeling': 'mood',
+    'Inspiration': 'inspiration',
+    'Challenges': 'challenges',
+    'Breakthroughs': 'breakthroughs'
+}
+
+HEADER_LINE = re.compile(r'^\*\*(Date|Track|Session Time):\*\*\s*(.*?)\s*$')
+LABEL_LINE = re.compile(r'^- \*\*([^*]+):\*\*\s*(.*?)\s*$')
+FOOTER = '*Auto-generated by Production Journal Server*'
+BOLD = re.compile(r'\*\*(.+?)\*\*')
+ITALIC = re.compile(r'(?<![*\w])\*(?!\s)(.+?)(?<!\s)\*(?![*\w])')
+CODE = re.compile(r'`([^`]+)`')
+# "- fix the kick", "1. bounce stems", "- [x] done" lines in Follow-up Actions
+FOLLOWUP_ITEM = re.compile(r'^(?:[-*+]|\d+[.)])\s+(?:\[( |x|X)\]\s+)?(.*)$')
+
+
+def render_entry(data, now):
+    """Render the submitted form data as a journal entry"""
+    # Create markdown content with all the form fields
+    followup_section = ""
+    if data.get('followup'):
+        followup_section = f"## Follow-up Actions\n{data['followup']}\n\n"
+
+    technical_section = "## Technical Notes\n"
+    if data.get('bpm'):
+        technical_section += f"- **BPM:** {data['bpm']}\n"
+    if data.get('key'):
+        technical_section += f"- **Key:** {data['key']}\n"
+    if data.get('effects'):
+        technical_section += f"- **Effects Used:** {data['effects']}\n"
+    if data.get('issues'):
+        technical_section += f"- **Recording Issues:** {data['issues']}\n"
+    if not any([data.get('bpm'), data.get('key'), data.get('effects'), data.get('issues')]):
+        technical_section += "- **BPM:** [Add BPM if relevant]\n"
+        technical_section += "- **Key:** [Add key if relevant]\n"
+        technical_section += "- **Effects Used:** [List any new effects or plugins]\n"
+        technical_section += "- **Recording Issues:** [Note any technical problems]\n"
+
+    creative_section = "## Creative Notes\n"
+    if data.get('mood'):
+        creative_section += f"- **Mood/Feeling:** {data['mood']}\n"
+    if data.get('inspiration'):
+        creative_section += f"- **Inspiration:** {data['inspiration']}\n"
+    if data.get('challenges'):
+        creative_section += f"- **Challenges:** {data['challenges']}\n"
+    if data.get('breakthroughs'):
+        creative_section += f"- **Breakthroughs:** {data['breakthroughs']}\n"
+    if not any([data.get('mood'), data.get('inspiration'), data.get('challenges'), data.get('breakthroughs')]):
+        creative_section += "- **Mood/Feeling:** [Describe the creative mood]\n"
+        creative_section += "- **Inspiration:** [What inspired this session]\n"
+        creative_section += "- **Challenges:** [What was difficult]\n"
+        creative_section += "- **Breakthroughs:** [What worked well]\n"
+
+    markdown_content = f"""# Production Journal Entry
+
+**Date:** {data['date']}  
+**Track:** {data['track']}  
+**Session Time:** {now.strftime('%Y-%m-%d %H:%M:%S')}
+
+## Session Notes
+{data['notes']}
+
+{followup_section}{technical_section}
+
+{creative_section}
+
+---
+*Auto-generated by Production Journal Server*
+"""
+    return markdown_content
+
+
+def is_placeholder(value):
+    """Template text such as "[Add BPM if relevant]" that stands in for an empty field"""
+    return value.startswith('[') and value.endswith(']')
+
+
+def is_placeholder_line(line):
+    """A "- **Label:** [placeholder]" line from the empty-section template"""
+    label = LABEL_LINE.match(line.strip())
+    return bool(label) and is_placeholder(label.group(2))
+
+
+def parse_entry(content):
+    """Split an entry into header values, section text and labelled fields.
+
+    Returns a dict with 'date', 'track', 'session_time', 'sections'
+    (field name -> text) and 'fields' (bpm, key, mood, ... -> value).
+    Placeholder values are left out of 'fields'.
+    """
+    entry = {'date': None, 'track': None, 'session_time': None, 'sections': {}, 'fields': {}}
+    current = None
+    lines = {}
+
+    for line in content.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('## '):
+            current = SECTIONS.get(stripped[3:].strip())
+            if current:
+                lines[current] = []
+            continue
+        if stripped == '---':
+            current = None
+            continue
+        if stripped.startswith('# ') or stripped == FOOTER:
+            continue
+
+        header = HEADER_LINE.match(stripped)
+        if header and current is None:
+            key = header.group(1).lower().replace(' ', '_')
+            entry[key] = header.group(2)
+            continue
+
+        if current:
+            lines[current].append(line.rstrip())
+            label = LABEL_LINE.match(stripped)
+            if label and label.group(1) in LABELS and not is_placeholder(label.group(2)):
+                entry['fields'][LABELS[label.group(1)]] = label.group(2)
+
+    for name, section_lines in lines.items():
+        text = '\n'.join(section_lines).strip()
+        if name in ('technical', 'creative'):
+            # Drop template-only lines so they don't count as content
+            text = '\n'.join(l for l in text.splitlines() if not is_placeholder_line(l)).strip()
+        entry['sections'][name] = text
+    return entry
+
+
+def followup_items(text):
+    """Follow-up Actions text as (action, done) pairs, one per non-empty line.
+
+    A "- [x] ..." checkbox marks an action that was already done when written.
+    """
+    items = []
+    for line in (text or '').splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        match = FOLLOWUP_ITEM.match(stripped)
+        if match:
+            items.append((match.group(2).strip(), (match.group(1) or ' ').lower() == 'x'))
+        else:
+            items.append((stripped, False))
+    return items
+
+
+def render_inline(text):
+    """Escape a line of text, then apply **bold**, *italic* and `code`"""
+    text = escape(text, quote=False)
+    text = CODE.sub(r'<code>\1</code>', text)
+    text = BOLD.sub(r'<strong>\1</strong>', text)
+    return ITALIC.sub(r'<em>\1</em>', text)
+
+
+def render_html(content):
+    """Render the markdown subset journal entries use as HTML.
+
+    Everything is escaped before formatting is applied, so raw HTML in an
+    entry shows up as text instead of being injected into the page.
+    """
+    html = []
+    paragraph = []
+    in_list = False
+
+    def close_paragraph():
+        if paragraph:
+            html.append('<p>' + '<br>\n'.join(paragraph) + '</p>')
+            paragraph.clear()
+
+    def close_list():
+        nonlocal in_list
+        if in_list:
+            html.append('</ul>')
+            in_list = False
+
+    for line in content.splitlines():
+        stripped = line.strip()
+        heading = re.match(r'^(#{1,6})\s+(.*)$', stripped)
+        item = FOLLOWUP_ITEM.match(stripped) if stripped[:1] in '-*+' else None
+
+        if not stripped:
+            close_paragraph()
+            close_list()
+        elif heading:
+            close_paragraph()
+            close_list()
+            level = len(heading.group(1))
+            html.append(f'<h{level}>{render_inline(heading.group(2))}</h{level}>')
+        elif stripped in ('---', '***', '___'):
+            close_paragraph()
+            close_list()
+            html.append('<hr>')
+        elif item:
+            close_paragraph()
+            if not in_list:
+                html.append('<ul>')
+                in_list = True
+            checkbox = ''
+            if item.group(1) is not None:
+                checked = ' checked' if item.group(1).lower() == 'x' else ''
+                checkbox = f'<input type="checkbox" disabled{checked}> '
+            html.append(f'<li>{checkbox}{render_inline(item.group(2))}</li>')
+        else:
+            close_list()
+            paragraph.append(render_inline(stripped))
+
+    close_paragraph()
+    close_list()
+    return '\n'.join(html)
@@ -0,0 +1,174 @@
+"""
+Journal Search
+Incremental inverted index over journal entries, scored per section
+"""
+
+import re
+import math
+import threading
+
+from journal_index import parse_entry_filename
+from journal_markdown import parse_entry
+
+TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z0-9]+)*")
+
+# How much a hit in each field counts towards the score
+FIELD_WEIGHTS = {
+    'track': 2.0,
+    'notes': 1.0,
+    'followup': 1.2,
+    'technical': 1.0,
+    'creative': 1.0
+}
+
+SNIPPET_RADIUS = 60
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text):
+    """Lowercase words, keeping inner apostrophes (mic'd, it's)"""
+    return TOKEN.findall(text.lower())
+
+
+def make_snippet(text, query_phrase, terms):
+    """Short excerpt around the phrase, or else the first matching term"""
+    lowered = text.lower()
+    position = lowered.find(query_phrase) if query_phrase else -1
+    length = len(query_phrase)
+    if position < 0:
+        for term in terms:
+            match = re.search(r'\b' + re.escape(term) + r'\b', lowered)
+            if match:
+                position, length = match.start(), len(term)
+                break
+    if position < 0:
+        position, length = 0, 0
+
+    start = max(0, position - SNIPPET_RADIUS)
+    end = min(len(text), position + length + SNIPPET_RADIUS)
+    snippet = ' '.join(text[start:end].split())
+    if start > 0:
+        snippet = '…' + snippet
+    if end < len(text):
+        snippet = snippet + '…'
+    return snippet
+
+
+class SearchIndex:
+    """Inverted index term -> filename -> field -> term frequency"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.postings = {}
+        self.docs = {}
+        self.field_lengths = {field: 0 for field in FIELD_WEIGHTS}
+
+    def add_document(self, filename, content):
+        """Index (or re-index) one journal file from its markdown"""
+        parsed = parse_entry(content)
+        fields = dict(parsed['sections'])
+        if not fields:
+            # Hand-written notes without the usual headings
+            fields = {'notes': content}
+        fields['track'] = parsed['track'] or ''
+        slug = (parse_entry_filename(filename) or {}).get('track')
+
+        term_counts = {}
+        lengths = {}
+        for field, text in fields.items():
+            tokens = tokenize(text)
+            lengths[field] = len(tokens)
+            for token in tokens:
+                counts = term_counts.setdefault(token, {})
+                counts[field] = counts.get(field, 0) + 1
+
+        with self.lock:
+            self.remove_document(filename)
+            for term, counts in term_counts.items():
+                self.postings.setdefault(term, {})[filename] = counts
+            for field, length in lengths.items():
+                self.field_lengths[field] = self.field_lengths.get(field, 0) + length
+            self.docs[filename] = {
+                'fields': fields,
+                'lengths': lengths,
+                'terms': set(term_counts),
+                'track': slug
+            }
+
+    def remove_document(self, filename):
+        """Drop a file from the index"""
+        with self.lock:
+            doc = self.docs.pop(filename, None)
+            if doc is None:
+                return
+            for term in doc['terms']:
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(filename, None)
+                    if not postings:
+                        del self.postings[term]
+            for field, length in doc['lengths'].items():
+                self.field_lengths[field] -= length
+
+    def search(self, query, fields=None, track=None, limit=20):
+        """Ranked matches containing every query term, with snippets.
+
+        Returns (results, total) where each result has filename, score and snippets.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return [], 0
+        fields = [f for f in (fields or FIELD_WEIGHTS) if f in FIELD_WEIGHTS]
+        phrase = ' '.join(query.lower().split())
+
+        with self.lock:
+            doc_count = len(self.docs) or 1
+            avg_length = {f: (self.field_lengths.get(f, 0) / doc_count) or 1.0 for f in fields}
+
+            # Rarest term first keeps the candidate set small
+            ordered = sorted(terms, key=lambda t: len(self.postings.get(t, ())))
+            candidates = None
+            for term in ordered:
+                postings = self.postings.get(term, {})
+                pool = postings if candidates is None else [n for n in candidates if n in postings]
+                candidates = {name for name in pool if any(f in postings[name] for f in fields)}
+                if not candidates:
+                    return [], 0
+            if track:
+                candidates = {name for name in candidates if self.docs[name]['track'] == track}
+
+            scored = []
+            for name in candidates:
+                doc = self.docs[name]
+                field_scores = {}
+                for term in terms:
+                    postings = self.postings[term]
+                    idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for field, tf in postings[name].items():
+                        if field not in fields:
+                            continue
+                        norm = 1 - BM25_B + BM25_B * doc['lengths'].get(field, 0) / avg_length[field]
+                        weight = FIELD_WEIGHTS[field] * idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+                        field_scores[field] = field_scores.get(field, 0.0) + weight
+                for field in field_scores:
+                    # Exact phrase matches rank above scattered terms
+                    if len(terms) > 1 and phrase in doc['fields'][field].lower():
+                        field_scores[field] *= 2
+                scored.append((sum(field_scores.values()), name, field_scores))
+
+            scored.sort(key=lambda item: (-item[0], item[1]))
+            results = []
+            for score, name, field_scores in scored[:limit]:
+                doc = self.docs[name]
+                best_fields = sorted(field_scores, key=field_scores.get, reverse=True)[:2]
+                results.append({
+                    'filename': name,
+                    'score': round(score, 4),
+                    'snippets': [{'field': f, 'text': make_snippet(doc['fields'][f], phrase, terms)}
+                                 for f in best_fields]
+                })
+            return results, len(scored)
+
+    def __len__(self):
+        return len(self.docs)
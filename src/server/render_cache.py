@@ -0,0 +1,77 @@
+"""
+Render Cache
+LRU cache of journal entries rendered to HTML, keyed by path and
+revalidated against the file's mtime and size
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from journal_markdown import render_html
+
+MAX_RENDERED = 256
+
+
+class RenderCache:
+    """Markdown source and rendered HTML for the most recently read entries"""
+
+    def __init__(self, max_entries=MAX_RENDERED):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Set while a filesystem watcher invalidates edited files, so hits skip the stat
+        self.watched = False
+
+    def get(self, file_path):
+        """{'content', 'html', 'mtime'} for a file, rendering it only if it changed.
+
+        Raises OSError when the file can't be read.
+        """
+        if self.watched:
+            with self.lock:
+                cached = self.entries.get(file_path)
+                if cached is not None:
+                    self.entries.move_to_end(file_path)
+                    self.hits += 1
+                    return cached
+        stat_result = os.stat(file_path)
+        key = (stat_result.st_mtime_ns, stat_result.st_size)
+        with self.lock:
+            cached = self.entries.get(file_path)
+            if cached is not None and cached['key'] == key:
+                self.entries.move_to_end(file_path)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        rendered = {'key': key, 'mtime': stat_result.st_mtime, 'content': content, 'html': render_html(content)}
+        with self.lock:
+            self.entries[file_path] = rendered
+            self.entries.move_to_end(file_path)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return rendered
+
+    def invalidate(self, file_path):
+        """Forget a file that changed or disappeared"""
+        with self.lock:
+            self.entries.pop(file_path, None)
+
+    def warm(self, file_paths):
+        """Render files ahead of time (e.g. the newest entries at startup); returns how many"""
+        warmed = 0
+        for file_path in file_paths:
+            try:
+                self.get(file_path)
+                warmed += 1
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"⚠️  Could not pre-render {file_path}: {e}")
+        return warmed
+
+    def __len__(self):
+        return len(self.entries)
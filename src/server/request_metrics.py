@@ -0,0 +1,276 @@
+"""
+Request Metrics
+Per-route latency histograms, response sizes, errors, filesystem operations
+and git command timings, exposed in the Prometheus text format. Can also
+profile requests and keep cProfile dumps of the slow ones.
+"""
+
+import os
+import re
+import sys
+import time
+import cProfile
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+GIT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Path segments that are ids or filenames, collapsed so each route is one series
+ROUTE_PATTERNS = [
+    (re.compile(r'^/api/songs/[^/]+$'), '/api/songs/<id>'),
+    (re.compile(r'^/api/songs/[^/]+/peaks$'), '/api/songs/<id>/peaks'),
+    (re.compile(r'^/api/journal-file/.+$'), '/api/journal-file/<name>'),
+    (re.compile(r'^/api/entries/(?!batch$).+$'), '/api/entries/<filename>'),
+    (re.compile(r'^/api/git-commit/.+$'), '/api/git-commit/<id>'),
+    (re.compile(r'^/api/followups/.+$'), '/api/followups/<id>'),
+    (re.compile(r'^/api/attachments/uploads/[^/]+$'), '/api/attachments/uploads/<id>'),
+    (re.compile(r'^/api/attachments/(?!uploads$)[^/]+$'), '/api/attachments/<id>'),
+    (re.compile(r'^/src/ui/.+$'), '/src/ui/<file>'),
+]
+
+# Audit events counted as filesystem operations
+FS_EVENTS = {
+    'os.listdir': 'listdir',
+    'os.scandir': 'scandir',
+    'os.rename': 'rename',
+    'os.remove': 'remove',
+    'os.mkdir': 'mkdir'
+}
+
+
+class CountingWriter:
+    """Wraps a handler's wfile and counts the bytes written through it"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.sent = 0
+
+    def write(self, data):
+        self.sent += len(data)
+        return self.stream.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def route_label(path):
+    """Route name for a request path, without the query string or ids"""
+    route = path.split('?', 1)[0]
+    for pattern, label in ROUTE_PATTERNS:
+        if pattern.match(route):
+            return label
+    return route
+
+
+class Histogram:
+    """Cumulative bucket counts plus sum and count"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+def format_labels(labels):
+    return ','.join(f'{key}="{escape_label(value)}"' for key, value in labels)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RequestMetrics:
+    """Thread-safe registry the handler, the git worker and the audit hook report into"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = threading.local()
+        self.latency = {}
+        self.bytes_sent = Counter()
+        self.responses = Counter()
+        self.fs_ops = Counter()
+        self.git = defaultdict(lambda: Histogram(GIT_BUCKETS))
+        self.git_failures = Counter()
+        self.gauges = {}
+        self.in_flight = 0
+        self.slow_threshold = None
+        self.profile_dir = None
+        self.fs_hook_installed = False
+
+    def enable_slow_log(self, threshold_ms, profile_dir=None):
+        """Log requests slower than threshold_ms; with profile_dir, profile every request and keep the slow ones"""
+        self.slow_threshold = threshold_ms / 1000
+        self.profile_dir = profile_dir
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+
+    def install_fs_hook(self):
+        """Count file opens, directory listings and renames via an audit hook"""
+        if not self.fs_hook_installed:
+            sys.addaudithook(self.audit)
+            self.fs_hook_installed = True
+
+    def audit(self, event, args):
+        if event == 'open':
+            mode, flags = args[1], args[2]
+            if isinstance(mode, str):
+                writing = any(flag in mode for flag in 'wax+')
+            else:
+                # os.open() passes flags instead of a mode string
+                writing = bool(flags & (os.O_WRONLY | os.O_RDWR | os.O_CREAT))
+            op = 'open_write' if writing else 'open_read'
+        else:
+            op = FS_EVENTS.get(event)
+            if op is None:
+                return
+        route = getattr(self.current, 'route', None) or 'background'
+        with self.lock:
+            self.fs_ops[(op, route)] += 1
+
+    def add_gauge(self, name, help_text, read_value):
+        """Report read_value() at scrape time, e.g. cache sizes or queue depth"""
+        self.gauges[name] = (help_text, read_value)
+
+    def start_request(self, profile=True):
+        """Mark the calling thread as serving a request; returns a profiler if profiling"""
+        self.current.route = 'unparsed'
+        with self.lock:
+            self.in_flight += 1
+        if self.profile_dir and profile:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        return None
+
+    def set_route(self, path):
+        """Attribute the thread's filesystem operations to this request's route"""
+        self.current.route = route_label(path)
+
+    def finish_request(self, method, path, status, sent, started, profiler=None):
+        """Record one request once its response is written (method is None if none was read)"""
+        duration = time.perf_counter() - started
+        if profiler is not None:
+            profiler.disable()
+        self.current.route = None
+        if method is None:
+            with self.lock:
+                self.in_flight -= 1
+            return
+
+        route = route_label(path)
+        if status == 404 and route == path.split('?', 1)[0]:
+            # Unknown paths share one series instead of one per URL tried
+            route = '<unmatched>'
+        key = (method, route)
+        with self.lock:
+            self.in_flight -= 1
+            histogram = self.latency.get(key)
+            if histogram is None:
+                histogram = self.latency[key] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(duration)
+            self.bytes_sent[key] += sent
+            self.responses[key + (str(status or 0),)] += 1
+
+        if self.slow_threshold is not None and duration >= self.slow_threshold:
+            dump = None
+            if profiler is not None:
+                stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+                slug = re.sub(r'[^A-Za-z0-9]+', '-', route).strip('-') or 'root'
+                dump = os.path.join(self.profile_dir, f'{stamp}-{method}-{slug}.prof')
+                profiler.dump_stats(dump)
+            print(f"🐢 Slow request: {method} {path} took {duration * 1000:.0f} ms"
+                  + (f" (profile: {dump})" if dump else ''))
+
+    def observe_git(self, command, duration, returncode):
+        """Called by the git worker after every git subprocess"""
+        with self.lock:
+            self.git[command].observe(duration)
+            if returncode != 0:
+                self.git_failures[command] += 1
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            lines += [
+                '# HELP journal_http_request_duration_seconds Time spent handling requests',
+                '# TYPE journal_http_request_duration_seconds histogram'
+            ]
+            for (method, route), histogram in sorted(self.latency.items()):
+                lines += histogram_lines('journal_http_request_duration_seconds',
+                                         [('method', method), ('route', route)], histogram)
+
+            lines += [
+                '# HELP journal_http_response_bytes_total Bytes written in response bodies and headers',
+                '# TYPE journal_http_response_bytes_total counter'
+            ]
+            for (method, route), sent in sorted(self.bytes_sent.items()):
+                lines.append(f'journal_http_response_bytes_total{{{format_labels([("method", method), ("route", route)])}}} {sent}')
+
+            lines += [
+                '# HELP journal_http_responses_total Responses by status code',
+                '# TYPE journal_http_responses_total counter'
+            ]
+            for (method, route, status), count in sorted(self.responses.items()):
+                labels = format_labels([('method', method), ('route', route), ('status', status)])
+                lines.append(f'journal_http_responses_total{{{labels}}} {count}')
+
+            lines += [
+                '# HELP journal_http_errors_total Responses with a 4xx or 5xx status',
+                '# TYPE journal_http_errors_total counter'
+            ]
+            errors = Counter()
+            for (method, route, status), count in self.responses.items():
+                if status[0] in '45' or status == '0':
+                    errors[(method, route)] += count
+            for (method, route), count in sorted(errors.items()):
+                lines.append(f'journal_http_errors_total{{{format_labels([("method", method), ("route", route)])}}} {count}')
+
+            lines += [
+                '# HELP journal_http_requests_in_flight Requests being handled right now',
+                '# TYPE journal_http_requests_in_flight gauge',
+                f'journal_http_requests_in_flight {self.in_flight}',
+                '# HELP journal_fs_operations_total File opens, listings, renames and removes by route',
+                '# TYPE journal_fs_operations_total counter'
+            ]
+            for (op, route), count in sorted(self.fs_ops.items()):
+                lines.append(f'journal_fs_operations_total{{{format_labels([("op", op), ("route", route)])}}} {count}')
+
+            lines += [
+                '# HELP journal_git_command_duration_seconds Time spent in git subprocesses',
+                '# TYPE journal_git_command_duration_seconds histogram'
+            ]
+            for command, histogram in sorted(self.git.items()):
+                lines += histogram_lines('journal_git_command_duration_seconds', [('command', command)], histogram)
+            lines += [
+                '# HELP journal_git_command_failures_total Git commands that exited non-zero',
+                '# TYPE journal_git_command_failures_total counter'
+            ]
+            for command, count in sorted(self.git_failures.items()):
+                lines.append(f'journal_git_command_failures_total{{command="{escape_label(command)}"}} {count}')
+
+        for name, (help_text, read_value) in sorted(self.gauges.items()):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {read_value()}']
+        return '\n'.join(lines) + '\n'
+
+
+def histogram_lines(name, labels, histogram):
+    label_text = format_labels(labels)
+    lines = []
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {count}')
+    lines.append(f'{name}_bucket{{{label_text},le="+Inf"}} {histogram.count}')
+    lines.append(f'{name}_sum{{{label_text}}} {histogram.total:.6f}')
+    lines.append(f'{name}_count{{{label_text}}} {histogram.count}')
+    return lines
@@ -0,0 +1,224 @@
+"""
+Song Store
+In-memory song collection backed by docs/songs.json, written atomically,
+with a revision counter so clients can fetch only what changed
+"""
+
+import os
+import json
+import stat
+import time
+import tempfile
+import threading
+
+# Deleted song ids remembered for delta sync; older clients get a full list
+MAX_TOMBSTONES = 1000
+
+
+class SongStore:
+    """Songs keyed by id (in album order) with a single writer lock.
+
+    Every change bumps a collection revision and stamps it on the changed
+    song (or on a tombstone for deletions). Revisions start from the clock
+    in milliseconds, so they keep increasing across server restarts and a
+    client holding a revision from an earlier run simply gets a full list.
+    """
+
+    def __init__(self, path=os.path.join('docs', 'songs.json')):
+        self.path = path
+        self.lock = threading.RLock()
+        self.songs = {}
+        self.file_state = None
+        self.revision = 0
+        # Oldest revision delta requests can be answered from
+        self.base_revision = 0
+        self.revisions = {}
+        self.deleted = {}
+        # Set while a filesystem watcher reports edits, so reads skip the stat
+        self.watched = False
+        # Why songs.json couldn't be read last time, or None
+        self.error = None
+
+    def stat_file(self):
+        try:
+            stat_result = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat_result.st_mtime_ns, stat_result.st_size)
+
+    def load(self):
+        """Read songs.json into memory, stamping a new revision on whatever differs
+
+        A file that can't be read or parsed keeps the songs already loaded
+        (none at startup) and sets error, so only the song routes fail until
+        it is fixed.
+        """
+        with self.lock:
+            state = self.stat_file()
+            songs = []
+            try:
+                if state is not None:
+                    with open(self.path, 'r') as f:
+                        songs = json.load(f)
+                loaded = {song['id']: song for song in songs}
+            except (OSError, ValueError, TypeError, KeyError) as e:
+                # Not retried until the file changes again
+                self.file_state = state
+                self.error = f"{self.path} could not be read: {e}"
+                print(f"⚠️  {self.error}")
+                return len(self.songs)
+            self.error = None
+            previous = self.songs
+            self.songs = loaded
+            self.file_state = state
+
+            revision = self.next_revision()
+            if not self.base_revision:
+                self.base_revision = revision
+            for song_id, song in self.songs.items():
+                if previous.get(song_id) != song:
+                    self.mark_changed(song_id, revision)
+            for song_id in previous.keys() - self.songs.keys():
+                self.mark_deleted(song_id, revision)
+            return len(self.songs)
+
+    def reload_if_changed(self, notified=False):
+        """Pick up edits made outside the server (by hand or a git pull).
+
+        While watched, only a watcher notification (notified=True) checks the file.
+        """
+        if self.watched and not notified:
+            return False
+        with self.lock:
+            if self.stat_file() != self.file_state:
+                self.load()
+                return True
+            return False
+
+    def next_revision(self):
+        self.revision = max(self.revision + 1, int(time.time() * 1000))
+        return self.revision
+
+    def mark_changed(self, song_id, revision):
+        self.revisions[song_id] = revision
+        self.deleted.pop(song_id, None)
+
+    def mark_deleted(self, song_id, revision):
+        self.revisions.pop(song_id, None)
+        self.deleted[song_id] = revision
+        if len(self.deleted) > MAX_TOMBSTONES:
+            # Forget the oldest deletion; clients older than it need a full list
+            oldest = min(self.deleted, key=self.deleted.get)
+            self.base_revision = max(self.base_revision, self.deleted.pop(oldest))
+
+    def exists(self):
+        return self.file_state is not None
+
+    def check(self):
+        """Raise ValueError while songs.json is unreadable (after picking up any fix to it)"""
+        with self.lock:
+            self.reload_if_changed()
+            if self.error:
+                raise ValueError(self.error)
+
+    def all(self):
+        """All songs in album order"""
+        with self.lock:
+            self.reload_if_changed()
+            return list(self.songs.values())
+
+    def snapshot(self):
+        """All songs plus the revision they belong to, read atomically"""
+        with self.lock:
+            self.reload_if_changed()
+            return list(self.songs.values()), self.revision
+
+    def changes_since(self, since):
+        """Songs changed and ids deleted after a revision.
+
+        Returns (changed, deleted, revision, full); full is True when the
+        revision is too old or from the future and changed holds every song.
+        """
+        with self.lock:
+            self.reload_if_changed()
+            if since == self.revision:
+                return [], [], self.revision, False
+            if since < self.base_revision or since > self.revision:
+                return list(self.songs.values()), [], self.revision, True
+            changed = [song for song_id, song in self.songs.items() if self.revisions.get(song_id, 0) > since]
+            deleted = [song_id for song_id, revision in self.deleted.items() if revision > since]
+            return changed, deleted, self.revision, False
+
+    def get(self, song_id):
+        with self.lock:
+            self.reload_if_changed()
+            return self.songs.get(song_id)
+
+    def new_id(self):
+        """Millisecond timestamp id, bumped if two songs arrive in the same millisecond"""
+        song_id = int(time.time() * 1000)
+        while str(song_id) in self.songs:
+            song_id += 1
+        return str(song_id)
+
+    def create(self, build_song):
+        """Add a song built by build_song(new_id) and persist it"""
+        with self.lock:
+            self.reload_if_changed()
+            # Saving now would overwrite the songs in the unreadable file
+            self.check()
+            song = build_song(self.new_id())
+            self.songs[song['id']] = song
+            self.save()
+            self.mark_changed(song['id'], self.next_revision())
+            return song
+
+    def update(self, song_id, build_changes):
+        """Apply build_changes(current_song) under the writer lock; None if the song is missing"""
+        with self.lock:
+            self.reload_if_changed()
+            self.check()
+            song = self.songs.get(song_id)
+            if song is None:
+                return None
+            updated = dict(song, **build_changes(song))
+            self.songs[song_id] = updated
+            self.save()
+            self.mark_changed(song_id, self.next_revision())
+            return updated
+
+    def delete(self, song_id):
+        """Remove a song; returns it, or None if it didn't exist"""
+        with self.lock:
+            self.reload_if_changed()
+            self.check()
+            song = self.songs.pop(song_id, None)
+            if song is not None:
+                self.save()
+                self.mark_deleted(song_id, self.next_revision())
+            return song
+
+    def file_mode(self):
+        """Keep the existing permissions (mkstemp would make the file private)"""
+        try:
+            return stat.S_IMODE(os.stat(self.path).st_mode)
+        except OSError:
+            return 0o644
+
+    def save(self):
+        """Write to a temp file and rename it over songs.json so readers never see half a file"""
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix='.songs-', suffix='.json', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(list(self.songs.values()), f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(temp_path, self.file_mode())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        self.file_state = self.stat_file()
@@ -0,0 +1,152 @@
+"""
+Static Assets
+Serves the UI pages from an mtime-validated in-memory cache with strong
+ETags, pre-compressed variants and sendfile for large files
+"""
+
+import os
+import gzip
+import hashlib
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+    '.json': 'application/json',
+    '.svg': 'image/svg+xml',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.ico': 'image/x-icon'
+}
+COMPRESSIBLE = ('.html', '.css', '.js', '.json', '.svg')
+# Added to the ETag of each compressed variant; strong validators must differ per encoding
+ETAG_SUFFIXES = {'gzip': '-gz', 'br': '-br'}
+
+# Files above this size are streamed with sendfile instead of cached
+MAX_CACHED_SIZE = 1024 * 1024
+# Small files aren't worth compressing
+MIN_COMPRESS_SIZE = 512
+
+
+class StaticAssets:
+    """Cache of file bodies and their compressed variants, keyed by path"""
+
+    def __init__(self, max_cached_size=MAX_CACHED_SIZE, rewrite=None):
+        self.max_cached_size = max_cached_size
+        # Optional rewrite(body, extension) applied to cached bodies before hashing and compression
+        self.rewrite = rewrite
+        self.lock = threading.Lock()
+        self.cache = {}
+
+    def lookup(self, file_path):
+        """Current asset for a path, re-reading it only when mtime or size changed.
+
+        Returns None when the file doesn't exist. Large files come back
+        without a body and must be streamed from disk.
+        """
+        try:
+            stat_result = os.stat(file_path)
+        except OSError:
+            return None
+        if not os.path.isfile(file_path):
+            return None
+
+        with self.lock:
+            asset = self.cache.get(file_path)
+        if asset and asset['mtime'] == stat_result.st_mtime_ns and asset['file_size'] == stat_result.st_size:
+            return asset
+
+        asset = self.load(file_path, stat_result)
+        with self.lock:
+            self.cache[file_path] = asset
+        return asset
+
+    def warm(self, paths):
+        """Cache each path ahead of its first request; returns how many exist"""
+        return sum(1 for path in paths if self.lookup(path) is not None)
+
+    def load(self, file_path, stat_result):
+        """Read a file and build its cache entry"""
+        extension = os.path.splitext(file_path)[1].lower()
+        asset = {
+            'path': file_path,
+            'mtime': stat_result.st_mtime_ns,
+            'size': stat_result.st_size,
+            'file_size': stat_result.st_size,
+            'last_modified': formatdate(stat_result.st_mtime, usegmt=True),
+            'content_type': CONTENT_TYPES.get(extension, 'text/plain; charset=utf-8'),
+            'body': None,
+            'variants': {}
+        }
+        if stat_result.st_size > self.max_cached_size:
+            # Derived from mtime and size so big files never have to be hashed
+            asset['etag'] = f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+            return asset
+
+        with open(file_path, 'rb') as f:
+            body = f.read()
+        if self.rewrite is not None:
+            body = self.rewrite(body, extension)
+        asset['body'] = body
+        asset['size'] = len(body)
+        asset['etag'] = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if extension in COMPRESSIBLE and len(body) >= MIN_COMPRESS_SIZE:
+            asset['variants']['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                asset['variants']['br'] = brotli.compress(body)
+        return asset
+
+
+def variant_etag(asset, encoding=None):
+    """ETag of the identity body, or of one of its compressed variants"""
+    if encoding is None:
+        return asset['etag']
+    return asset['etag'][:-1] + ETAG_SUFFIXES[encoding] + '"'
+
+
+def is_not_modified(asset, headers):
+    """Check If-None-Match against every encoding's ETag, falling back to If-Modified-Since"""
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match:
+        tags = {tag.strip() for tag in if_none_match.split(',')}
+        if '*' in tags:
+            return True
+        # Any encoding's tag matches: all of them were made from the same body
+        for encoding in [None, *asset['variants']]:
+            etag = variant_etag(asset, encoding)
+            if etag in tags or f"W/{etag}" in tags:
+                return True
+        return False
+    if_modified_since = headers.get('If-Modified-Since')
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return asset['mtime'] // 1_000_000_000 <= since
+    return False
+
+
+def choose_encoding(asset, headers):
+    """Best pre-compressed variant the client accepts, or None for identity"""
+    offered = set()
+    for part in headers.get('Accept-Encoding', '').split(','):
+        name, _, params = part.partition(';')
+        quality = params.strip()
+        try:
+            if quality.startswith('q=') and float(quality[2:]) == 0:
+                continue
+        except ValueError:
+            continue
+        offered.add(name.strip())
+    for encoding in ('br', 'gzip'):
+        if encoding in asset['variants'] and encoding in offered:
+            return encoding
+    return None
@@ -0,0 +1,271 @@
+"""
+Waveform Peaks
+Duration, sample rate and multi-resolution min/max peaks for WAV
+attachments, computed by a background process pool and kept in compact
+binary sidecars that are memory-mapped when read
+"""
+
+import os
+import sys
+import mmap
+import wave
+import array
+import struct
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MAGIC = b'WPK1'
+# magic, bytes per sample, channels, sample rate, samples per peak at the finest level, frames, level count
+HEADER = struct.Struct('<4sHHIIQH')
+# samples per peak, peak count, offset of the level's interleaved int8 (min, max) pairs
+LEVEL = struct.Struct('<III')
+
+# Frames folded into one peak at the finest level; every further level halves the count
+BASE_SAMPLES_PER_PEAK = 256
+# No coarser levels are made once a level has this few peaks
+MIN_PEAKS = 64
+# Frames decoded at a time, a whole number of peaks so only the last read has a partial one
+READ_FRAMES = BASE_SAMPLES_PER_PEAK * 1024
+PEAK_WORKERS = 2
+
+
+def decode_samples(frames, sample_width):
+    """PCM bytes as signed integers plus their full-scale value (NumPy array or array.array)"""
+    if numpy is not None:
+        if sample_width == 3:
+            raw = numpy.frombuffer(frames, dtype=numpy.uint8).reshape(-1, 3).astype(numpy.int32)
+            samples = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+            return numpy.where(samples >= 1 << 23, samples - (1 << 24), samples), 1 << 23
+        if sample_width == 1:
+            # 8-bit WAV is unsigned
+            return numpy.frombuffer(frames, dtype=numpy.uint8).astype(numpy.int16) - 128, 1 << 7
+        dtype = '<i2' if sample_width == 2 else '<i4'
+        return numpy.frombuffer(frames, dtype=dtype), 1 << (8 * sample_width - 1)
+
+    if sample_width == 1:
+        return array.array('h', (byte - 128 for byte in frames)), 1 << 7
+    if sample_width == 3:
+        # Widen to 32 bits by slicing each sample above a zero low byte
+        padded = bytearray(len(frames) // 3 * 4)
+        padded[1::4] = frames[0::3]
+        padded[2::4] = frames[1::3]
+        padded[3::4] = frames[2::3]
+        frames, sample_width = padded, 4
+    samples = array.array('h' if sample_width == 2 else 'i')
+    samples.frombytes(frames)
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    return samples, 1 << (8 * sample_width - 1)
+
+
+def block_peaks(samples, block_size):
+    """Lowest and highest sample of every block_size samples (the last block may be short)"""
+    if numpy is not None:
+        whole = len(samples) // block_size * block_size
+        blocks = samples[:whole].reshape(-1, block_size)
+        mins, maxes = blocks.min(axis=1), blocks.max(axis=1)
+        if whole < len(samples):
+            mins = numpy.append(mins, samples[whole:].min())
+            maxes = numpy.append(maxes, samples[whole:].max())
+        return mins, maxes
+    mins, maxes = [], []
+    for start in range(0, len(samples), block_size):
+        block = samples[start:start + block_size]
+        mins.append(min(block))
+        maxes.append(max(block))
+    return mins, maxes
+
+
+def scale_peaks(values, full_scale):
+    """Peaks scaled to -127..127 so each one fits a byte (int8 array or list)"""
+    if numpy is not None:
+        # Widened first: 16- and 32-bit samples times 127 overflow their own type
+        return (values.astype(numpy.int64) * 127 // full_scale).astype(numpy.int8)
+    return [value * 127 // full_scale for value in values]
+
+
+def halve(mins, maxes):
+    """The next coarser level: each pair of peaks merged into one"""
+    if numpy is not None:
+        whole = len(mins) // 2 * 2
+        level_mins = mins[:whole].reshape(-1, 2).min(axis=1)
+        level_maxes = maxes[:whole].reshape(-1, 2).max(axis=1)
+        if whole < len(mins):
+            # An odd peak out carries over on its own
+            level_mins = numpy.append(level_mins, mins[-1])
+            level_maxes = numpy.append(level_maxes, maxes[-1])
+        return level_mins, level_maxes
+    return ([min(mins[i:i + 2]) for i in range(0, len(mins), 2)],
+            [max(maxes[i:i + 2]) for i in range(0, len(maxes), 2)])
+
+
+def interleave(mins, maxes):
+    """A level's (min, max) pairs as int8 bytes"""
+    if numpy is not None:
+        return numpy.column_stack((mins, maxes)).tobytes()
+    pairs = array.array('b', bytes(2 * len(mins)))
+    pairs[0::2] = array.array('b', mins)
+    pairs[1::2] = array.array('b', maxes)
+    return pairs.tobytes()
+
+
+def compute_peaks(audio_path, sidecar_path):
+    """Decode a WAV file and write its peak sidecar; returns the metadata.
+
+    Runs in a worker process. Raises ValueError for audio the wave module
+    can't read (compressed, float or extensible-format WAVs).
+    """
+    try:
+        with wave.open(audio_path, 'rb') as wav:
+            channels = wav.getnchannels()
+            sample_width = wav.getsampwidth()
+            sample_rate = wav.getframerate()
+            frames = wav.getnframes()
+            block_size = BASE_SAMPLES_PER_PEAK * channels
+            mins, maxes = [], []
+            while True:
+                data = wav.readframes(READ_FRAMES)
+                if not data:
+                    break
+                samples, full_scale = decode_samples(data, sample_width)
+                block_mins, block_maxes = block_peaks(samples, block_size)
+                mins.append(scale_peaks(block_mins, full_scale))
+                maxes.append(scale_peaks(block_maxes, full_scale))
+    except (wave.Error, EOFError) as e:
+        raise ValueError(f"Unreadable WAV: {e}") from None
+    if numpy is not None:
+        mins = numpy.concatenate(mins) if mins else numpy.zeros(0, numpy.int8)
+        maxes = numpy.concatenate(maxes) if maxes else numpy.zeros(0, numpy.int8)
+    else:
+        mins = [value for chunk in mins for value in chunk]
+        maxes = [value for chunk in maxes for value in chunk]
+
+    levels = [(BASE_SAMPLES_PER_PEAK, mins, maxes)]
+    while len(levels[-1][1]) > MIN_PEAKS:
+        samples_per_peak, level_mins, level_maxes = levels[-1]
+        levels.append((samples_per_peak * 2, *halve(level_mins, level_maxes)))
+
+    offset = HEADER.size + LEVEL.size * len(levels)
+    table = []
+    body = []
+    for samples_per_peak, level_mins, level_maxes in levels:
+        table.append(LEVEL.pack(samples_per_peak, len(level_mins), offset))
+        body.append(interleave(level_mins, level_maxes))
+        offset += len(body[-1])
+
+    directory = os.path.dirname(sidecar_path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix='.peaks-', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, sample_width, channels, sample_rate, BASE_SAMPLES_PER_PEAK, frames, len(levels)))
+            f.write(b''.join(table))
+            f.write(b''.join(body))
+        os.replace(temp_path, sidecar_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return {'frames': frames, 'levels': len(levels)}
+
+
+class PeakFile:
+    """A peak sidecar mapped into memory; only the pages of the level read are touched"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, self.sample_width, self.channels, self.sample_rate, _, self.frames,
+             count) = HEADER.unpack_from(self.map, 0)
+            if magic != MAGIC:
+                raise ValueError(f"Not a peak file: {path}")
+            self.levels = [LEVEL.unpack_from(self.map, HEADER.size + i * LEVEL.size) for i in range(count)]
+        except (struct.error, ValueError):
+            self.map.close()
+            raise ValueError(f"Corrupt peak file: {path}") from None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.map.close()
+
+    def metadata(self):
+        return {
+            'duration': round(self.frames / self.sample_rate, 3) if self.sample_rate else 0,
+            'sampleRate': self.sample_rate,
+            'channels': self.channels,
+            'bitsPerSample': self.sample_width * 8,
+            'frames': self.frames
+        }
+
+    def peaks(self, width):
+        """(samples per peak, interleaved int8 min/max bytes) of the coarsest level with at least width peaks"""
+        samples_per_peak, count, offset = self.levels[0]
+        for level in self.levels:
+            if level[1] >= width:
+                samples_per_peak, count, offset = level
+        return samples_per_peak, self.map[offset:offset + 2 * count]
+
+
+class PeakWorker:
+    """Background process pool computing sidecars, one job per sidecar at a time.
+
+    The pool starts with the first job. Audio that can't be decoded is
+    remembered so it isn't retried on every request.
+    """
+
+    def __init__(self, workers=PEAK_WORKERS):
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.executor = None
+        self.jobs = {}
+        self.failures = {}
+
+    def submit(self, audio_path, sidecar_path, label=None):
+        """Queue a sidecar unless it exists, is queued or failed before"""
+        with self.lock:
+            if sidecar_path in self.jobs or sidecar_path in self.failures or os.path.exists(sidecar_path):
+                return
+            if self.executor is None:
+                # spawn: forking a process that is running server threads isn't safe
+                context = multiprocessing.get_context('spawn')
+                self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            future = self.executor.submit(compute_peaks, audio_path, sidecar_path)
+            self.jobs[sidecar_path] = future
+        future.add_done_callback(lambda done: self.finished(label or os.path.basename(audio_path), sidecar_path, done))
+
+    def finished(self, label, sidecar_path, future):
+        error = future.exception()
+        with self.lock:
+            self.jobs.pop(sidecar_path, None)
+            if isinstance(error, BrokenProcessPool):
+                # A worker died; start a fresh pool for the next job
+                self.executor = None
+            elif error is not None:
+                self.failures[sidecar_path] = str(error)
+        if error is not None:
+            print(f"⚠️  No waveform for {label}: {error}")
+
+    def status(self, sidecar_path):
+        """('ready' | 'pending' | 'failed' | 'missing', error message or None)"""
+        with self.lock:
+            if sidecar_path in self.jobs:
+                return 'pending', None
+            if sidecar_path in self.failures:
+                return 'failed', self.failures[sidecar_path]
+        return ('ready' if os.path.exists(sidecar_path) else 'missing'), None
+
+    def forget(self, sidecar_path):
+        """Drop a remembered failure, e.g. after a corrupt sidecar was removed"""
+        with self.lock:
+            self.failures.pop(sidecar_path, None)
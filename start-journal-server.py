@@ -1,35 +1,43 @@
 #!/usr/bin/env python3
 """
 Start the Production Journal Server
-Run this script to start the server that handles saving journal entries
+Run this script to start the server that handles saving journal entries.
+Options are passed on to the server, e.g. --mode async or --workers 16.
+The server runs in this process, so there is no second interpreter to start.
 """
 
 import os
 import sys
-import subprocess
+import importlib.util
 from pathlib import Path
 
 def main():
     # Get the project root directory
     project_root = Path(__file__).parent
-    
+
     # Change to project root directory
     os.chdir(project_root)
-    
-    # Start the journal server
-    server_script = project_root / 'src' / 'server' / 'journal-server.py'
-    
+
+    # Load the journal server (its file name isn't importable as-is)
+    server_dir = project_root / 'src' / 'server'
+    server_script = server_dir / 'journal-server.py'
+    sys.path.insert(0, str(server_dir))
+
     print("🎧 Starting Production Journal Server...")
     print(f"📁 Project root: {project_root}")
     print(f"📝 Server script: {server_script}")
-    print("🌐 Server will be available at: http://localhost:8082")
-    
+
     try:
-        subprocess.run([sys.executable, str(server_script)], check=True)
+        spec = importlib.util.spec_from_file_location('journal_server', server_script)
+        server = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(server)
+        server.start_server(**vars(server.parse_args()))
     except KeyboardInterrupt:
         print("\n🛑 Server stopped by user")
     except Exception as e:
         print(f"❌ Error starting server: {e}")
+        return 1
+    return 0
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())